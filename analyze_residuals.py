@@ -28,8 +28,8 @@ def load_data():
     return np.array(d_vals), np.array(l_vals), files
 
 def get_predicted_level(D, D_min, D_max, gamma):
-    # Use calc.py's logic which now includes Band-wise Correction
-    return calc.pattern_level_from_D0(D, D_min, D_max, gamma, uncap=False)
+    # Use calc.py's logic which now includes Band-wise Correction (D: 배열)
+    return calc.pattern_level_array(D, D_min, D_max, gamma, uncap=False)
 
 def analyze():
     # Load Params
@@ -45,11 +45,8 @@ def analyze():
     # Load Data
     D_vals, L_true, files = load_data()
     
-    # Predict (Scalar loop)
-    L_pred = []
-    for d in D_vals:
-        L_pred.append(get_predicted_level(d, D_min, D_max, gamma))
-    L_pred = np.array(L_pred)
+    # Predict (Vectorized)
+    L_pred = get_predicted_level(D_vals, D_min, D_max, gamma)
     
     # Residuals
     residuals = L_pred - L_true
@@ -86,9 +83,8 @@ def analyze():
     high_level_data = []
     print("\n--- High Level Data Points (Label > 18) ---")
     print(f"{'Label':<5} | {'D_raw':<10} | {'Pred':<10}")
-    for d, l in zip(D_vals, L_true):
+    for d, l, pred in zip(D_vals, L_true, L_pred):
         if l > 18:
-            pred = get_predicted_level(d, D_min, D_max, gamma)
             high_level_data.append({
                 "label": int(l),
                 "d_raw": float(d),
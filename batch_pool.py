@@ -0,0 +1,123 @@
+"""
+배치 데이터셋(calc.stack_chart_data / compact 배치)을 공유 메모리에 올려 프로세스 풀에서 작업 실행.
+
+배치의 배열(피처 기저 등)은 작업마다 pickle 하지 않고 공유 메모리 한 블록으로 전달하며,
+워커는 초기화 시 한 번만 붙습니다 (Windows spawn / Linux fork 모두 동작).
+작업(task)에는 fold 인덱스 같은 작은 값만 넘기고, 워커 함수는 worker_batch()로
+공유 배치를 읽습니다. 진행 상황은 report()로 부모 프로세스에 전달되어 출력됩니다.
+"""
+
+import os
+import queue
+import numpy as np
+import multiprocessing
+from multiprocessing import Pool, shared_memory
+
+# 워커 프로세스 전역 상태 (공유 메모리 핸들, 배치 dict, 진행 상황 큐)
+_WORKER = {}
+
+# 공유 메모리 블록 안의 배열 시작 위치 정렬 (바이트)
+_ALIGN = 64
+
+def share_chart_batch(batch):
+    """
+    batch의 numpy 배열(object dtype 제외)을 공유 메모리 한 블록에 복사.
+    Returns: (SharedMemory, spec) - spec은 워커에 넘길 작은 dict (배열 위치 + 나머지 값)
+    """
+    layout = []
+    size = 0
+    for key, value in batch.items():
+        if isinstance(value, np.ndarray) and not value.dtype.hasobject:
+            layout.append((key, value.shape, value.dtype.str, size))
+            size += -(-value.nbytes // _ALIGN) * _ALIGN
+
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for key, shape, dtype, offset in layout:
+        np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)[...] = batch[key]
+
+    shared = {key for key, *_ in layout}
+    spec = {'values': {k: v for k, v in batch.items() if k not in shared}}
+    spec['shm_name'] = shm.name
+    spec['layout'] = layout
+    return shm, spec
+
+def attach_chart_batch(spec):
+    """share_chart_batch의 spec으로 공유 메모리에 붙어 배치 dict 복원 (배열은 복사 없음)"""
+    shm = shared_memory.SharedMemory(name=spec['shm_name'])
+    batch = dict(spec['values'])
+    for key, shape, dtype, offset in spec['layout']:
+        batch[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+    return shm, batch
+
+def _init_worker(spec, progress=None):
+    shm, batch = attach_chart_batch(spec)
+    _WORKER['shm'] = shm # 핸들을 살려 둬야 배열 버퍼가 유지됨
+    _WORKER['batch'] = batch
+    _WORKER['progress'] = progress
+
+def worker_batch():
+    """현재 프로세스에서 사용할 공유 배치"""
+    return _WORKER['batch']
+
+def report(message):
+    """진행 메시지 출력 (워커에서는 부모 프로세스로 보내 부모가 출력)"""
+    progress = _WORKER.get('progress')
+    if progress is None:
+        print(message, flush=True)
+    else:
+        progress.put(message)
+
+def _drain(progress):
+    while True:
+        try:
+            print(progress.get_nowait(), flush=True)
+        except queue.Empty:
+            return
+
+def default_n_jobs(n_tasks):
+    return max(1, min(n_tasks, os.cpu_count() or 1))
+
+def imap_over_batch(func, tasks, batch, n_jobs=None, ordered=True):
+    """
+    tasks 각각에 func를 실행하고 결과를 yield.
+
+    ordered=True  : tasks 순서대로 (결정적 병합용)
+    ordered=False : 끝나는 순서대로 (크기가 제각각인 작업용, 호출자가 정렬해서 병합)
+
+    func는 모듈 최상위 함수여야 하며 (pickle 가능), 배치는 worker_batch()로 읽습니다.
+    n_jobs=1 이면 현재 프로세스에서 순차 실행.
+    """
+    tasks = list(tasks)
+    if n_jobs is None:
+        n_jobs = default_n_jobs(len(tasks))
+
+    if n_jobs <= 1:
+        _WORKER['batch'] = batch
+        try:
+            for task in tasks:
+                yield func(task)
+        finally:
+            _WORKER.pop('batch', None)
+        return
+
+    shm, spec = share_chart_batch(batch)
+    progress = multiprocessing.Queue()
+    try:
+        with Pool(processes=n_jobs, initializer=_init_worker, initargs=(spec, progress)) as pool:
+            # chunksize=1: fold 하나가 무거우므로 작업 단위로 분배
+            imap = pool.imap if ordered else pool.imap_unordered
+            results = imap(func, tasks, chunksize=1)
+            for _ in range(len(tasks)):
+                # 결과를 기다리는 동안 진행 메시지를 계속 출력
+                while True:
+                    try:
+                        result = results.next(timeout=0.2)
+                        break
+                    except multiprocessing.TimeoutError:
+                        _drain(progress)
+                _drain(progress)
+                yield result
+    finally:
+        _drain(progress)
+        shm.close()
+        shm.unlink()
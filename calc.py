@@ -1,5 +1,10 @@
 import numpy as np
 import math
+import bisect
+import json
+from collections import OrderedDict
+from scipy.signal import lfilter
+from scipy.special import betainc, erf
 import hp_model # Need this for total_difficulty_10k
 
 # ----------------------------
@@ -14,14 +19,23 @@ def soft_cap_load(b_t, cap_start=60.0, cap_range=30.0):
                      (즉 cap_start + cap_range 근처로 수렴)
     """
     b_t = np.asarray(b_t, dtype=float)
-    out = b_t.copy()
 
-    mask = out > cap_start
-    x = out[mask] - cap_start  # 초과분
+    # cap_start / cap_range가 후보별 배열이어도 브로드캐스트되도록 np.where 사용
+    x = np.maximum(b_t - cap_start, 0.0)  # 초과분
 
     # b' = T + (b - T) * C / (C + (b - T))
-    out[mask] = cap_start + x * (cap_range / (cap_range + x))
-    return out
+    return np.where(b_t > cap_start, cap_start + x * (cap_range / (cap_range + x)), b_t)
+
+
+def scale_nps(nps):
+    """
+    고밀도 구간 NPS 비선형 스케일: NPS > 40 이면 40 + (NPS - 40)^1.2
+    (가중치와 무관하므로 피처 기저에 미리 적용해 둘 수 있음)
+    """
+    nps_scaled = np.array(nps, dtype=float)
+    mask = nps_scaled > 40.0
+    nps_scaled[mask] = 40.0 + (nps_scaled[mask] - 40.0) ** 1.2
+    return nps_scaled
 
 
 # ----------------------------
@@ -57,9 +71,7 @@ def compute_window_load(
     chord_strain = np.asarray(chord_strain, dtype=float) # [NEW]
 
     # Non-linear NPS Scaling for high density
-    nps_scaled = np.copy(nps)
-    mask = nps_scaled > 40.0
-    nps_scaled[mask] = 40.0 + (nps_scaled[mask] - 40.0) ** 1.2
+    nps_scaled = scale_nps(nps)
 
     b_t = (
         alpha * nps_scaled +
@@ -84,12 +96,38 @@ def ema(x, lam):
     """
     단순 지수이동평균 (EMA)
     lam: 0~1 사이 추천 (1에 가까울수록 최신값 비중↑)
+
+    out[0] = x[0], out[i] = lam * x[i] + (1 - lam) * out[i-1]
+    1차 IIR 필터(scipy.signal.lfilter)로 계산.
+    2D 입력 [charts x windows]이면 행마다 마지막 축을 따라 한 번에 계산.
+
+    lam은 배열이어도 됨 (파라미터 축 브로드캐스트): x.shape[:-1]과
+    브로드캐스트 가능한 모양이면 결과는 broadcast(x.shape[:-1], lam.shape) + (windows,).
     """
     x = np.asarray(x, dtype=float)
-    out = np.empty_like(x)
-    out[0] = x[0]
-    for i in range(1, len(x)):
-        out[i] = lam * x[i] + (1.0 - lam) * out[i-1]
+    lam = np.asarray(lam, dtype=float)
+    out_shape = np.broadcast_shapes(x.shape[:-1], lam.shape) + x.shape[-1:]
+    if x.shape[-1] == 0:
+        return np.zeros(out_shape)
+
+    if lam.size == 1:
+        return _ema_lfilter(x, lam.item()).reshape(out_shape)
+
+    # 후보별 lam: lfilter 계수는 스칼라여야 하므로 같은 lam을 쓰는 행끼리 묶어 한 번씩 필터
+    # (행마다 스칼라 lam 경로와 같은 계산 -> 후보 1개씩 평가한 결과와 일치)
+    rows = np.broadcast_to(x, out_shape).reshape(-1, out_shape[-1])
+    row_lam = np.broadcast_to(lam, out_shape[:-1]).reshape(-1)
+    out = np.empty(rows.shape)
+    for value in np.unique(row_lam):
+        picked = row_lam == value
+        out[picked] = _ema_lfilter(rows[picked], float(value))
+    return out.reshape(out_shape)
+
+
+def _ema_lfilter(x, lam):
+    """스칼라 lam EMA (마지막 축). 초기 상태: out[0] = lam * x[0] + zi = x[0]"""
+    zi = (1.0 - lam) * x[..., :1]
+    out, _ = lfilter([lam], [1.0, -(1.0 - lam)], x, axis=-1, zi=zi)
     return out
 
 
@@ -153,6 +191,135 @@ def compute_raw_difficulty(
 
     return D0
 
+# ----------------------------
+# 3-1. 라이브러리 퍼센타일 인덱스 (F_rank / P_rank)
+# ----------------------------
+class PercentileIndex:
+    """
+    라이브러리 전체 곡의 F, P 값을 정렬된 상태로 보관하는 퍼센타일 인덱스.
+
+    - rank_F / rank_P: 이분 탐색 O(log n)
+    - add: 정렬 위치에 삽입 (전체 재구성 없음). 같은 key로 다시 넣으면 이전 값을 교체
+    - remove: key의 값을 삭제 (수정/삭제된 곡 반영)
+    - skip: 값 없이 stamp만 기록 (필터 제외 / 파싱 실패 파일 -> 바뀌기 전까지 다시 읽지 않음)
+    - save / load: JSON 파일로 영구 저장
+
+    key마다 (F, P, stamp)를 기록하므로, stamp에 파일 (크기, 수정 시각)을 넣으면
+    수정된 곡만 골라 다시 계산할 수 있습니다.
+
+    퍼센타일은 mid-rank 정의: (값보다 작은 개수 + 같은 개수 / 2) / n  -> 0~1
+    """
+
+    def __init__(self, F_values=(), P_values=(), params=None, entries=None, keys=(), skipped=None):
+        self.F_sorted = sorted(float(v) for v in F_values)
+        self.P_sorted = sorted(float(v) for v in P_values)
+        # 인덱스를 만들 때 사용한 compute_map_difficulty 파라미터 (기록용)
+        self.params = dict(params or {})
+        # 곡 식별자 (파일 경로 등) -> (F, P, stamp). F_values/P_values에 이미 포함된 값
+        self.entries = {key: (float(F), float(P), None if stamp is None else tuple(stamp))
+                        for key, (F, P, stamp) in (entries or {}).items()}
+        # 값이 기록되지 않은 key (구 형식 파일) -> 교체/삭제 불가
+        for key in keys:
+            self.entries.setdefault(key, None)
+        # 값 없이 stamp만 기록한 key (제외 / 실패 파일) -> stamp
+        self.skipped = {key: None if stamp is None else tuple(stamp) for key, stamp in (skipped or {}).items()}
+
+    def __len__(self):
+        return len(self.F_sorted)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def stamp(self, key):
+        """key를 넣거나 skip할 때 기록한 stamp (없으면 None)"""
+        if key in self.skipped:
+            return self.skipped[key]
+        entry = self.entries.get(key)
+        return None if entry is None else entry[2]
+
+    def tracked_keys(self):
+        """값이 있거나 skip으로 기록된 모든 key"""
+        return list(self.entries) + list(self.skipped)
+
+    def has_unknown_entries(self):
+        """값이 기록되지 않은 key가 있으면 True (구 형식 파일 -> 재구성 필요)"""
+        return any(entry is None for entry in self.entries.values())
+
+    @staticmethod
+    def _discard(sorted_values, x):
+        i = bisect.bisect_left(sorted_values, x)
+        if i == len(sorted_values) or sorted_values[i] != x:
+            raise ValueError(f"Value {x} not found in PercentileIndex")
+        del sorted_values[i]
+
+    def add(self, F, P, key=None, stamp=None):
+        """
+        새 곡 1개의 F, P를 삽입. key가 이미 있으면 이전 값을 지우고 교체.
+        Returns: 새 key면 True, 교체했으면 False
+        """
+        F, P = float(F), float(P)
+        is_new = True
+        if key is not None:
+            is_new = not self.remove(key)
+            self.entries[key] = (F, P, None if stamp is None else tuple(stamp))
+        bisect.insort(self.F_sorted, F)
+        bisect.insort(self.P_sorted, P)
+        return is_new
+
+    def skip(self, key, stamp):
+        """key를 값 없이 stamp만 기록 (이전 값이 있으면 삭제)"""
+        self.remove(key)
+        self.skipped[key] = None if stamp is None else tuple(stamp)
+
+    def remove(self, key):
+        """key의 F, P(또는 skip 기록)를 삭제. Returns: 값이 있었으면 True"""
+        self.skipped.pop(key, None)
+        if key not in self.entries:
+            return False
+        entry = self.entries[key]
+        if entry is None:
+            raise ValueError(f"Values for {key!r} are unknown (legacy index); rebuild the index")
+        del self.entries[key]
+        self._discard(self.F_sorted, entry[0])
+        self._discard(self.P_sorted, entry[1])
+        return True
+
+    @staticmethod
+    def _rank(sorted_values, x):
+        n = len(sorted_values)
+        if n == 0:
+            raise ValueError("PercentileIndex is empty")
+        lo = bisect.bisect_left(sorted_values, x)
+        hi = bisect.bisect_right(sorted_values, x)
+        return (lo + 0.5 * (hi - lo)) / n
+
+    def rank_F(self, F):
+        return self._rank(self.F_sorted, float(F))
+
+    def rank_P(self, P):
+        return self._rank(self.P_sorted, float(P))
+
+    def save(self, path):
+        known = {key: list(entry[:2]) + [None if entry[2] is None else list(entry[2])]
+                 for key, entry in self.entries.items() if entry is not None}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'params': self.params,
+                'entries': dict(sorted(known.items())),
+                'keys': sorted(key for key, entry in self.entries.items() if entry is None),
+                'skipped': {key: None if stamp is None else list(stamp) for key, stamp in sorted(self.skipped.items())},
+                'F': self.F_sorted,
+                'P': self.P_sorted,
+            }, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        # 저장 시 이미 정렬되어 있지만, 손으로 편집된 파일 대비 sorted()로 복원
+        return cls(data['F'], data['P'], params=data.get('params'),
+                   entries=data.get('entries'), keys=data.get('keys', ()), skipped=data.get('skipped'))
+
 
 # ----------------------------
 # 4. 생존률 예측 로지스틱 모델
@@ -229,6 +396,40 @@ def predict_s_rank_95(D0: float, a: float, k: float,
     return normal_cdf(z)
 
 
+def predict_s_rank_array(D0, a, k, total_notes, acc_target=0.95, exact_max_notes=1_000_000):
+    """
+    predict_s_rank_95의 배열 버전 (정확한 이항분포 꼬리 확률).
+
+    D0, total_notes, acc_target는 브로드캐스트 가능한 배열.
+    예: D0 [곡], total_notes [곡], acc_target [목표, 1] -> [목표 x 곡] 확률 표
+
+    1) p = σ(a - k * D0), 클리어 노트 수 X ~ Binomial(N, p)
+    2) P(Acc >= acc_target) = P(X >= m), m = ceil(acc_target * N)
+       = I_p(m, N - m + 1)  (정규화된 불완전 베타 함수)
+    3) N > exact_max_notes 인 곡만 기존 정규근사 사용
+    """
+    p = sigmoid(a - k * np.asarray(D0, dtype=float))
+    # 수치 안정성용 클램프 (predict_s_rank_95와 동일)
+    eps = 1e-6
+    p = np.clip(p, eps, 1.0 - eps)
+
+    N = np.maximum(np.asarray(total_notes, dtype=float), 1.0)
+    acc_target = np.asarray(acc_target, dtype=float)
+    p, N, acc_target = np.broadcast_arrays(p, N, acc_target)
+
+    # 필요한 최소 '좋게 친' 노트 수 (0.95 * 500 = 475.00000000000006 같은 오차 보정)
+    m = np.ceil(acc_target * N - 1e-9)
+    m_safe = np.clip(m, 1.0, N)
+    exact = betainc(m_safe, N - m_safe + 1.0, p)
+    exact = np.where(m <= 0.0, 1.0, np.where(m > N, 0.0, exact))
+
+    # 정규근사 (초대형 N 전용)
+    z = (p - acc_target) / np.sqrt(p * (1.0 - p) / N)
+    approx = 0.5 * (1.0 + erf(z / math.sqrt(2.0)))
+
+    return np.where(N > exact_max_notes, approx, exact)
+
+
 def target_D0_for_survival(S_target, a, k):
     """
     목표 생존률 S_target일 때의 '임계 난이도' D0* 계산:
@@ -306,6 +507,59 @@ def pattern_level_from_D0(
             
         return float(max(1.0, min(25.0, level)))
 
+# 원소별 math.pow (float ** float와 같은 libm 호출, 결과는 object 배열)
+_libm_pow = np.frompyfunc(math.pow, 2, 1)
+
+def level_curve_array(D0, D_min=0.0, D_max=55.0, gamma=1.0, clamp=True):
+    """
+    정규화 레벨 곡선 x^gamma, x = (D0 - D_min) / (D_max - D_min)
+
+    clamp=True  : x를 [0, 1]로 제한 (표준 스케일)
+    clamp=False : 아래쪽(0)만 제한 (uncap 스케일 / 레벨 보정용)
+    """
+    D0 = np.asarray(D0, dtype=float)
+    x = (D0 - D_min) / (D_max - D_min)
+    # max(0, x) / min(1, x)와 동일한 의미 (NaN -> 0)
+    x = np.where(x > 0.0, x, 0.0)
+    if clamp:
+        x = np.where(x < 1.0, x, 1.0)
+    # numpy의 SIMD pow는 libm pow와 최대 1 ulp 달라 레벨 경계(12/13/14/17/19)에서 밴드가 바뀔 수 있음
+    # -> 스칼라 pattern_level_from_D0 (x ** gamma)와 같은 libm pow로 계산
+    return np.asarray(_libm_pow(x, gamma), dtype=float)
+
+def pattern_level_array(D0, D_min=0.0, D_max=55.0, gamma=1.0, uncap=False):
+    """
+    pattern_level_from_D0의 배열 버전 (배치 파이프라인 / 보정 스크립트용).
+    D0, D_min, D_max, gamma는 브로드캐스트 가능한 배열.
+    """
+    if uncap:
+        # Debug Scale: 0 at D_min, 100 at D_max, extends beyond 100
+        return 100.0 * level_curve_array(D0, D_min, D_max, gamma, clamp=False)
+
+    # Standard Scale: 1 at D_min, 25 at D_max, clamped
+    level = 1.0 + 24.0 * level_curve_array(D0, D_min, D_max, gamma, clamp=True)
+
+    # Band-wise Level Correction (Antigravity v0.1)
+    # Based on residual analysis:
+    # - Low (< 12): -1.5 (Fix overprediction)
+    # - Trans (12-13): -1.5 -> 0.0
+    # - Trans (13-14): 0.0 -> +1.5
+    # - High (14-17): +1.5 (Fix underprediction)
+    # - Trans (17-19): +1.5 -> +5.0
+    # - Top (> 19): +5.0
+    level = np.select(
+        [level < 12.0, level < 13.0, level < 14.0, level < 17.0, level < 19.0],
+        [
+            np.maximum(1.0, level - 1.5),
+            level - 1.5 * (1.0 - (level - 12.0)),
+            level + 1.5 * (level - 13.0),
+            level + 1.5,
+            level + 1.5 + (3.5 * ((level - 17.0) / 2.0)),
+        ],
+        default=level + 5.0,
+    )
+    return np.clip(level, 1.0, 25.0)
+
 def estimate_level(D0, uncap=False):
     """
     [LEGACY WRAPPER]
@@ -353,6 +607,7 @@ def compute_map_difficulty(
     a=1.64, k=0.250,
     # 기타
     F_rank=None, P_rank=None,
+    rank_index=None, # [NEW] PercentileIndex: 주어지면 F/P를 라이브러리 퍼센타일로 정규화
     duration=1.0,
     total_notes=1000,
     gamma_clear=1.0,
@@ -380,6 +635,13 @@ def compute_map_difficulty(
         b_t, lam_L=lam_L, lam_S=lam_S
     )
 
+    # 2-1. 라이브러리 퍼센타일 (명시적 F_rank/P_rank가 우선)
+    if rank_index is not None:
+        if F_rank is None:
+            F_rank = rank_index.rank_F(F)
+        if P_rank is None:
+            P_rank = rank_index.rank_P(P)
+
     # 3. 클리어용 난이도 (D0)
     D_clear = compute_raw_difficulty(
         F, P, b_t,
@@ -432,6 +694,578 @@ def compute_map_difficulty(
         "chord_strain": chord_strain # 디버깅용 리턴 추가
     }
 
+# ----------------------------
+# 6-1. 데이터셋 배치 파이프라인 (최적화용)
+# ----------------------------
+# 피처 기저의 마지막 축 순서와 대응하는 부하 가중치
+METRIC_KEYS = (
+    'nps', 'ln_strain', 'jack_pen', 'roll_pen', 'alt_cost', 'hand_strain', 'chord_strain',
+)
+LOAD_WEIGHT_NAMES = ('alpha', 'beta', 'gamma', 'delta', 'eta', 'theta', 'omega')
+
+
+def build_feature_basis(metrics):
+    """
+    곡 1개의 메트릭 dict (metric_calc.calculate_metrics 결과)를
+    피처 기저 [windows x 7] (METRIC_KEYS 순서)로 변환.
+    NPS 비선형 스케일은 여기서 한 번만 적용되므로
+    b_t = soft_cap(basis @ [alpha, beta, gamma, delta, eta, theta, omega]).
+    """
+    basis = np.column_stack([np.asarray(metrics[key], dtype=float) for key in METRIC_KEYS])
+    basis[:, 0] = scale_nps(basis[:, 0])
+    return basis
+
+
+def stack_feature_basis(metrics_list):
+    """
+    곡별 메트릭 dict 리스트를 패딩된 피처 기저 [charts x max_windows x 7]와 길이 배열로 변환.
+    패딩 구간은 0으로 채워지며 lengths가 유효 윈도우 수.
+    """
+    lengths = np.array([len(m['nps']) for m in metrics_list], dtype=np.int64)
+    max_windows = int(lengths.max()) if len(lengths) else 0
+
+    basis = np.zeros((len(metrics_list), max_windows, len(METRIC_KEYS)))
+    for i, m in enumerate(metrics_list):
+        basis[i, :lengths[i]] = build_feature_basis(m)
+    return basis, lengths
+
+
+def window_load_from_basis(basis, weights, cap_start=60.0, cap_range=30.0):
+    """
+    피처 기저로부터 윈도우 부하 계산: b_t = soft_cap(basis @ weights)
+
+    basis:   [..., windows, 7] (build_feature_basis / stack_feature_basis)
+    weights: [7] (LOAD_WEIGHT_NAMES 순서) 또는 후보별 [P x 7]
+             -> 결과 [..., windows] 또는 [P x ... x windows]
+    """
+    weights = np.asarray(weights, dtype=float)
+    if weights.ndim == 1:
+        raw = basis @ weights
+    else:
+        raw = np.tensordot(weights, basis, axes=([-1], [-1]))
+    return soft_cap_load(raw, cap_start=cap_start, cap_range=cap_range)
+
+
+def _length_bonus_array(duration, total_notes):
+    """compute_map_difficulty의 곡 길이 보정 (배열 버전)"""
+    duration = np.asarray(duration, dtype=float)
+    total_notes = np.asarray(total_notes, dtype=float)
+    length_norm = np.maximum(duration, 60.0)
+    base_bonus = 0.05 * np.log1p((length_norm - 60.0) / 60.0)
+    avg_nps = total_notes / np.maximum(1.0, duration)
+    density_factor = np.minimum(1.0, avg_nps / 15.0)
+    return 1.0 + base_bonus * density_factor
+
+
+def compute_map_difficulty_batch(
+    basis, lengths, duration, total_notes,
+    # 부하 가중치
+    alpha=0.8, beta=1.0, gamma=1.0, delta=1.0, eta=0.5, theta=0.5,
+    omega=1.5,
+    # EMA 람다
+    lam_L=0.3, lam_S=0.8,
+    # 난이도 가중치
+    w_F=1.0, w_P=1.0, w_V=0.2,
+    # Soft Cap
+    cap_start=60.0, cap_range=30.0,
+    # 기타
+    F_rank=None, P_rank=None,
+    uncap_level=False,
+    # Level Mapping Params
+    D_min=0.0,
+    D_max=55.0,
+    gamma_curve=1.0,
+    level_offset=0.0,
+):
+    """
+    compute_map_difficulty의 데이터셋 배치 버전.
+
+    basis:       [charts x max_windows x 7] 패딩 피처 기저 (stack_feature_basis)
+    lengths:     [charts] 곡별 유효 윈도우 수 (길이 마스크)
+    duration:    [charts] 곡 길이 (초)
+    total_notes: [charts] 노트 수
+
+    부하, Soft Cap, 두 EMA, F/P/std, 길이 보정, 레벨 매핑을
+    곡 단위 루프 없이 한 번에 계산. 결과는 곡별로 compute_map_difficulty와
+    부동소수점 합산 순서 차이(~1e-12) 이내로 일치.
+
+    파라미터는 배열이어도 됨: 윈도우 단위 파라미터는 [P x 1 x 1],
+    나머지는 [P x 1] 모양이면 결과가 [P x charts]로 브로드캐스트됨
+    (compute_map_difficulty_population 참고).
+    """
+    basis = np.asarray(basis, dtype=float)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    if np.any(lengths < 1):
+        raise ValueError("every chart needs at least one window")
+
+    n_windows = basis.shape[1]
+    mask = np.arange(n_windows)[None, :] < lengths[:, None]
+    n = lengths.astype(float)
+
+    # 1. 윈도우 부하: 기저 @ 가중치 (후보별 가중치면 [P x 7])
+    weights = np.stack(np.broadcast_arrays(alpha, beta, gamma, delta, eta, theta, omega), axis=-1)
+    if weights.ndim > 1:
+        weights = weights.reshape(-1, len(LOAD_WEIGHT_NAMES))
+    b_t = window_load_from_basis(basis, weights, cap_start=cap_start, cap_range=cap_range)
+
+    # 2. 엔듀런스 / 버스트 (EMA는 인과적이므로 뒤쪽 패딩이 유효 구간에 영향 없음)
+    ema_L = ema(b_t, lam_L)
+    ema_S = ema(b_t, lam_S)
+    F = np.where(mask, ema_L, 0.0).sum(axis=-1) / n
+    P = np.where(mask, ema_S, -np.inf).max(axis=-1)
+
+    # 3. 클리어용 난이도 (D0), p_norm = 5.0
+    mean_b = np.where(mask, b_t, 0.0).sum(axis=-1) / n
+    std_b = np.sqrt(np.where(mask, (b_t - mean_b[..., None]) ** 2, 0.0).sum(axis=-1) / n)
+
+    vF = w_F * (F if F_rank is None else np.asarray(F_rank, dtype=float))
+    vP = w_P * (P if P_rank is None else np.asarray(P_rank, dtype=float))
+    vV = w_V * std_b
+    p = 5.0
+    D_clear = (np.abs(vF) ** p + np.abs(vP) ** p + np.abs(vV) ** p) ** (1.0 / p)
+
+    # 4. 곡 길이 보정 (compute_map_difficulty와 동일)
+    length_bonus = _length_bonus_array(duration, total_notes)
+
+    D_pattern = D_clear * length_bonus
+
+    # 5. 레벨 예측
+    pattern_level = pattern_level_array(
+        D_pattern, D_min=D_min, D_max=D_max, gamma=gamma_curve, uncap=uncap_level
+    ) + level_offset
+    est_level = np.trunc(pattern_level).astype(int)
+
+    return {
+        "F": F,
+        "P": P,
+        "D0": D_pattern,
+        "est_level": est_level,
+        "pattern_level": pattern_level,
+        "length_bonus": length_bonus,
+    }
+
+# 윈도우 부하 단계에서 쓰이는 파라미터 (후보 축 브로드캐스트 시 [P x 1 x 1])
+# 나머지 파라미터(lam_L, lam_S, w_*, D_*, gamma_curve, level_offset)는 [P x 1]
+_WINDOW_PARAMS = frozenset((
+    'alpha', 'beta', 'gamma', 'delta', 'eta', 'theta', 'omega', 'cap_start', 'cap_range',
+))
+
+
+# compute_map_difficulty_population의 길이 묶음당 최소 곡 수
+_MIN_BUCKET_CHARTS = 50
+
+
+def compute_map_difficulty_population(
+    basis, lengths, duration, total_notes,
+    param_matrix, param_names,
+    chunk_size=16,
+    length_buckets=8,
+    **fixed_params,
+):
+    """
+    여러 파라미터 후보를 데이터셋 전체에 대해 한 번에 평가 (그리드 / 집단 탐색용).
+
+    param_matrix: [P x n_params] 후보 행렬
+    param_names:  각 열의 compute_map_difficulty_batch 인자 이름 (예: 'alpha', 'lam_L', 'D_max')
+    chunk_size:   한 번에 브로드캐스트할 후보 수. 중간 텐서가
+                  [chunk_size x charts x max_windows]이므로 메모리/캐시에 맞게 조절.
+    length_buckets: 곡을 윈도우 수 순으로 나눌 묶음 수. 묶음마다 패딩 폭을 그 묶음의
+                  최대 윈도우 수로 줄여 짧은 곡의 패딩 계산을 건너뜀 (1이면 나누지 않음,
+                  곡 수가 적으면 묶음당 최소 _MIN_BUCKET_CHARTS곡이 되도록 줄임).
+    fixed_params: 모든 후보에 공통인 나머지 인자
+
+    Returns:
+        compute_map_difficulty_batch와 같은 키의 dict. 각 값은 [P x charts]
+        (length_bonus는 파라미터와 무관하므로 [charts]).
+    """
+    param_matrix = np.atleast_2d(np.asarray(param_matrix, dtype=float))
+    if param_matrix.shape[1] != len(param_names):
+        raise ValueError(
+            f"param_matrix has {param_matrix.shape[1]} columns but {len(param_names)} param_names"
+        )
+
+    basis = np.asarray(basis, dtype=float)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    duration = np.asarray(duration, dtype=float)
+    total_notes = np.asarray(total_notes, dtype=float)
+    n_charts = len(lengths)
+
+    # 윈도우 수 순으로 정렬해 묶고, 묶음마다 패딩 폭을 줄인 기저를 한 번만 만듦
+    # (묶음이 너무 작으면 호출 오버헤드가 커지므로 묶음당 최소 _MIN_BUCKET_CHARTS곡)
+    order = np.argsort(lengths, kind='stable')
+    n_buckets = max(1, min(length_buckets, n_charts // _MIN_BUCKET_CHARTS))
+    buckets = [idx for idx in np.array_split(order, n_buckets) if len(idx)]
+    if len(buckets) > 1:
+        bucket_basis = [basis[idx, :int(lengths[idx].max())] for idx in buckets]
+    else:
+        buckets, bucket_basis = [np.arange(n_charts)], [basis]
+
+    keys = ("F", "P", "D0", "est_level", "pattern_level")
+    out = {"length_bonus": _length_bonus_array(duration, total_notes)}
+    for start in range(0, len(param_matrix), chunk_size):
+        chunk = param_matrix[start:start + chunk_size]
+        kwargs = dict(fixed_params)
+        for j, name in enumerate(param_names):
+            shape = (-1, 1, 1) if name in _WINDOW_PARAMS else (-1, 1)
+            kwargs[name] = chunk[:, j].reshape(shape)
+        for idx, sub_basis in zip(buckets, bucket_basis):
+            res = compute_map_difficulty_batch(
+                sub_basis, lengths[idx], duration[idx], total_notes[idx], **kwargs
+            )
+            for key in keys:
+                if key not in out:
+                    out[key] = np.empty((len(param_matrix), n_charts), dtype=np.asarray(res[key]).dtype)
+                # 후보와 무관한 값(예: D_max만 바뀔 때의 F)은 [charts]로 나오므로 [chunk x charts]로 맞춤
+                out[key][start:start + len(chunk), idx] = np.broadcast_to(res[key], (len(chunk), len(idx)))
+    return out
+
+
+def stack_chart_data(chart_data):
+    """
+    연구 스크립트의 chart_data 리스트 ({'metrics', 'duration', 'total_notes', 'label', ...})를
+    배치 파이프라인 입력 dict로 변환: basis, lengths, duration, total_notes, labels.
+    피처 기저는 여기서 한 번만 만들어지므로 최적화 중에는 가중치 곱만 반복됨.
+    """
+    basis, lengths = stack_feature_basis([d['metrics'] for d in chart_data])
+    return {
+        'basis': basis,
+        'lengths': lengths,
+        'duration': np.array([d['duration'] for d in chart_data], dtype=float),
+        'total_notes': np.array([d['total_notes'] for d in chart_data], dtype=float),
+        'labels': np.array([d['label'] for d in chart_data], dtype=float),
+    }
+
+def segment_index(offsets, idx):
+    """
+    CSR 형식(곡별 구간 offsets[i]:offsets[i+1])에서 곡 부분집합 idx의 행 위치.
+    Returns: (lengths [len(idx)], src [sum(lengths)]) - src는 idx 순서로 이어 붙인 원본 행 번호
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    idx = np.asarray(idx, dtype=np.int64)
+    starts = offsets[idx]
+    lengths = offsets[idx + 1] - starts
+    first = np.cumsum(lengths) - lengths
+    src = np.arange(int(lengths.sum()), dtype=np.int64) - np.repeat(first - starts, lengths)
+    return lengths, src
+
+
+def compact_chart_data(chart_data, dtype=np.float32):
+    """
+    chart_data 리스트를 compact 배치로 변환 (stack_chart_data의 패딩 없는 버전).
+
+    windows: [전체 윈도우 x 7] 연속 행렬 (피처 기저, 기본 float32)
+    offsets: [charts + 1] 곡별 구간 (곡 i = windows[offsets[i]:offsets[i+1]])
+    나머지(duration, total_notes, labels)는 곡 단위 배열.
+    파이프라인 입력은 take_chart_batch로 필요한 곡만 패딩 기저로 펼쳐서 만듦.
+    """
+    bases = [build_feature_basis(d['metrics']) for d in chart_data]
+    lengths = np.array([len(b) for b in bases], dtype=np.int64)
+    offsets = np.zeros(len(bases) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    windows = np.concatenate(bases) if bases else np.zeros((0, len(METRIC_KEYS)))
+    return {
+        'windows': np.ascontiguousarray(windows, dtype=dtype),
+        'offsets': offsets,
+        'duration': np.array([d['duration'] for d in chart_data], dtype=float),
+        'total_notes': np.array([d['total_notes'] for d in chart_data], dtype=float),
+        'labels': np.array([np.nan if d['label'] is None else d['label'] for d in chart_data], dtype=float),
+    }
+
+
+def take_chart_batch(batch, idx):
+    """
+    stack_chart_data 결과에서 곡 부분집합(idx)만 뽑은 배치 (CV fold / 티어 분할용).
+    패딩 폭은 부분집합의 최대 윈도우 수로 줄임.
+    compact 배치(compact_chart_data / feature_store.load_compact_dataset)이면
+    부분집합만 float64 패딩 기저로 펼침.
+    """
+    idx = np.asarray(idx, dtype=np.int64)
+    if 'windows' in batch:
+        lengths, src = segment_index(batch['offsets'], idx)
+        width = int(lengths.max()) if len(idx) else 0
+        basis = np.zeros((len(idx), width, batch['windows'].shape[1]))
+        rows = np.repeat(np.arange(len(idx)), lengths)
+        cols = np.arange(len(src)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        basis[rows, cols] = batch['windows'][src]
+    else:
+        lengths = batch['lengths'][idx]
+        width = int(lengths.max()) if len(idx) else 0
+        basis = batch['basis'][idx, :width]
+    return {
+        'basis': basis,
+        'lengths': lengths,
+        'duration': batch['duration'][idx],
+        'total_notes': batch['total_notes'][idx],
+        'labels': batch['labels'][idx],
+    }
+
+# ----------------------------
+# 6-2. 해석적 그래디언트 (최적화용)
+# ----------------------------
+# compute_level_jacobian이 미분할 수 있는 파라미터
+GRADIENT_PARAMS = LOAD_WEIGHT_NAMES + (
+    'lam_L', 'lam_S', 'w_F', 'w_P', 'w_V', 'D_min', 'D_max', 'gamma_curve', 'level_offset',
+)
+
+
+def _band_correction_slope(base):
+    """pattern_level_from_D0 밴드 보정(클램프 전)의 base에 대한 기울기"""
+    return np.select(
+        [base < 12.0, base < 13.0, base < 14.0, base < 17.0, base < 19.0],
+        [np.where(base - 1.5 > 1.0, 1.0, 0.0), 2.5, 2.5, 1.0, 2.75],
+        default=1.0,
+    )
+
+
+def compute_level_jacobian(
+    basis, lengths, duration, total_notes, wrt,
+    alpha=0.8, beta=1.0, gamma=1.0, delta=1.0, eta=0.5, theta=0.5,
+    omega=1.5,
+    lam_L=0.3, lam_S=0.8,
+    w_F=1.0, w_P=1.0, w_V=0.2,
+    cap_start=60.0, cap_range=30.0,
+    uncap_level=False,
+    D_min=0.0,
+    D_max=55.0,
+    gamma_curve=1.0,
+    level_offset=0.0,
+):
+    """
+    compute_map_difficulty_batch의 pattern_level과, wrt 파라미터에 대한 해석적 야코비안.
+
+    wrt: 미분할 파라미터 이름 (GRADIENT_PARAMS 중)
+    Returns: (pattern_level [charts], jacobian [charts x len(wrt)])
+
+    가중합 -> Soft Cap -> EMA -> mean/max/std -> L^5 노름 -> 길이 보정 -> 레벨 곡선의
+    연쇄 법칙. P(=max EMA_S)는 최대 윈도우 기준, 밴드 보정/클램프 경계와
+    est_level의 int() 절단은 거의 모든 곳에서 미분 가능하다는 가정(subgradient).
+    """
+    unknown = [name for name in wrt if name not in GRADIENT_PARAMS]
+    if unknown:
+        raise ValueError(f"no analytic gradient for {unknown}")
+
+    basis = np.asarray(basis, dtype=float)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    if np.any(lengths < 1):
+        raise ValueError("every chart needs at least one window")
+
+    n_charts, n_windows = basis.shape[:2]
+    j = np.arange(n_windows)[None, :]
+    mask = j < lengths[:, None]
+    n = lengths.astype(float)
+    rows = np.arange(n_charts)
+
+    # 1. 윈도우 부하와 Soft Cap 기울기 db/d(raw)
+    weights = np.array([alpha, beta, gamma, delta, eta, theta, omega], dtype=float)
+    raw = basis @ weights
+    b_t = soft_cap_load(raw, cap_start=cap_start, cap_range=cap_range)
+    excess = np.maximum(raw - cap_start, 0.0)
+    db_draw = np.where(raw > cap_start, (cap_range / (cap_range + excess)) ** 2, 1.0)
+
+    # 2. EMA / F / P / std
+    ema_L = ema(b_t, lam_L)
+    ema_S = ema(b_t, lam_S)
+    F = np.where(mask, ema_L, 0.0).sum(axis=-1) / n
+    i_peak = np.argmax(np.where(mask, ema_S, -np.inf), axis=-1)
+    P = ema_S[rows, i_peak]
+    mean_b = np.where(mask, b_t, 0.0).sum(axis=-1) / n
+    centered = np.where(mask, b_t - mean_b[:, None], 0.0)
+    std_b = np.sqrt((centered ** 2).sum(axis=-1) / n)
+
+    # 3. D0 = ||(w_F F, w_P P, w_V std)||_5 와 각 축 편미분
+    p = 5.0
+    vF, vP, vV = w_F * F, w_P * P, w_V * std_b
+    D_clear = (np.abs(vF) ** p + np.abs(vP) ** p + np.abs(vV) ** p) ** (1.0 / p)
+    safe_D = np.where(D_clear > 0, D_clear, 1.0)
+
+    def dnorm(v):
+        return np.where(D_clear > 0, np.sign(v) * (np.abs(v) / safe_D) ** (p - 1.0), 0.0)
+
+    dD_dF = w_F * dnorm(vF)
+    dD_dP = w_P * dnorm(vP)
+    dD_dstd = w_V * dnorm(vV)
+
+    # 4. 길이 보정
+    length_bonus = _length_bonus_array(duration, total_notes)
+    D_pattern = D_clear * length_bonus
+
+    # 5. 레벨 곡선 (x = (D - D_min) / (D_max - D_min))
+    span = D_max - D_min
+    x_raw = (D_pattern - D_min) / span
+    if uncap_level:
+        inside = x_raw > 0.0
+        x = np.where(inside, x_raw, 1.0)
+        scale = 100.0
+        slope = 1.0
+    else:
+        inside = (x_raw > 0.0) & (x_raw < 1.0)
+        x = np.where(inside, x_raw, 1.0)
+        scale = 24.0
+        base = 1.0 + 24.0 * np.clip(x_raw, 0.0, 1.0) ** gamma_curve
+        corrected = np.select(
+            [base < 12.0, base < 13.0, base < 14.0, base < 17.0, base < 19.0],
+            [
+                np.maximum(1.0, base - 1.5),
+                base - 1.5 * (1.0 - (base - 12.0)),
+                base + 1.5 * (base - 13.0),
+                base + 1.5,
+                base + 1.5 + (3.5 * ((base - 17.0) / 2.0)),
+            ],
+            default=base + 5.0,
+        )
+        slope = _band_correction_slope(base) * ((corrected > 1.0) & (corrected < 25.0))
+
+    pattern_level = pattern_level_array(
+        D_pattern, D_min=D_min, D_max=D_max, gamma=gamma_curve, uncap=uncap_level
+    ) + level_offset
+    dlevel_dx = np.where(inside, slope * scale * gamma_curve * x ** (gamma_curve - 1.0), 0.0)
+    dlevel_dgamma = np.where(inside, slope * scale * x ** gamma_curve * np.log(x), 0.0)
+    dlevel_dD0 = dlevel_dx / span * length_bonus  # D_clear 기준
+
+    jac = np.zeros((n_charts, len(wrt)))
+    wrt_index = {name: k for k, name in enumerate(wrt)}
+
+    # 가중치: dF/db_j, dP/db_j, dstd/db_j 를 윈도우 기저에 투영
+    weight_cols = [(k, wrt_index[name]) for k, name in enumerate(LOAD_WEIGHT_NAMES) if name in wrt_index]
+    if weight_cols:
+        keep_L = 1.0 - lam_L
+        c_first = (1.0 - keep_L ** n) / lam_L
+        c_L = np.where(j == 0, c_first[:, None], 1.0 - keep_L ** np.maximum(n[:, None] - j, 0.0))
+        dF_db = np.where(mask, c_L, 0.0) / n[:, None]
+
+        keep_S = 1.0 - lam_S
+        lag = i_peak[:, None] - j
+        g_S = np.where(j == 0, keep_S ** i_peak[:, None], lam_S * keep_S ** np.maximum(lag, 0))
+        dP_db = np.where(lag >= 0, g_S, 0.0)
+
+        safe_std = np.where(std_b > 0, std_b, 1.0)
+        dstd_db = np.where(std_b[:, None] > 0, centered / (n * safe_std)[:, None], 0.0)
+
+        dD_db = (dD_dF[:, None] * dF_db + dD_dP[:, None] * dP_db + dD_dstd[:, None] * dstd_db) * db_draw
+        dD_dw = np.einsum('cw,cwk->ck', dD_db, basis)
+        for k, col in weight_cols:
+            jac[:, col] = dlevel_dD0 * dD_dw[:, k]
+
+    # EMA 람다: z_i = dy_i/dlam = (b_i - y_{i-1}) + (1 - lam) * z_{i-1}, z_0 = 0
+    if 'lam_L' in wrt_index:
+        u = np.zeros_like(b_t)
+        u[:, 1:] = b_t[:, 1:] - ema_L[:, :-1]
+        z = lfilter([1.0], [1.0, -(1.0 - lam_L)], u, axis=-1)
+        dF_dlam = np.where(mask, z, 0.0).sum(axis=-1) / n
+        jac[:, wrt_index['lam_L']] = dlevel_dD0 * dD_dF * dF_dlam
+    if 'lam_S' in wrt_index:
+        u = np.zeros_like(b_t)
+        u[:, 1:] = b_t[:, 1:] - ema_S[:, :-1]
+        z = lfilter([1.0], [1.0, -(1.0 - lam_S)], u, axis=-1)
+        jac[:, wrt_index['lam_S']] = dlevel_dD0 * dD_dP * z[rows, i_peak]
+
+    # 노름 가중치
+    if 'w_F' in wrt_index:
+        jac[:, wrt_index['w_F']] = dlevel_dD0 * dnorm(vF) * F
+    if 'w_P' in wrt_index:
+        jac[:, wrt_index['w_P']] = dlevel_dD0 * dnorm(vP) * P
+    if 'w_V' in wrt_index:
+        jac[:, wrt_index['w_V']] = dlevel_dD0 * dnorm(vV) * std_b
+
+    # 레벨 곡선
+    if 'D_min' in wrt_index:
+        jac[:, wrt_index['D_min']] = dlevel_dx * (x_raw - 1.0) / span
+    if 'D_max' in wrt_index:
+        jac[:, wrt_index['D_max']] = dlevel_dx * (-x_raw / span)
+    if 'gamma_curve' in wrt_index:
+        jac[:, wrt_index['gamma_curve']] = dlevel_dgamma
+    if 'level_offset' in wrt_index:
+        jac[:, wrt_index['level_offset']] = 1.0
+
+    return pattern_level, jac
+
+
+def dataset_mae_and_grad(params, param_names, batch, **fixed_params):
+    """
+    MAE(pattern_level, labels)와 params에 대한 그래디언트.
+    scipy.optimize.minimize(..., jac=True)에 그대로 쓸 수 있는 (value, grad) 반환.
+
+    batch: stack_chart_data 결과
+    """
+    level, jac = compute_level_jacobian(
+        batch['basis'], batch['lengths'], batch['duration'], batch['total_notes'],
+        param_names, **dict(zip(param_names, params)), **fixed_params
+    )
+    residual = level - batch['labels']
+    return float(np.mean(np.abs(residual))), np.sign(residual) @ jac / len(residual)
+
+# ----------------------------
+# 6-3. 목적 함수 메모이제이션 (최적화용)
+# ----------------------------
+class ObjectiveCache:
+    """
+    목적 함수 fun(params, *args) 결과를 LRU로 캐시.
+    scipy.optimize.minimize에 fun 대신 그대로 넘길 수 있음.
+
+    키: (반올림한 params, 반올림한 작은 인자들, 데이터셋 식별자)
+    - 스칼라 / 작은 배열 (fixed_physics 등): decimals 자리로 반올림한 값
+    - 배치 dict / 큰 배열 (데이터셋): 객체 식별자 (fold마다 다른 키)
+      캐시가 참조를 유지하므로 clear() 전까지 식별자가 재사용되지 않음
+
+    hits / misses: 적중 / 실제 계산 횟수
+    """
+
+    def __init__(self, fun, maxsize=4096, decimals=12):
+        self.fun = fun
+        self.maxsize = maxsize
+        self.decimals = decimals
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._datasets = {}
+
+    def _round(self, values):
+        return tuple(np.round(np.asarray(values, dtype=float).ravel(), self.decimals).tolist())
+
+    def _arg_key(self, arg):
+        if isinstance(arg, (bool, int, float, np.number)):
+            return self._round([arg])
+        if isinstance(arg, (list, tuple, np.ndarray)) and np.size(arg) <= 32:
+            try:
+                return self._round(arg)
+            except (TypeError, ValueError):
+                pass
+        # 데이터셋: 객체 식별자 (참조를 잡아 두어 id 재사용 방지)
+        self._datasets[id(arg)] = arg
+        return ('dataset', id(arg))
+
+    def key(self, params, *args):
+        return (self._round(params),) + tuple(self._arg_key(a) for a in args)
+
+    def __call__(self, params, *args):
+        k = self.key(params, *args)
+        if k in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(k)
+            value = self._cache[k]
+        else:
+            self.misses += 1
+            value = self.fun(params, *args)
+            self._cache[k] = value
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        # (값, 그래디언트) 반환 시 호출자가 배열을 수정해도 캐시가 오염되지 않도록 복사
+        if isinstance(value, tuple):
+            return tuple(v.copy() if isinstance(v, np.ndarray) else v for v in value)
+        return value
+
+    def clear(self):
+        """캐시, 데이터셋 참조, 카운터 초기화 (fold가 바뀔 때 호출)"""
+        self._cache.clear()
+        self._datasets.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return f"cache hits={self.hits}, misses={self.misses} ({rate:.1%} hit)"
+
 # --------------------------------------
 # 7. 목표 생존률 별 난이도 기준선 예시
 # --------------------------------------
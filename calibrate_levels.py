@@ -3,9 +3,13 @@ import numpy as np
 from scipy.optimize import minimize
 import matplotlib.pyplot as plt
 
+import calc
+
 # Configuration
 DATA_PATH = r"d:\계산기\analysis_results_calibration.jsonl"
 OUTPUT_JSON = r"d:\계산기\calibration_results.json"
+# True면 밴드 보정까지 포함한 실제 레벨 매핑(calc.pattern_level_array)에 맞춰 보정
+BAND_CORRECTED = False
 
 def load_data():
     """Loads (D_raw, Label) pairs from the calibration dataset."""
@@ -37,16 +41,17 @@ def load_data():
 def mapping_function(D, D_min, D_max, gamma):
     """
     L = 1 + 24 * ((D - D_min) / (D_max - D_min)) ** gamma
+    (BAND_CORRECTED=True: calc.pattern_level_array와 동일)
     """
     # Avoid division by zero
     if D_max <= D_min:
         return np.ones_like(D)
     
-    # Normalize
-    norm_D = (D - D_min) / (D_max - D_min)
-    norm_D = np.maximum(0, norm_D) # Clamp negative to 0
+    if BAND_CORRECTED:
+        return calc.pattern_level_array(D, D_min, D_max, gamma, uncap=False)
     
-    return 1 + 24 * (norm_D ** gamma)
+    # Normalize (Clamp negative to 0, 상한 없음) - calc와 같은 곡선 사용
+    return 1 + 24 * calc.level_curve_array(D, D_min, D_max, gamma, clamp=False)
 
 def objective_function(params, D_vals, L_true):
     D_min, D_max, gamma = params
@@ -91,8 +96,10 @@ def calibrate():
     print(f"Initial params: {initial_params}")
     
     # Optimization
+    # Nelder-Mead는 축소/반사 단계에서 같은 꼭짓점을 자주 다시 평가하므로 캐시 사용
+    cached_objective = calc.ObjectiveCache(objective_function)
     result = minimize(
-        objective_function, 
+        cached_objective, 
         initial_params, 
         args=(D_vals, L_true),
         method='Nelder-Mead',
@@ -104,6 +111,7 @@ def calibrate():
     print("\nOptimization Complete!")
     print(f"Success: {result.success}")
     print(f"Message: {result.message}")
+    print(f"Objective {cached_objective.stats()}")
     print(f"Optimized Parameters:")
     print(f"  D_min: {opt_D_min:.4f}")
     print(f"  D_max: {opt_D_max:.4f}")
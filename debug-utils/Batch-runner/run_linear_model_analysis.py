@@ -4,102 +4,29 @@
 """
 
 import os
-import glob
 import time
 import numpy as np
 from sklearn.linear_model import LinearRegression
-import bms_parser
-import metric_calc
+import feature_store
 import json
 
 def load_and_analyze_all_bms():
-    """BMS 전체 로드 및 분석"""
+    """BMS 전체 로드 및 분석 (공용 피처 저장소 사용)"""
     target_dirs = [
         r"d:\계산기\테스트 샘플",
         r"d:\계산기\패턴 모음",
         r"d:\계산기\패턴 모음2(GCS)",
     ]
     
-    files = []
-    for root_dir in target_dirs:
-        for ext in ['*.bms', '*.bme', '*.bml']:
-            files.extend(glob.glob(os.path.join(root_dir, '**', ext), recursive=True))
-            
-    print(f"Found {len(files)} BMS files.")
-    
-    # 피처 및 레이블 수집 (레이블 있는 것만)
-    labeled_data = []
-    all_data = []
-    
     start_time = time.time()
     
-    for i, file_path in enumerate(files):
-        if i % 300 == 0:
-            print(f"Processing {i}/{len(files)}...")
-            
-        try:
-            is_gcs = "패턴 모음2(GCS)" in file_path
-            
-            parser = bms_parser.BMSParser(file_path)
-            notes = parser.parse()
-            if not notes: continue
-                
-            duration = parser.duration
-            if duration < 10: continue
-            
-            title = parser.header.get('TITLE', 'Unknown')
-            
-            # Get Label
-            label = None
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                for line in f:
-                    if line.upper().startswith("#PLAYLEVEL"):
-                        try:
-                            label = int(line.split()[1])
-                        except: pass
-                    if line.upper().startswith("#TITLE"):
-                        try:
-                            title = line.split(maxsplit=1)[1].strip()
-                        except: pass
-            
-            # GCS Filtering
-            original_label = label
-            if is_gcs:
-                if label is None or label == 0: continue
-                label = label - 5
-                if label < 1: continue
-            
-            # 이상치 제외 (Label >= 90)
-            if label is not None and label >= 90:
-                continue
-            
-            metrics = metric_calc.calculate_metrics(notes, duration)
-            total_notes = len(notes)
-            
-            # 피처 계산
-            global_nps = total_notes / duration
-            nps_std = np.std(metrics['nps'])
-            chord_mean = np.mean(metrics['chord_strain'])
-            
-            entry = {
-                'file': os.path.basename(file_path),
-                'title': title,
-                'label': label,
-                'global_nps': global_nps,
-                'nps_std': nps_std,
-                'chord_mean': chord_mean,
-                'total_notes': total_notes,
-                'duration': duration,
-                'is_gcs': is_gcs
-            }
-            
-            all_data.append(entry)
-            
-            if label is not None:
-                labeled_data.append(entry)
-                
-        except Exception as e:
-            pass
+    # 이상치 제외 (Label >= 90)
+    all_data = feature_store.load_chart_data(
+        sources=target_dirs, bms_only=True, labeled_only=False, max_label=89
+    )
+    
+    # 선형 모델 피처 (global_nps, nps_std, chord_mean)는 저장소 집계값 그대로 사용
+    labeled_data = [d for d in all_data if d['label'] is not None]
     
     end_time = time.time()
     print(f"\nLoaded {len(labeled_data)} labeled charts (out of {len(all_data)} total) in {end_time - start_time:.2f}s")
@@ -4,6 +4,7 @@ BMS vs OSU NPS 표준편차 차이 심층 분석
 """
 from bms_parser import BMSParser
 from osu_parser import OsuParser
+import metric_calc
 import numpy as np
 
 # 파일 경로
@@ -29,13 +30,10 @@ print(f'BMS: 노트수={len(bms_notes):,}, 길이={bms_duration:.3f}초')
 print(f'OSU: 노트수={len(osu_notes):,}, 길이={osu_duration:.3f}초')
 print()
 
-# 1초 윈도우별 NPS 계산
+# 1초 윈도우별 NPS 계산 (new_calc.calculate_nps_metrics와 동일한 히스토그램)
 def calc_window_nps(notes, duration):
-    window_nps = []
-    for t in range(int(duration) + 1):
-        count = sum(1 for n in notes if t <= n['time'] < t + 1)
-        window_nps.append(count)
-    return window_nps
+    times = [n['time'] for n in notes]
+    return metric_calc.window_note_counts(times, int(duration) + 1).tolist()
 
 bms_window_nps = calc_window_nps(bms_notes, bms_duration)
 osu_window_nps = calc_window_nps(osu_notes, osu_duration)
@@ -42,18 +42,11 @@ print(f"Peak NPS   (±500ms 최대 밀도):    {metrics['peak_nps']}개")
 print(f"NPS 표준편차 (변동성):            {metrics['nps_std']}")
 print()
 
-# Peak 발생 지점 찾기
-local_nps_all = []
-for note in notes:
-    t = round(note['time'], 3)  # ms 단위로 반올림
-    # 부동소수점 오차 방지: t+0.5 대신 t+0.499999999999 사용 후 <= 비교
-    window_start = t - 0.5
-    window_end = t + 0.499999999999
-    count = sum(1 for n in notes if window_start <= n['time'] <= window_end)
-    local_nps_all.append((t, count))
+# Peak 발생 지점 찾기 (±500ms 최고 밀도 구간)
+sections = new_calc.find_dense_sections(notes, k=3)
 
 # Peak NPS 발생 시점
-peak_time, peak_value = max(local_nps_all, key=lambda x: x[1])
+peak_time, peak_value = sections[0]['center'], sections[0]['count']
 
 print("=" * 60)
 print(f"Peak NPS 발생 시점")
@@ -62,6 +55,11 @@ print(f"시간: {peak_time:.3f}초 ({peak_time/60:.2f}분)")
 print(f"밀도: {peak_value}개 (±500ms 구간 내)")
 print()
 
+print("밀도 상위 구간:")
+for rank, sec in enumerate(sections, 1):
+    print(f"  {rank}. {sec['start']:.3f}초 ~ {sec['end']:.3f}초: {sec['count']}개")
+print()
+
 # Peak NPS를 1초당으로 환산 (참고용)
 peak_per_second = peak_value  # ±500ms = 1초 구간이므로 그대로 사용
 print(f"Peak NPS (1초당 환산): {peak_per_second}개/초")
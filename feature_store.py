@@ -0,0 +1,412 @@
+"""
+연구/최적화 스크립트 공용 피처 저장소 (Feature Store)
+
+라이브러리를 한 번만 파싱해 곡별 윈도우 메트릭, 스칼라 집계값, 레이블, 출처 정보를
+하나의 열 기반 npz 파일에 저장합니다. 각 스크립트는 load_chart_data()로
+기존 load_charts()와 같은 형태의 chart_data 리스트를 1초 이내에 불러옵니다.
+
+    python feature_store.py        # 저장소 생성 (기본 경로)
+"""
+
+import os
+import time
+import hashlib
+import numpy as np
+import bms_parser
+import osu_parser
+import metric_calc
+import calc
+
+DEFAULT_STORE_PATH = r"d:\계산기\feature_store.npz"
+DEFAULT_TARGET_DIRS = [
+    r"d:\계산기\테스트 샘플",
+    r"d:\계산기\패턴 모음",
+    r"d:\계산기\패턴 모음2(GCS)",
+    r"d:\계산기\osu 폴더 전체"
+]
+
+STORE_VERSION = 1
+# note_fingerprint 규칙 버전 (저장소의 note_hash_version과 다르면 로드 시 dedup 생략 -> 재생성 필요)
+NOTE_HASH_VERSION = 2
+# 파서 노트 종류 -> 지문 코드 (LN은 시작/끝 노트 쌍으로 나옴)
+NOTE_TYPE_CODES = {'note': 0, 'ln_start': 1, 'ln_end': 2}
+GCS_DIR_NAME = "패턴 모음2(GCS)"
+BMS_EXTENSIONS = {'.bms', '.bme', '.bml'}
+OSU_EXTENSIONS = {'.osu'}
+
+# 스칼라 집계값 이름 (explore_linear_features 등에서 사용하는 짧은 이름)
+AGGREGATE_NAMES = {
+    'nps': 'nps',
+    'ln_strain': 'ln',
+    'jack_pen': 'jack',
+    'roll_pen': 'roll',
+    'alt_cost': 'alt',
+    'hand_strain': 'hand',
+    'chord_strain': 'chord',
+}
+AGGREGATE_STATS = ('mean', 'max', 'std')
+
+def scan_files(target_dirs):
+    """Yields (source_idx, file_path) for BMS/OSU files, in a stable order."""
+    extensions = BMS_EXTENSIONS | OSU_EXTENSIONS
+    for source_idx, root_dir in enumerate(target_dirs):
+        for root, dirs, files in os.walk(root_dir):
+            dirs.sort()
+            for file in sorted(files):
+                if os.path.splitext(file)[1].lower() in extensions:
+                    yield source_idx, os.path.join(root, file)
+
+def read_bms_header(file_path):
+    """
+    #PLAYLEVEL / #TITLE 읽기. 여러 번 나오면 마지막 값 사용
+    (기존 스크립트의 헤더 루프, 파서 header dict와 같은 규칙)
+    """
+    label = None
+    title = "Unknown"
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            upper = line.upper()
+            if upper.startswith("#PLAYLEVEL"):
+                try:
+                    label = int(line.split()[1])
+                except: pass
+            elif upper.startswith("#TITLE"):
+                try:
+                    title = line.split(maxsplit=1)[1].strip()
+                except: pass
+    return label, title
+
+def file_content_hash(path):
+    """원본 바이트의 SHA-1 (같은 파일이 여러 팩에 복사돼 있으면 같은 값)"""
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def note_fingerprint(notes):
+    """
+    노트 배열의 정규화 해시 (파일 형식/헤더/팩과 무관하게 같은 채보면 같은 값).
+    (첫 노트 기준 상대 시간 ms, 열, 노트 종류 코드)를 정렬해 SHA-1.
+    종류(note / ln_start / ln_end)를 넣으므로 LN 차트와 같은 시각의 단타 차트는 다른 값.
+    """
+    if not notes:
+        return ''
+    t0 = min(n['time'] for n in notes)
+    rows = sorted(
+        (round((n['time'] - t0) * 1000), int(n['column']),
+         NOTE_TYPE_CODES.get(n.get('type'), len(NOTE_TYPE_CODES)))
+        for n in notes
+    )
+    return hashlib.sha1(np.array(rows, dtype=np.int64).tobytes()).hexdigest()
+
+def is_gcs_path(file_path):
+    return GCS_DIR_NAME in file_path
+
+def gcs_label(label):
+    """GCS 레이블 규칙: PLAYLEVEL - 5. 0/미표기/1 미만은 None (제외 대상)"""
+    if label is None or label == 0:
+        return None
+    label = label - 5
+    return label if label >= 1 else None
+
+def extract_chart(file_path, keep_notes=False, keep_header=False):
+    """
+    차트 1개 파싱 + 메트릭 계산. 연구 스크립트 공통 필터 적용:
+    - Osu: 10K만, 레이블 없음
+    - 길이 10초 미만 제외
+    - GCS(패턴 모음2): PLAYLEVEL - 5, 0/미표기/1 미만은 제외
+
+    keep_notes=True 이면 파싱한 노트 리스트도 'notes'로 반환 (new_calc 선형 모델용)
+    keep_header=True 이면 파서 헤더 dict도 'header'로 반환 (라이브러리 인덱스용)
+
+    Returns: dict 또는 None (제외 대상). 'note_hash'는 note_fingerprint(notes)
+    """
+    is_osu = os.path.splitext(file_path)[1].lower() in OSU_EXTENSIONS
+    is_gcs = is_gcs_path(file_path)
+
+    if is_osu:
+        parser = osu_parser.OsuParser(file_path)
+    else:
+        parser = bms_parser.BMSParser(file_path)
+
+    notes = parser.parse()
+    if not notes:
+        return None
+    if is_osu and parser.key_count != 10:
+        return None
+
+    duration = parser.duration
+    if duration < 10:
+        return None
+
+    if is_osu:
+        label = None
+        title = parser.header.get('Title', 'Unknown')
+    else:
+        label, title = read_bms_header(file_path)
+
+    if is_gcs:
+        label = gcs_label(label)
+        if label is None:
+            return None
+
+    chart = {
+        'metrics': metric_calc.calculate_metrics(notes, duration),
+        'duration': float(duration),
+        'total_notes': len(notes),
+        'label': label,
+        'title': title,
+        'path': file_path,
+        'is_osu': is_osu,
+        'is_gcs': is_gcs,
+        'key_count': int(parser.key_count),
+        'note_hash': note_fingerprint(notes),
+    }
+    if keep_notes:
+        chart['notes'] = notes
+    if keep_header:
+        chart['header'] = parser.header
+    return chart
+
+def chart_aggregates(metrics):
+    """곡 1개의 스칼라 집계값 {'<short>_<stat>': float} (pack_charts의 agg_* 열과 같은 정의)"""
+    aggregates = {}
+    for key in calc.METRIC_KEYS:
+        v = np.asarray(metrics[key], dtype=float)
+        short = AGGREGATE_NAMES[key]
+        aggregates[f'{short}_mean'] = float(v.mean()) if len(v) else 0.0
+        aggregates[f'{short}_max'] = float(v.max()) if len(v) else 0.0
+        aggregates[f'{short}_std'] = float(v.std()) if len(v) else 0.0
+    return aggregates
+
+def pack_charts(charts, source_idx, target_dirs):
+    """
+    chart dict 리스트 -> npz에 저장할 열(column) dict.
+    윈도우 메트릭은 곡별 배열을 이어 붙이고 metric_offsets로 구간을 표시 (CSR 형식).
+    """
+    lengths = np.array([len(c['metrics']['nps']) for c in charts], dtype=np.int64)
+    offsets = np.zeros(len(charts) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    duration = np.array([c['duration'] for c in charts], dtype=float)
+    total_notes = np.array([c['total_notes'] for c in charts], dtype=np.int64)
+
+    columns = {
+        'version': np.array(STORE_VERSION),
+        'source_dirs': np.array(target_dirs, dtype=str),
+        'metric_offsets': offsets,
+        'source': np.asarray(source_idx, dtype=np.int64),
+        'path': np.array([c['path'] for c in charts], dtype=str),
+        'title': np.array([c['title'] for c in charts], dtype=str),
+        'label': np.array([np.nan if c['label'] is None else c['label'] for c in charts], dtype=float),
+        'duration': duration,
+        'total_notes': total_notes,
+        'global_nps': total_notes / np.maximum(duration, 1e-9),
+        'is_osu': np.array([c['is_osu'] for c in charts], dtype=bool),
+        'is_gcs': np.array([c['is_gcs'] for c in charts], dtype=bool),
+        'key_count': np.array([c['key_count'] for c in charts], dtype=np.int64),
+        'content_hash': np.array([c.get('content_hash', '') for c in charts], dtype=str),
+        'note_hash': np.array([c.get('note_hash', '') for c in charts], dtype=str),
+        'note_hash_version': np.array(NOTE_HASH_VERSION),
+    }
+    for key in calc.METRIC_KEYS:
+        values = [np.asarray(c['metrics'][key], dtype=float) for c in charts]
+        flat = np.concatenate(values) if values else np.zeros(0)
+        columns['metric_' + key] = flat
+
+        short = AGGREGATE_NAMES[key]
+        columns[f'agg_{short}_mean'] = np.array([v.mean() if len(v) else 0.0 for v in values])
+        columns[f'agg_{short}_max'] = np.array([v.max() if len(v) else 0.0 for v in values])
+        columns[f'agg_{short}_std'] = np.array([v.std() if len(v) else 0.0 for v in values])
+    return columns
+
+def save_columns(columns, out_path):
+    """임시 파일에 쓴 뒤 교체 (중간에 중단돼도 기존 저장소 유지)"""
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **columns)
+    os.replace(tmp_path, out_path)
+
+def build_feature_store(out_path=DEFAULT_STORE_PATH, target_dirs=DEFAULT_TARGET_DIRS):
+    """
+    라이브러리 전체를 파싱해 피처 저장소 생성.
+    앞서 저장한 파일과 바이트가 같은 파일은 파싱하지 않고 건너뜁니다 (여러 팩에 복사된 차트).
+    단 GCS 폴더 여부가 다르면 레이블 규칙이 달라지므로 (PLAYLEVEL - 5) 따로 저장합니다.
+    노트가 같은 차트(변환본 등)는 note_hash 열로 표시되며 로드 시 dedup으로 제외됩니다.
+    """
+    target_dirs = list(target_dirs)
+    files = list(scan_files(target_dirs))
+    print(f"Found {len(files)} files.")
+
+    charts = []
+    source_idx = []
+    stored_hashes = set()
+    n_copies = 0
+    start_time = time.time()
+    for i, (src, file_path) in enumerate(files):
+        if i % 200 == 0:
+            print(f"Processing {i}/{len(files)}...")
+        try:
+            content_hash = file_content_hash(file_path)
+            if (content_hash, is_gcs_path(file_path)) in stored_hashes:
+                n_copies += 1
+                continue
+            chart = extract_chart(file_path)
+        except Exception as e:
+            # print(f"Error loading {file_path}: {e}")
+            continue
+        if chart is None:
+            continue
+        chart['content_hash'] = content_hash
+        stored_hashes.add((content_hash, chart['is_gcs']))
+        charts.append(chart)
+        source_idx.append(src)
+
+    save_columns(pack_charts(charts, source_idx, target_dirs), out_path)
+    print(f"Stored {len(charts)}/{len(files)} charts ({n_copies} byte-identical copies skipped) "
+          f"in {time.time() - start_time:.1f}s -> {out_path}")
+
+def load_feature_store(path=DEFAULT_STORE_PATH):
+    """npz 저장소를 열(column) dict로 로드"""
+    with np.load(path) as data:
+        columns = {k: data[k] for k in data.files}
+    if int(columns['version']) != STORE_VERSION:
+        raise ValueError(f"Unsupported feature store version: {int(columns['version'])}")
+    return columns
+
+def first_occurrences(keys):
+    """keys에서 각 값이 처음 나온 위치 (오름차순). 빈 문자열(해시 없음)은 모두 유지"""
+    keys = np.asarray(keys)
+    _, first = np.unique(keys, return_index=True)
+    keep = np.zeros(len(keys), dtype=bool)
+    keep[first] = True
+    keep |= keys == ''
+    return np.flatnonzero(keep)
+
+def dedup_keys(note_hash, label):
+    """
+    중복 판정 키 (노트 지문, 레이블). 노트가 같아도 레이블이 다르면(GCS 사본 등) 다른 곡으로 남겨
+    어느 레이블이 남는지가 폴더 순서에 좌우되지 않도록 함. 해시 없는 곡은 '' (모두 유지)
+    """
+    return np.array([f"{h}|{l}" if h else '' for h, l in zip(note_hash, label)], dtype=str)
+
+def select_charts(cols, sources=None, bms_only=False, labeled_only=True, max_label=None, dedup=True):
+    """
+    저장소 열에서 필터 조건에 맞는 곡 인덱스 (load_chart_data / load_compact_dataset 공용).
+    dedup=True 이면 노트와 레이블이 같은 차트(dedup_keys)는 필터를 통과한 것 중 첫 번째만 남깁니다
+    (note_hash 열이 없거나 지문 규칙 버전이 다른 이전 저장소는 그대로).
+    """
+    label = cols['label']
+
+    mask = np.ones(len(label), dtype=bool)
+    if sources is not None:
+        wanted = {os.path.normcase(os.path.normpath(s)) for s in sources}
+        source_ok = np.array([os.path.normcase(os.path.normpath(s)) in wanted for s in cols['source_dirs']], dtype=bool)
+        mask &= source_ok[cols['source']] if len(source_ok) else False
+    if bms_only:
+        mask &= ~cols['is_osu']
+    if labeled_only:
+        mask &= ~np.isnan(label)
+    if max_label is not None:
+        mask &= ~(label > max_label)
+    idx = np.flatnonzero(mask)
+    if dedup and 'note_hash' in cols and int(cols.get('note_hash_version', 1)) == NOTE_HASH_VERSION:
+        idx = idx[first_occurrences(dedup_keys(cols['note_hash'][idx], cols['label'][idx]))]
+    return idx
+
+def load_chart_data(path=DEFAULT_STORE_PATH, sources=None, bms_only=False,
+                    labeled_only=True, max_label=None, build_if_missing=True, dedup=True):
+    """
+    저장소에서 기존 load_charts()와 같은 형태의 chart_data 리스트 생성.
+
+    Args:
+        sources: 포함할 원본 폴더 목록 (None이면 전체)
+        bms_only: Osu 차트 제외
+        labeled_only: 레이블 없는 차트 제외
+        max_label: 레이블이 이 값보다 큰 차트 제외 (이상치 필터)
+        build_if_missing: 저장소가 없으면 기본 폴더로 생성
+        dedup: 노트가 같은 중복 차트는 한 번만 포함
+
+    Returns:
+        list of dict: {'metrics', 'duration', 'total_notes', 'label', 'title', 'file',
+                       'path', 'is_osu', 'is_gcs', 'global_nps', '<feature>_mean/max/std'}
+        metrics 배열은 저장소 배열의 view (복사 없음)
+    """
+    if build_if_missing and not os.path.exists(path):
+        print(f"Feature store not found. Building {path} ...")
+        build_feature_store(path)
+
+    cols = load_feature_store(path)
+    label = cols['label']
+
+    offsets = cols['metric_offsets']
+    metric_cols = {key: cols['metric_' + key] for key in calc.METRIC_KEYS}
+    agg_cols = {k[4:]: cols[k] for k in cols if k.startswith('agg_')}
+
+    chart_data = []
+    for i in select_charts(cols, sources, bms_only, labeled_only, max_label, dedup):
+        s, e = offsets[i], offsets[i + 1]
+        entry = {
+            'metrics': {key: arr[s:e] for key, arr in metric_cols.items()},
+            'duration': float(cols['duration'][i]),
+            'total_notes': int(cols['total_notes'][i]),
+            'label': None if np.isnan(label[i]) else int(label[i]),
+            'title': str(cols['title'][i]),
+            'file': os.path.basename(str(cols['path'][i])),
+            'path': str(cols['path'][i]),
+            'is_osu': bool(cols['is_osu'][i]),
+            'is_gcs': bool(cols['is_gcs'][i]),
+            'global_nps': float(cols['global_nps'][i]),
+        }
+        for name, arr in agg_cols.items():
+            entry[name] = float(arr[i])
+        chart_data.append(entry)
+
+    print(f"Loaded {len(chart_data)} charts from feature store.")
+    return chart_data
+
+def load_compact_dataset(path=DEFAULT_STORE_PATH, sources=None, bms_only=False,
+                         labeled_only=True, max_label=None, build_if_missing=True,
+                         dtype=np.float32, dedup=True):
+    """
+    저장소에서 곡별 dict 없이 compact 배치를 바로 생성 (대용량 학습 세트용).
+
+    Returns:
+        dict (calc.compact_chart_data와 같은 형식 + 메타데이터 배열):
+            'windows'     [전체 윈도우 x 7] 연속 피처 기저 (dtype, 기본 float32)
+            'offsets'     [charts + 1] 곡별 윈도우 구간
+            'duration', 'total_notes', 'labels' (레이블 없으면 NaN)
+            'path', 'title', 'is_osu', 'is_gcs'
+        calc.take_chart_batch로 fold 부분집합을 패딩 기저로 펼치고,
+        batch_pool은 모든 배열을 공유 메모리 한 블록으로 워커에 전달합니다.
+    """
+    if build_if_missing and not os.path.exists(path):
+        print(f"Feature store not found. Building {path} ...")
+        build_feature_store(path)
+
+    cols = load_feature_store(path)
+    idx = select_charts(cols, sources, bms_only, labeled_only, max_label, dedup)
+
+    lengths, src = calc.segment_index(cols['metric_offsets'], idx)
+    offsets = np.zeros(len(idx) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    # 피처 기저 열 순서 = calc.METRIC_KEYS, NPS 비선형 스케일은 float64에서 적용 후 변환
+    windows = np.empty((len(src), len(calc.METRIC_KEYS)), dtype=dtype)
+    for j, key in enumerate(calc.METRIC_KEYS):
+        column = cols['metric_' + key][src]
+        windows[:, j] = calc.scale_nps(column) if key == 'nps' else column
+
+    print(f"Loaded {len(idx)} charts ({len(src)} windows, {windows.nbytes / 2**20:.1f} MiB) from feature store.")
+    return {
+        'windows': windows,
+        'offsets': offsets,
+        'duration': cols['duration'][idx],
+        'total_notes': cols['total_notes'][idx].astype(float),
+        'labels': cols['label'][idx],
+        'path': cols['path'][idx],
+        'title': cols['title'][idx],
+        'is_osu': cols['is_osu'][idx],
+        'is_gcs': cols['is_gcs'][idx],
+    }
+
+if __name__ == "__main__":
+    build_feature_store()
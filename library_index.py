@@ -0,0 +1,303 @@
+"""
+SQLite 라이브러리 인덱스
+
+배치 채점 결과를 파일마다 흩어진 .jsonl / .txt / .csv 대신 하나의 SQLite DB에 모읍니다.
+
+    charts      : 곡 1개 = 파일 1개 (경로, 내용 해시, 노트 지문, 형식, 키 모드, 레이블, 헤더 JSON)
+    features    : 곡별 스칼라 집계값 (global_nps, <metric>_mean/max/std)
+    predictions : (곡, 모델 버전)별 예측 레벨 / D0
+
+score.py --index 로 채점하면서 증분 갱신하며 (경로의 크기/수정 시각이 같고 해당 모델 버전
+예측이 이미 있으면 건너뜀), 조회는 인덱스를 타는 SQL 한 번입니다.
+
+    python library_index.py --keys 10 --level 15 17 --label 12     # 10K, 예측 15~17, 레이블 12
+    python library_index.py --format BMS --label 12 --model-version calc-v3-...
+    python library_index.py --duplicates                              # 노트가 같은 차트 묶음
+"""
+
+import os
+import json
+import time
+import sqlite3
+import argparse
+import feature_store
+
+DEFAULT_INDEX_PATH = r"d:\계산기\library_index.sqlite"
+SCHEMA_VERSION = 3
+
+# 헤더 중 저장할 키 (BMS #WAV/#BMP 정의 같은 대용량 항목 제외)
+HEADER_KEYS = (
+    'TITLE', 'SUBTITLE', 'ARTIST', 'SUBARTIST', 'GENRE', 'PLAYLEVEL', 'DIFFICULTY', 'PLAYER',
+    'BPM', 'TOTAL', 'RANK', 'LNOBJ', 'LNTYPE',
+    'Title', 'TitleUnicode', 'Artist', 'ArtistUnicode', 'Creator', 'Version', 'Source', 'Tags',
+    'BeatmapID', 'BeatmapSetID', 'Mode', 'HPDrainRate', 'OverallDifficulty',
+)
+
+# features 테이블 열 (feature_store.AGGREGATE_NAMES 짧은 이름 x AGGREGATE_STATS)
+FEATURE_COLUMNS = ('global_nps',) + tuple(
+    f'{short}_{stat}'
+    for short in feature_store.AGGREGATE_NAMES.values()
+    for stat in feature_store.AGGREGATE_STATS
+)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS charts (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    content_hash TEXT NOT NULL,
+    note_hash TEXT,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    format TEXT NOT NULL,
+    key_mode INTEGER,
+    title TEXT,
+    label INTEGER,
+    is_gcs INTEGER NOT NULL DEFAULT 0,
+    duration REAL,
+    total_notes INTEGER,
+    header TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_charts_hash ON charts(content_hash);
+CREATE INDEX IF NOT EXISTS idx_charts_key_label ON charts(key_mode, label);
+CREATE INDEX IF NOT EXISTS idx_charts_format_label ON charts(format, label);
+
+CREATE TABLE IF NOT EXISTS features (
+    chart_id INTEGER PRIMARY KEY REFERENCES charts(id) ON DELETE CASCADE,
+    {', '.join(f'{col} REAL' for col in FEATURE_COLUMNS)}
+);
+
+CREATE TABLE IF NOT EXISTS predictions (
+    chart_id INTEGER NOT NULL REFERENCES charts(id) ON DELETE CASCADE,
+    model_version TEXT NOT NULL,
+    level REAL,
+    d0 REAL,
+    scored_at REAL,
+    PRIMARY KEY (chart_id, model_version)
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_model_level ON predictions(model_version, level);
+"""
+
+def header_summary(header):
+    """파서 헤더에서 HEADER_KEYS만 남긴 dict"""
+    return {k: header[k] for k in HEADER_KEYS if k in header}
+
+class LibraryIndex:
+    """
+    채점 결과 SQLite 인덱스.
+
+    - add(record, size, mtime_ns, model_version): 곡/피처/예측 upsert (파일이 바뀌었으면 이전 예측 삭제)
+    - indexed(model_version): 이미 예측이 있는 {경로: (크기, 수정 시각)} -> 증분 갱신 판단
+    - query(...): 키 모드 / 형식 / 레이블 / 예측 레벨 범위로 조회
+
+    쓰기는 commit()까지 한 트랜잭션으로 묶입니다 (with 문으로 열면 종료 시 commit + close).
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript(SCHEMA)
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+        version = SCHEMA_VERSION if row is None else int(row['value'])
+        if version > SCHEMA_VERSION:
+            raise ValueError(f"Unsupported library index schema: {version}")
+        if version < 2:
+            # v1 -> v2: 노트 지문 열 추가 (기존 곡은 다음 채점 때 채워짐)
+            self.conn.execute("ALTER TABLE charts ADD COLUMN note_hash TEXT")
+        elif version < 3:
+            # v2 -> v3: 노트 종류를 넣은 새 지문 규칙 -> 이전 지문은 버리고 다음 채점 때 다시 채움
+            self.conn.execute("UPDATE charts SET note_hash = NULL")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_charts_note_hash ON charts(note_hash)")
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        self.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM charts").fetchone()[0]
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def indexed(self, model_version):
+        """model_version 예측이 있는 곡의 {경로: (크기, 수정 시각 ns)}"""
+        rows = self.conn.execute(
+            "SELECT c.path, c.size, c.mtime_ns FROM charts c "
+            "JOIN predictions p ON p.chart_id = c.id WHERE p.model_version = ?",
+            (model_version,))
+        return {row['path']: (row['size'], row['mtime_ns']) for row in rows}
+
+    def add(self, record, size, mtime_ns, model_version):
+        """
+        score.score_file 결과 1개 저장. record에 'content_hash', 'note_hash', 'features', 'header'가 필요합니다.
+        Returns: chart id
+        """
+        cur = self.conn.execute("SELECT id, size, mtime_ns FROM charts WHERE path = ?", (record['full_path'],))
+        row = cur.fetchone()
+        values = (
+            record['content_hash'], record['note_hash'], size, mtime_ns, record['type'], record['key_count'],
+            record['title'], record['label'], int(bool(record['is_gcs'])),
+            record['duration'], record['total_notes'],
+            json.dumps(record.get('header', {}), ensure_ascii=False),
+        )
+        if row is None:
+            cur = self.conn.execute(
+                "INSERT INTO charts (content_hash, note_hash, size, mtime_ns, format, key_mode, title, label, "
+                "is_gcs, duration, total_notes, header, path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                values + (record['full_path'],))
+            chart_id = cur.lastrowid
+        else:
+            chart_id = row['id']
+            if (row['size'], row['mtime_ns']) != (size, mtime_ns):
+                # 파일 내용이 바뀌면 다른 모델 버전의 예측도 더 이상 유효하지 않음
+                self.conn.execute("DELETE FROM predictions WHERE chart_id = ?", (chart_id,))
+            self.conn.execute(
+                "UPDATE charts SET content_hash = ?, note_hash = ?, size = ?, mtime_ns = ?, format = ?, key_mode = ?, "
+                "title = ?, label = ?, is_gcs = ?, duration = ?, total_notes = ?, header = ? WHERE id = ?",
+                values + (chart_id,))
+
+        features = record.get('features', {})
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO features (chart_id, {', '.join(FEATURE_COLUMNS)}) "
+            f"VALUES (?{', ?' * len(FEATURE_COLUMNS)})",
+            (chart_id,) + tuple(features.get(col) for col in FEATURE_COLUMNS))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO predictions (chart_id, model_version, level, d0, scored_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (chart_id, model_version, record['level'], record['d0'], time.time()))
+        return chart_id
+
+    def remove_missing(self, paths):
+        """paths(현재 스캔 대상) 밖에 있는 곡 중 파일이 더 이상 없는 곡 삭제. Returns: 삭제 수"""
+        paths = set(paths)
+        stale = [(row['id'],) for row in self.conn.execute("SELECT id, path FROM charts")
+                 if row['path'] not in paths and not os.path.exists(row['path'])]
+        self.conn.executemany("DELETE FROM charts WHERE id = ?", stale)
+        return len(stale)
+
+    def duplicates(self):
+        """
+        노트 지문이 같은 곡 묶음 [[(경로, 레이블), ...], ...] (각 묶음은 id 순, 2개 이상만).
+        묶음 안에 레이블이 여러 개면 레이블 충돌 (query(unique=True)는 레이블별로 한 곡씩 남김)
+        """
+        rows = self.conn.execute(
+            "SELECT note_hash, path, label FROM charts WHERE note_hash IN "
+            "(SELECT note_hash FROM charts WHERE note_hash IS NOT NULL AND note_hash != '' "
+            "GROUP BY note_hash HAVING COUNT(*) > 1) ORDER BY note_hash, id")
+        groups = {}
+        for row in rows:
+            groups.setdefault(row['note_hash'], []).append((row['path'], row['label']))
+        return list(groups.values())
+
+    def model_versions(self):
+        """모델 버전별 예측 수 [(model_version, count)]"""
+        rows = self.conn.execute(
+            "SELECT model_version, COUNT(*) AS n FROM predictions GROUP BY model_version ORDER BY model_version")
+        return [(row['model_version'], row['n']) for row in rows]
+
+    def query(self, model_version=None, key_mode=None, fmt=None, label=None, level_range=None,
+              label_range=None, unique=False, limit=None):
+        """
+        예측 조회 (조건은 모두 AND, None이면 무시).
+
+        Args:
+            model_version: None이면 가장 최근에 채점된 모델 버전
+            key_mode: 키 수 (예: 10)
+            fmt: 'BMS' / 'OSU'
+            label / label_range: 레이블 일치 / (최소, 최대) 포함 범위
+            level_range: 예측 레벨 (최소, 최대) 포함 범위
+            unique: True면 노트 지문과 레이블이 같은 곡은 id가 가장 작은 한 곡만
+
+        Returns: sqlite3.Row 리스트 (charts 열 + level, d0, model_version), 예측 레벨 내림차순
+        """
+        if model_version is None:
+            row = self.conn.execute(
+                "SELECT model_version FROM predictions ORDER BY scored_at DESC LIMIT 1").fetchone()
+            if row is None:
+                return []
+            model_version = row['model_version']
+
+        where = ["p.model_version = ?"]
+        args = [model_version]
+        if key_mode is not None:
+            where.append("c.key_mode = ?")
+            args.append(int(key_mode))
+        if fmt is not None:
+            where.append("c.format = ?")
+            args.append(fmt.upper())
+        if label is not None:
+            where.append("c.label = ?")
+            args.append(int(label))
+        if label_range is not None:
+            where.append("c.label BETWEEN ? AND ?")
+            args.extend(label_range)
+        if level_range is not None:
+            where.append("p.level BETWEEN ? AND ?")
+            args.extend(level_range)
+        if unique:
+            where.append("(c.note_hash IS NULL OR c.note_hash = '' OR c.id = "
+                         "(SELECT MIN(d.id) FROM charts d WHERE d.note_hash = c.note_hash AND d.label IS c.label))")
+
+        sql = ("SELECT c.*, p.level, p.d0, p.model_version FROM predictions p "
+               "JOIN charts c ON c.id = p.chart_id "
+               f"WHERE {' AND '.join(where)} ORDER BY p.level DESC")
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return self.conn.execute(sql, args).fetchall()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the library index")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="SQLite index path")
+    parser.add_argument("--model-version", default=None, help="prediction model version (default: latest)")
+    parser.add_argument("--keys", type=int, default=None, help="key mode (e.g. 10)")
+    parser.add_argument("--format", default=None, choices=("BMS", "OSU", "bms", "osu"))
+    parser.add_argument("--label", type=int, default=None)
+    parser.add_argument("--level", type=float, nargs=2, default=None, metavar=("MIN", "MAX"),
+                        help="predicted level range (inclusive)")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--unique", action="store_true", help="one chart per note fingerprint and label")
+    parser.add_argument("--duplicates", action="store_true", help="list note-identical chart groups and exit")
+    parser.add_argument("--versions", action="store_true", help="list model versions and exit")
+    args = parser.parse_args(argv)
+
+    with LibraryIndex(args.index) as index:
+        if args.versions:
+            for version, n in index.model_versions():
+                print(f"{version}  {n}")
+            return
+        if args.duplicates:
+            groups = index.duplicates()
+            n_conflicts = 0
+            for group in groups:
+                conflict = len({label for _, label in group}) > 1
+                n_conflicts += conflict
+                print(("[label conflict] " if conflict else "") +
+                      " = ".join(f"{path} (label {label})" for path, label in group))
+            print(f"{len(groups)} duplicate groups ({sum(len(g) - 1 for g in groups)} extra copies, "
+                  f"{n_conflicts} with conflicting labels)")
+            return
+        rows = index.query(model_version=args.model_version, key_mode=args.keys, fmt=args.format,
+                           label=args.label, level_range=args.level, unique=args.unique, limit=args.limit)
+        print("Level | Label | Keys | Format | Title | Path")
+        for r in rows:
+            lbl = str(r['label']) if r['label'] is not None else "N/A"
+            print(f"{r['level']:6.2f} | {lbl:>5} | {r['key_mode']:>4} | {r['format']:<6} | {r['title']} | {r['path']}")
+        print(f"{len(rows)} charts")
+
+if __name__ == "__main__":
+    main()
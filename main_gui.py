@@ -646,6 +646,10 @@ class BMSCalculatorApp:
             self.ax.plot(t, result['b_t'], label='Load (b_t)', alpha=0.5)
             self.ax.plot(t, result['ema_S'], label='EMA_S (Burst)', linestyle='--')
             self.ax.plot(t, result['ema_L'], label='EMA_L (Endurance)', linestyle=':')
+            # 밀도 상위 구간 (±500ms) 표시
+            for i, sec in enumerate(new_calc.find_dense_sections(notes, k=3)):
+                self.ax.axvspan(sec['start'], sec['end'], color='red', alpha=0.15,
+                                label='Dense Section (±500ms)' if i == 0 else None)
             self.ax.set_title("Difficulty Load over Time")
             self.ax.set_xlabel("Time (s)")
             self.ax.set_ylabel("Load")
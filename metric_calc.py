@@ -1,5 +1,28 @@
 import numpy as np
 
+def window_note_counts(times, num_windows, window_size=1.0):
+    """
+    Count notes per fixed window with a single histogram pass.
+
+    Window i covers [i * window_size, (i + 1) * window_size).
+    Equivalent to `sum(1 for t in times if i <= t < i + 1)` per window,
+    but O(n + num_windows) instead of O(n * num_windows).
+
+    Args:
+        times: Note times in seconds (any order)
+        num_windows: Number of windows to return
+        window_size: Size of each window in seconds
+
+    Returns:
+        np.ndarray (int64) of length num_windows
+    """
+    num_windows = max(int(num_windows), 0)
+    times = np.asarray(times, dtype=float)
+
+    idx = np.floor(times / window_size)
+    idx = idx[(idx >= 0) & (idx < num_windows)].astype(np.int64)
+    return np.bincount(idx, minlength=num_windows)
+
 def calculate_metrics(notes, duration, window_size=1.0):
     """
     Calculate difficulty metrics for each time window.
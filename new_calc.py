@@ -5,8 +5,12 @@ new_calc.py - 선형 회귀 기반 난이도 계산 모델
 BMS 데이터 분석 결과, 단순 선형 회귀가 더 정확한 결과를 보여줍니다 (MAE 1.12).
 """
 
+import heapq
+
 import numpy as np
 
+import metric_calc
+
 # ====================================================================
 # 모델 파라미터
 # ====================================================================
@@ -33,6 +37,13 @@ LEVEL_LABELS = {
     (22, float('inf')): "God"
 }
 
+# 3-Feature 모델 입력 피처 순서 (predict_levels의 features 열 순서)
+LINEAR_FEATURES = ('global_nps', 'nps_std', 'chord_mean')
+
+# 티어 하한 경계 / 레이블 (get_level_labels의 np.searchsorted용)
+_LABEL_BOUNDS = np.array([min_lv for (min_lv, _max_lv) in LEVEL_LABELS], dtype=float)
+_LABEL_NAMES = np.array(list(LEVEL_LABELS.values()), dtype=object)
+
 
 # ====================================================================
 # 핵심 함수
@@ -66,6 +77,49 @@ def predict_level_linear(global_nps, nps_std, chord_mean, params=None):
     return round(level, 2)
 
 
+def linear_coefficients(params=None):
+    """
+    3-Feature 모델 파라미터를 (계수 벡터, 절편)으로 변환
+    
+    Args:
+        params (dict, optional): 모델 파라미터. None이면 기본값 사용
+    
+    Returns:
+        tuple: (np.ndarray[3] - LINEAR_FEATURES 순서의 계수, float - 절편)
+    """
+    if params is None:
+        params = NPS_LINEAR_PARAMS
+    
+    coef = np.array([params['coef_nps'], params['coef_std'], params['coef_chord']], dtype=float)
+    return coef, float(params['intercept'])
+
+
+def predict_levels(features, params=None):
+    """
+    3-Feature 모델 배치 예측 (행렬-벡터 곱 1회)
+    
+    계수를 바꾼 뒤 라이브러리 전체를 재채점할 때, 캐시해 둔 피처 테이블에
+    이 함수만 다시 호출하면 됩니다.
+    
+    Args:
+        features (np.ndarray): [N, 3] 피처 테이블 (LINEAR_FEATURES 순서)
+        params (dict, optional): 모델 파라미터. None이면 기본값 사용
+    
+    Returns:
+        np.ndarray: [N] 추정 레벨 (반올림하지 않음)
+    
+    Example:
+        >>> feats = np.array([[51.75, 17.08, 3.32], [12.0, 3.1, 1.2]])
+        >>> levels = predict_levels(feats)
+    """
+    features = np.asarray(features, dtype=float)
+    if features.ndim != 2 or features.shape[1] != len(LINEAR_FEATURES):
+        raise ValueError(f"features must have shape [N, {len(LINEAR_FEATURES)}], got {features.shape}")
+    
+    coef, intercept = linear_coefficients(params)
+    return features @ coef + intercept
+
+
 def predict_level_simple(global_nps, params=None):
     """
     단순 NPS만 사용하는 선형 회귀 모델
@@ -114,6 +168,101 @@ def get_level_label(level):
     return "God"  # 최고 레벨
 
 
+def get_level_labels(levels):
+    """
+    레벨 배열을 티어 레이블 배열로 변환 (get_level_label의 배치 버전)
+    
+    LEVEL_LABELS 하한 경계에 np.searchsorted를 사용합니다.
+    get_level_label과 같은 규칙으로 범위 밖(1 미만, NaN)은 "God"입니다.
+    
+    Args:
+        levels (np.ndarray): 레벨 배열
+    
+    Returns:
+        np.ndarray: 티어 레이블 배열 (dtype=object)
+    """
+    levels = np.asarray(levels, dtype=float)
+    idx = np.searchsorted(_LABEL_BOUNDS, levels, side='right') - 1
+    idx = np.where(idx < 0, len(_LABEL_NAMES) - 1, idx)
+    return _LABEL_NAMES[idx]
+
+
+def _local_note_counts(times, half_window=0.5):
+    """
+    각 노트를 중심으로 ±half_window 구간 내 노트 개수 (Local NPS)
+    
+    정렬된 시간 배열에 이분 탐색을 사용하므로 O(n log n).
+    구간 경계는 기존 방식과 동일합니다 (half_window=0.5 기준):
+    [round(t, 3) - 0.5, round(t, 3) + 0.499999999999]
+    
+    Args:
+        times (np.ndarray): 노트 시간 배열 (초, 정렬 불필요)
+        half_window (float): 구간 반폭 (초)
+    
+    Returns:
+        tuple: (np.ndarray - 각 노트(입력 순서)의 로컬 노트 개수,
+                np.ndarray - 반올림된 중심 시간)
+    """
+    # ms 단위로 반올림하여 부동소수점 오차 방지 (파이썬 round와 동일한 결과 유지)
+    centers = np.array([round(t, 3) for t in times.tolist()], dtype=float)
+    sorted_times = np.sort(times)
+    
+    # 부동소수점 오차 방지: t+0.5 대신 t+0.499999999999 사용 후 <= 비교
+    lo = np.searchsorted(sorted_times, centers - half_window, side='left')
+    hi = np.searchsorted(sorted_times, centers + (half_window - 1e-12), side='right')
+    return hi - lo, centers
+
+
+def find_dense_sections(notes, k=3, half_window=0.5):
+    """
+    노트 밀도가 가장 높은 구간 상위 k개 찾기 (서로 겹치지 않음)
+    
+    각 노트를 중심으로 한 ±half_window 구간의 노트 개수(Local NPS)를
+    한 번 계산한 뒤, 힙에서 밀도 순으로 꺼내며 이미 고른 구간과
+    겹치는 후보는 건너뜁니다. 첫 번째 구간의 count는 peak_nps와 같습니다.
+    
+    Args:
+        notes (list): 노트 리스트
+        k (int): 찾을 구간 수
+        half_window (float): 구간 반폭 (초, 기본 ±500ms)
+    
+    Returns:
+        list: 밀도 내림차순 [{
+            'center': 구간 중심 시간 (초),
+            'start': 구간 시작 (초),
+            'end': 구간 끝 (초),
+            'count': 구간 내 노트 개수
+        }, ...] (동일 밀도는 앞선 시간 우선)
+    
+    Example:
+        >>> for sec in find_dense_sections(notes, k=3):
+        ...     print(f"{sec['start']:.2f}~{sec['end']:.2f}s: {sec['count']}개")
+    """
+    if not notes or k <= 0:
+        return []
+    
+    times = np.array([n['time'] for n in notes], dtype=float)
+    counts, centers = _local_note_counts(times, half_window)
+    
+    heap = list(zip((-counts).tolist(), centers.tolist()))
+    heapq.heapify(heap)
+    
+    sections = []
+    while heap and len(sections) < k:
+        neg_count, center = heapq.heappop(heap)
+        # 같은 반폭의 두 구간은 중심 간격이 2*half_window 이상이면 겹치지 않음
+        if any(abs(center - sec['center']) < 2.0 * half_window for sec in sections):
+            continue
+        sections.append({
+            'center': center,
+            'start': center - half_window,
+            'end': center + half_window,
+            'count': -neg_count
+        })
+    
+    return sections
+
+
 def calculate_nps_metrics(notes, duration):
     """
     NPS 관련 메트릭 계산 (선형 모델용)
@@ -140,30 +289,17 @@ def calculate_nps_metrics(notes, duration):
     global_nps = total_notes / duration if duration > 0 else 0
     
     # Local NPS 계산: 각 노트를 중심으로 ±500ms 구간 내 노트 개수
-    local_nps_values = []
-    
-    for note in notes:
-        t = round(note['time'], 3)  # ms 단위로 반올림하여 부동소수점 오차 방지
-        
-        # ±500ms = ±0.5초 구간
-        # 부동소수점 오차 방지: t+0.5 대신 t+0.499999999999 사용 후 <= 비교
-        window_start = t - 0.5
-        window_end = t + 0.499999999999
-        
-        # 해당 구간 내의 노트 개수 카운트
-        count = sum(1 for n in notes if window_start <= n['time'] <= window_end)
-        local_nps_values.append(count)
+    times = np.array([n['time'] for n in notes], dtype=float)
+    local_nps_values, _ = _local_note_counts(times)
     
     # Peak NPS: 로컬 NPS 최대값
-    peak_nps = max(local_nps_values) if local_nps_values else 0
+    peak_nps = int(local_nps_values.max()) if len(local_nps_values) else 0
     
     # NPS 표준편차: 1초 윈도우별 NPS의 변동성 (기존 방식 유지)
-    window_nps = []
-    for t in range(int(duration) + 1):
-        count = sum(1 for n in notes if t <= n['time'] < t + 1)
-        window_nps.append(count)
+    # 히스토그램 1회로 [t, t+1) 윈도우 노트수를 구함 (O(n))
+    window_nps = metric_calc.window_note_counts(times, int(duration) + 1)
     
-    nps_std = np.std(window_nps) if window_nps else 0
+    nps_std = np.std(window_nps) if len(window_nps) else 0
     
     return {
         'global_nps': round(global_nps, 2),
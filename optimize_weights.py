@@ -1,186 +1,437 @@
 
 import os
-import glob
-import bms_parser
-import osu_parser
 import calc
-import metric_calc
+import feature_store
+import batch_pool
 import numpy as np
 import time
 import re
-from scipy.optimize import minimize
+from scipy.optimize import minimize, differential_evolution
 from sklearn.model_selection import KFold
 import random
 import json
+import argparse
 
-def load_charts():
-    # 1. Setup Paths
-    target_dirs = [
-        r"d:\계산기\테스트 샘플",
-        r"d:\계산기\패턴 모음",
-        r"d:\계산기\패턴 모음2(GCS)",
-        r"d:\계산기\osu 폴더 전체"
-    ]
-    
-    files = []
-    print("Scanning files...")
-    for root_dir in target_dirs:
-        # BMS
-        for ext in ['*.bms', '*.bme', '*.bml']:
-            files.extend(glob.glob(os.path.join(root_dir, '**', ext), recursive=True))
-        # OSU
-        for ext in ['*.osu']:
-            files.extend(glob.glob(os.path.join(root_dir, '**', ext), recursive=True))
-            
-    print(f"Found {len(files)} files.")
+DEFAULT_OUTPUT_PATH = r"d:\계산기\final_params.json"
+DEFAULT_RUN_DIR = r"d:\계산기\optimize_run"
+
+# 학습에 쓰는 원본 폴더 (저장소에 기록된 source_dirs와 비교). 다른 저장소(예: Linux 배치
+# 서버에서 만든 것)는 --sources 로 그 저장소의 폴더를 주거나 --sources all 로 전체 사용
+TARGET_DIRS = [
+    r"d:\계산기\테스트 샘플",
+    r"d:\계산기\패턴 모음",
+    r"d:\계산기\패턴 모음2(GCS)",
+    r"d:\계산기\osu 폴더 전체"
+]
+
+def load_charts(store_path=feature_store.DEFAULT_STORE_PATH, sources=TARGET_DIRS):
+    # 레이블 있는 BMS 차트 (공용 피처 저장소에서 로드, Osu는 레이블 없음). sources=None이면 전체
+    return feature_store.load_chart_data(store_path, sources=sources, labeled_only=True)
+
+def load_compact(store_path=feature_store.DEFAULT_STORE_PATH, sources=TARGET_DIRS):
+    # load_charts와 같은 차트를 compact 배치(float32 윈도우 행렬 + offsets)로 로드
+    return feature_store.load_compact_dataset(store_path, sources=sources, labeled_only=True)
+
+def report_no_charts(store_path, sources):
+    print("No charts found.")
+    if sources is not None:
+        print(f"  (sources {', '.join(sources)} matched nothing in {store_path}; pass --sources with the store's folders or 'all')")
+
+# ----------------------------
+# 체크포인트 (run 디렉터리)
+# ----------------------------
+# run.json          : 실행 설정 (재개 시 일치 확인)
+# dataset.npz       : 쌓은 배치 (재개 시 피처 저장소를 다시 읽지 않음)
+# fold_NN_stage1.json, fold_NN.json, verify_NN.json : stage / fold / 검증 결과
+def save_json_atomic(data, path):
+    """임시 파일에 쓴 뒤 교체 (중간에 중단돼도 기존 파일 유지)"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding='utf-8') as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
+
+def load_json(path):
+    with open(path, "r", encoding='utf-8') as f:
+        return json.load(f)
+
+def save_batch(batch, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **batch)
+    os.replace(tmp_path, path)
+
+def load_batch(path):
+    with np.load(path) as data:
+        return {k: data[k] for k in data.files}
+
+def checkpoint_path(run_dir, kind, idx, suffix=""):
+    return os.path.join(run_dir, f"{kind}_{idx:02d}{suffix}.json")
+
+def load_fold_checkpoint(path):
+    result = load_json(path)
+    result['weights'] = np.asarray(result['weights'])
+    result['physics'] = np.asarray(result['physics'])
+    return result
+
+def save_fold_checkpoint(result, run_dir):
+    data = dict(result, weights=list(map(float, result['weights'])), physics=list(map(float, result['physics'])))
+    save_json_atomic(data, checkpoint_path(run_dir, 'fold', result['fold']))
+
+# 파라미터 벡터 열 이름 (calc.compute_map_difficulty_batch 인자명)
+STAGE1_PARAMS = ('alpha', 'theta', 'eta', 'omega', 'D_max')
+STAGE2_PARAMS = ('lam_L', 'lam_S', 'gamma_curve')
+ALL_PARAMS = STAGE1_PARAMS + STAGE2_PARAMS
+
+# 집단 탐색(Differential Evolution) 범위: 두 stage의 L-BFGS-B 범위를 합친 것
+POPULATION_BOUNDS = [(0.1, 5.0), (0.1, 5.0), (0.0, 3.0), (0.5, 2.0), (50.0, 120.0),
+                     (0.05, 0.5), (0.5, 0.95), (1.0, 1.5)]
+POPULATION_X0 = [1.0, 1.0, 0.5, 1.0, 100.0, 0.3, 0.8, 1.0]
+# 집단 탐색 예산 (popsize: 집단 크기 배수 -> 1 x 8 = 8개 후보, patience: 조기 종료 세대 수).
+# 합성 데이터 5-fold 기준 popsize 1 / patience 15가 L-BFGS-B보다 짧은 시간에 더 낮은 MAE.
+# patience를 줄이면(8~10) MAE가 L-BFGS-B보다 나빠지고, popsize 2는 MAE가 조금 낮지만 약 2배 시간.
+DE_OPTIONS = {'popsize': 1, 'max_generations': 150, 'patience': 15}
+
+# 미니배치 스케줄: 학습 fold에서 레이블 레벨별로 뽑는 비율의 순서.
+# 각 단계의 최적점이 다음 단계의 시작점이며, 마지막 단계(1.0)는 전체 학습 세트로 최종 조정.
+# (1.0,)이면 기존과 같은 전체 세트 최적화
+FULL_BATCH_SCHEDULE = (1.0,)
+MINIBATCH_SCHEDULE = (0.1, 1.0)
+# 미니배치 단계는 대략적인 시작점만 찾으면 되므로 느슨한 종료 조건 사용
+MINIBATCH_OPTIONS = {'ftol': 1e-4}
+
+def population_mae(param_matrix, batch, param_names, level_key='pattern_level', **fixed):
+    """
+    [P x n_params] 후보 행렬 전체의 MAE를 한 번에 계산 -> [P]
+    batch: calc.stack_chart_data 결과 (uncap 스케일, D_min=0)
+    """
+    res = calc.compute_map_difficulty_population(
+        batch['basis'], batch['lengths'], batch['duration'], batch['total_notes'],
+        param_matrix, param_names,
+        cap_start=60.0, cap_range=30.0,
+        uncap_level=True, D_min=0.0,
+        **fixed
+    )
+    return np.mean(np.abs(res[level_key] - batch['labels']), axis=1)
+
+def objective_and_grad(params, batch, param_names, **fixed):
+    """MAE와 해석적 그래디언트 (minimize(..., jac=True)용)"""
+    return calc.dataset_mae_and_grad(
+        params, param_names, batch,
+        cap_start=60.0, cap_range=30.0,
+        uncap_level=True, D_min=0.0,
+        **fixed
+    )
+
+def _objective_stage_1(params, batch, fixed_physics):
+    lam_L, lam_S, gamma = fixed_physics
     
-    chart_data = []
+    # Level Mapping with Fixed Gamma
+    return objective_and_grad(
+        params, batch, STAGE1_PARAMS, lam_L=lam_L, lam_S=lam_S, gamma_curve=gamma
+    )
+
+def _objective_stage_2(params, batch, fixed_weights):
+    alpha, theta, eta, omega, D_max = fixed_weights
     
-    for i, file_path in enumerate(files):
-        if i % 100 == 0:
-            print(f"Processing {i}/{len(files)}...")
-            
-        try:
-            # Determine Type
-            is_osu = file_path.lower().endswith('.osu')
-            is_gcs = "패턴 모음2(GCS)" in file_path
-            
-            # Parse
-            if is_osu:
-                parser = osu_parser.OsuParser(file_path)
-            else:
-                parser = bms_parser.BMSParser(file_path)
-                
-            notes = parser.parse()
-            if not notes:
-                continue
-                
-            # [NEW] Filter 10K Only (Check AFTER parse)
-            if is_osu and parser.key_count != 10:
-                continue
-                
-            duration = parser.duration
-            if duration < 10:
-                continue
-                
-            # Get Label (if BMS)
-            label = None
-            title = "Unknown"
-            
-            if is_osu:
-                title = parser.header.get('Title', 'Unknown')
-                # [Modified] Disable Osu Level Label Parsing
-                label = None
-            else:
-                # BMS Header parsing
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    for line in f:
-                        if line.upper().startswith("#PLAYLEVEL"):
-                            try:
-                                label = int(line.split()[1])
-                            except: pass
-                        if line.upper().startswith("#TITLE"):
-                            try:
-                                title = line.split(maxsplit=1)[1].strip()
-                            except: pass
-            
-            # [NEW] GCS Filtering Rules
-            if is_gcs:
-                if label is None or label == 0:
-                    continue # Ignore 0 or unrated
-                
-                # Apply -5 Offset
-                label = label - 5
-                
-                # Ensure valid range (optional, but good for safety)
-                if label < 1:
-                    continue
-            
-            if label is None:
-                continue
-            
-            metrics = metric_calc.calculate_metrics(notes, duration)
-            
-            chart_data.append({
-                'metrics': metrics,
-                'duration': duration,
-                'total_notes': len(notes),
-                'label': label,
-                'title': title,
-                'file': os.path.basename(file_path)
-            })
-                
-        except Exception as e:
-            # print(f"Error loading {file_path}: {e}")
-            pass
-            
-    print(f"Loaded {len(chart_data)}/{len(files)} valid charts.")
-    return chart_data
+    # Level Mapping with Optimizing Gamma
+    return objective_and_grad(
+        params, batch, STAGE2_PARAMS,
+        alpha=alpha, theta=theta, eta=eta, omega=omega, D_max=D_max
+    )
+
+# stage마다 자기 파라미터 열의 야코비안만 계산하고 캐시도 따로 둠
+# (키: stage 파라미터 + 고정값 + fold 데이터셋 -> 미니배치 단계 후 전체 세트 MAE 재평가 등이 적중)
+stage_1_cache = calc.ObjectiveCache(_objective_stage_1)
+stage_2_cache = calc.ObjectiveCache(_objective_stage_2)
+
+def clear_objective_caches():
+    stage_1_cache.clear()
+    stage_2_cache.clear()
 
-def objective_stage_1(params, chart_data, fixed_physics):
+def objective_cache_stats():
+    return f"stage 1 {stage_1_cache.stats()}; stage 2 {stage_2_cache.stats()}"
+
+def objective_stage_1(params, batch, fixed_physics):
     """
     Stage 1: Weights Optimization (Alpha, Theta, Eta, Omega, D_max)
     Physics (Lam_L, Lam_S, Gamma) are FIXED.
     """
-    alpha, theta, eta, omega, D_max = params
-    lam_L, lam_S, gamma = fixed_physics
-    
-    total_error = 0.0
-    for data in chart_data:
-        m = data['metrics']
-        res = calc.compute_map_difficulty(
-            m['nps'], m['ln_strain'], m['jack_pen'], m['roll_pen'], m['alt_cost'], m['hand_strain'],
-            m['chord_strain'],
-            alpha=alpha, theta=theta, eta=eta, omega=omega,
-            lam_L=lam_L, lam_S=lam_S, # Fixed
-            cap_start=60.0, cap_range=30.0,
-            duration=data['duration'],
-            total_notes=data['total_notes'],
-            uncap_level=True
-        )
-        # Level Mapping with Fixed Gamma
-        est_level = calc.pattern_level_from_D0(
-            res['D0'], D_min=0.0, D_max=D_max, gamma=gamma, uncap=True
-        )
-        total_error += abs(est_level - data['label'])
-        
-    return total_error / len(chart_data)
+    return stage_1_cache(params, batch, fixed_physics)
 
-def objective_stage_2(params, chart_data, fixed_weights):
+def objective_stage_2(params, batch, fixed_weights):
     """
     Stage 2: Physics Optimization (Lam_L, Lam_S, Gamma)
     Weights are FIXED.
     """
-    lam_L, lam_S, gamma = params
-    alpha, theta, eta, omega, D_max = fixed_weights
-    
-    total_error = 0.0
-    for data in chart_data:
-        m = data['metrics']
-        res = calc.compute_map_difficulty(
-            m['nps'], m['ln_strain'], m['jack_pen'], m['roll_pen'], m['alt_cost'], m['hand_strain'],
-            m['chord_strain'],
-            alpha=alpha, theta=theta, eta=eta, omega=omega, # Fixed
-            lam_L=lam_L, lam_S=lam_S, # Optimizing
-            cap_start=60.0, cap_range=30.0,
-            duration=data['duration'],
-            total_notes=data['total_notes'],
-            uncap_level=True
+    return stage_2_cache(params, batch, fixed_weights)
+
+def stratified_subsample(labels, fraction, rng):
+    """레이블 레벨별로 같은 비율(fraction)을 뽑은 인덱스 (정렬됨, 레벨마다 최소 1곡)"""
+    labels = np.asarray(labels)
+    if fraction >= 1.0:
+        return np.arange(len(labels))
+    levels = np.round(labels)
+    picked = []
+    for level in np.unique(levels):
+        members = np.flatnonzero(levels == level)
+        n = max(1, int(round(len(members) * fraction)))
+        picked.append(rng.choice(members, size=n, replace=False))
+    return np.sort(np.concatenate(picked))
+
+def stage_rng(fold_idx, stage):
+    """
+    (fold, stage)별 미니배치 추출 난수 생성기. stage마다 시드가 따로이므로
+    Stage 1을 체크포인트에서 읽어 건너뛰어도 Stage 2의 미니배치는 중단 없는 실행과 같음.
+    """
+    return np.random.default_rng([fold_idx, stage])
+
+def minimize_scheduled(objective, x0, bounds, train_data, fixed, schedule, rng, label):
+    """
+    스케줄의 각 비율로 층화 미니배치를 뽑아 L-BFGS-B를 이어서 실행 (warm start).
+    단계가 끝날 때마다 전체 학습 세트 MAE를 보고합니다.
+
+    Returns: (최적점, 단계별 기록 [{'fraction', 'charts', 'mae'}])
+    """
+    x = np.asarray(x0, dtype=float)
+    history = []
+    for fraction in schedule:
+        idx = stratified_subsample(train_data['labels'], fraction, rng)
+        data = train_data if len(idx) == len(train_data['labels']) else calc.take_chart_batch(train_data, idx)
+        res = minimize(
+            objective, x, args=(data, fixed),
+            method='L-BFGS-B', jac=True, bounds=bounds,
+            options=MINIBATCH_OPTIONS if fraction < 1.0 else None
         )
-        # Level Mapping with Optimizing Gamma
-        est_level = calc.pattern_level_from_D0(
-            res['D0'], D_min=0.0, D_max=D_max, gamma=gamma, uncap=True
+        x = res.x
+        # 마지막(전체) 단계의 최종점은 캐시에 있으므로 추가 계산 없음
+        full_mae = float(objective(x, train_data, fixed)[0])
+        history.append({'fraction': fraction, 'charts': int(len(idx)), 'mae': full_mae})
+        if len(schedule) > 1:
+            batch_pool.report(f"{label}: batch {fraction:.0%} ({len(idx)} charts) -> full-set MAE={full_mae:.4f}")
+    return x, history
+
+def population_search(train_data, val_data, bounds=POPULATION_BOUNDS, x0=POPULATION_X0,
+                      popsize=DE_OPTIONS['popsize'], max_generations=DE_OPTIONS['max_generations'],
+                      patience=DE_OPTIONS['patience'], seed=0,
+                      level_key='est_level'):
+    """
+    ALL_PARAMS 8개를 Differential Evolution으로 동시에 탐색 (미분 불필요).
+
+    est_level의 int() 절단, Soft Cap, 구간 보정으로 목적 함수가 매끄럽지 않아
+    L-BFGS-B가 멈추는 경우용. 세대마다 집단 전체 [S x 8]을 population_mae로
+    한 번에 평가하고, 세대 최적 후보의 검증 MAE가 patience 세대 동안 개선되지 않으면
+    조기 종료합니다. 반환값은 검증 MAE가 가장 낮았던 후보.
+
+    Returns: (best_params, val_mae, generations)
+    """
+    def evaluate(x):
+        # vectorized=True: x는 [8 x S]
+        return population_mae(x.T, train_data, ALL_PARAMS, level_key=level_key)
+
+    def val_mae(params):
+        return float(population_mae([params], val_data, ALL_PARAMS, level_key=level_key)[0])
+
+    state = {'best': np.asarray(x0, dtype=float), 'val': val_mae(x0), 'stale': 0, 'generations': 0}
+
+    def early_stop(xk, convergence=None):
+        state['generations'] += 1
+        val = val_mae(xk)
+        if val < state['val']:
+            state.update(best=np.array(xk), val=val, stale=0)
+        else:
+            state['stale'] += 1
+        return state['stale'] >= patience
+
+    differential_evolution(
+        evaluate, bounds, x0=x0, popsize=popsize, maxiter=max_generations, seed=seed,
+        vectorized=True, updating='deferred', polish=False, callback=early_stop
+    )
+    return state['best'], state['val'], state['generations']
+
+def run_fold_population(task):
+    """
+    CV fold 1개를 집단 탐색으로 최적화 (run_fold와 같은 결과 형식).
+    학습 fold의 20%를 조기 종료용 검증 세트로 떼어 내고, 테스트 fold는 평가에만 사용.
+    """
+    fold_idx, train_index, test_index, run_dir, _, de_options = task # 미니배치 스케줄은 사용하지 않음
+    batch = batch_pool.worker_batch()
+
+    rng = np.random.default_rng(fold_idx)
+    inner = rng.permutation(np.asarray(train_index))
+    n_val = max(1, len(inner) // 5)
+    fit_data = calc.take_chart_batch(batch, np.sort(inner[n_val:]))
+    val_data = calc.take_chart_batch(batch, np.sort(inner[:n_val]))
+
+    best, val, generations = population_search(fit_data, val_data, seed=fold_idx, **de_options)
+
+    def calculate_mae(indices):
+        return float(population_mae(
+            [best], calc.take_chart_batch(batch, indices), ALL_PARAMS, level_key='est_level'
+        )[0])
+
+    result = {
+        'fold': fold_idx,
+        'weights': best[:len(STAGE1_PARAMS)],
+        'physics': best[len(STAGE1_PARAMS):],
+        'train_mae': calculate_mae(train_index),
+        'test_mae': calculate_mae(test_index),
+        'info': f"DE {generations} generations, val MAE {val:.4f}",
+    }
+    save_fold_checkpoint(result, run_dir)
+    return result
+
+def run_fold(task):
+    """
+    CV fold 1개: Stage 1 (가중치) -> Stage 2 (물리) -> 검증 MAE.
+    task = (fold_idx, train_index, test_index, run_dir, schedule, de_options), 데이터셋은 공유 배치에서 읽음.
+    두 stage 모두 schedule에 따라 층화 미니배치에서 시작해 전체 학습 세트로 끝남.
+    Stage 1 결과와 fold 결과는 run_dir에 체크포인트로 저장되며,
+    Stage 1 체크포인트가 있으면 Stage 1을 건너뜀 (재개).
+    """
+    fold_idx, train_index, test_index, run_dir, schedule = task[:5]
+    batch = batch_pool.worker_batch()
+    train_data = calc.take_chart_batch(batch, train_index)
+    test_data = calc.take_chart_batch(batch, test_index)
+    clear_objective_caches() # fold마다 데이터셋이 다름
+    
+    # ---------------------------------------------------------
+    # Stage 1: Optimize Weights (Physics Fixed)
+    # ---------------------------------------------------------
+    fixed_physics = [0.3, 0.8, 1.0] 
+    init_weights = [1.0, 1.0, 0.5, 1.0, 100.0]
+    # D_max bounds (50, 120), Omega (0.5, 2.0)
+    bounds_weights = [(0.1, 5.0), (0.1, 5.0), (0.0, 3.0), (0.5, 2.0), (50.0, 120.0)]
+    
+    stage1_path = checkpoint_path(run_dir, 'fold', fold_idx, '_stage1')
+    if os.path.exists(stage1_path):
+        best_weights_iter = np.asarray(load_json(stage1_path)['weights'])
+        batch_pool.report(f"Fold {fold_idx:02d}: Stage 1 loaded from checkpoint")
+    else:
+        best_weights_iter, history = minimize_scheduled(
+            objective_stage_1, init_weights, bounds_weights, train_data, fixed_physics,
+            schedule, stage_rng(fold_idx, 1), f"Fold {fold_idx:02d} Stage 1"
         )
-        total_error += abs(est_level - data['label'])
-        
-    return total_error / len(chart_data)
+        save_json_atomic({
+            'weights': best_weights_iter.tolist(),
+            'mae': history[-1]['mae'],
+            'schedule': history,
+        }, stage1_path)
+
+    # ---------------------------------------------------------
+    # Stage 2: Optimize Physics (Weights Fixed)
+    # ---------------------------------------------------------
+    init_physics = [0.3, 0.8, 1.0]
+    # Gamma bounds (1.0, 1.5)
+    bounds_physics = [(0.05, 0.5), (0.5, 0.95), (1.0, 1.5)]
+    
+    best_physics_iter, _ = minimize_scheduled(
+        objective_stage_2, init_physics, bounds_physics, train_data, best_weights_iter,
+        schedule, stage_rng(fold_idx, 2), f"Fold {fold_idx:02d} Stage 2"
+    )
+
+    # ---------------------------------------------------------
+    # Validation
+    # ---------------------------------------------------------
+    opt_params = np.concatenate([best_weights_iter, best_physics_iter])
+    
+    def calculate_mae(batch):
+        # Pass optimized params
+        return float(population_mae(
+            [opt_params], batch, STAGE1_PARAMS + STAGE2_PARAMS, level_key='est_level'
+        )[0])
+
+    result = {
+        'fold': fold_idx,
+        'weights': best_weights_iter,
+        'physics': best_physics_iter,
+        'train_mae': calculate_mae(train_data),
+        'test_mae': calculate_mae(test_data),
+        'info': objective_cache_stats(),
+    }
+    save_fold_checkpoint(result, run_dir)
+    return result
+
+def run_verification(task):
+    """하이브리드 파라미터 검증 1회: task = (run_idx, train_index, test_index, params, run_dir)"""
+    run_idx, train_index, test_index, hyb_params, run_dir = task
+    batch = batch_pool.worker_batch()
+    
+    def calculate_mae_hybrid(batch):
+        return float(population_mae(
+            [hyb_params], batch, STAGE1_PARAMS + STAGE2_PARAMS, level_key='est_level'
+        )[0])
 
-def optimize_weights():
-    # 1. Load Data
-    all_data = load_charts()
-    if not all_data: 
-        print("No charts found.")
-        return
+    result = {
+        'run': run_idx,
+        'params': list(map(float, hyb_params)),
+        'train_mae': calculate_mae_hybrid(calc.take_chart_batch(batch, train_index)),
+        'test_mae': calculate_mae_hybrid(calc.take_chart_batch(batch, test_index)),
+    }
+    save_json_atomic(result, checkpoint_path(run_dir, 'verify', run_idx))
+    return result
+
+def optimize_weights(n_jobs=None, method='lbfgs', run_dir=DEFAULT_RUN_DIR,
+                     output_path=DEFAULT_OUTPUT_PATH, resume=False,
+                     store_path=feature_store.DEFAULT_STORE_PATH,
+                     schedule=FULL_BATCH_SCHEDULE, compact=False, de_options=None, sources=TARGET_DIRS):
+    """
+    n_jobs: fold 병렬 프로세스 수 (None이면 CPU 코어 수, 1이면 순차 실행)
+    method: 'lbfgs' (2-stage L-BFGS-B, 해석적 그래디언트) 또는
+            'de' (8개 파라미터 동시 Differential Evolution, 검증 MAE 조기 종료)
+    run_dir: stage / fold / 검증 체크포인트와 데이터셋 캐시를 저장할 디렉터리
+    output_path: 최종 파라미터 JSON 경로
+    resume: run_dir의 캐시된 데이터셋을 다시 읽고 완료된 fold / stage / 검증은 건너뜀
+    store_path: 피처 저장소 경로 (새 실행일 때만 사용)
+    sources: 포함할 원본 폴더 (저장소의 source_dirs와 비교, None이면 저장소 전체; 새 실행일 때만 사용)
+    schedule: L-BFGS-B stage의 층화 미니배치 비율 순서 (마지막은 1.0, 예: MINIBATCH_SCHEDULE)
+    compact: 곡별 dict / 패딩 기저 대신 compact 배치(float32 윈도우 행렬 + offsets)를
+             공유하고, fold마다 필요한 곡만 패딩 기저로 펼침 (대용량 학습 세트용)
+    de_options: method='de'의 탐색 예산 (DE_OPTIONS 키 일부를 덮어씀)
+    """
+    schedule = tuple(float(f) for f in schedule)
+    if not schedule or schedule[-1] != 1.0 or any(not 0.0 < f <= 1.0 for f in schedule):
+        raise ValueError(f"schedule must be fractions in (0, 1] ending with 1.0, got {schedule}")
+
+    os.makedirs(run_dir, exist_ok=True)
+    config_path = os.path.join(run_dir, "run.json")
+    dataset_path = os.path.join(run_dir, "dataset.npz")
+    config = {'method': method, 'n_splits': 5, 'kfold_seed': 42, 'schedule': list(schedule),
+              'compact': bool(compact)}
+    de_options = dict(DE_OPTIONS, **(de_options or {}))
+    if method == 'de':
+        config['de'] = de_options
+
+    if resume:
+        if not (os.path.exists(config_path) and os.path.exists(dataset_path)):
+            raise FileNotFoundError(f"No run to resume in {run_dir}")
+        if load_json(config_path) != config:
+            raise ValueError(f"Run in {run_dir} was started with {load_json(config_path)}, not {config}")
+        full_batch = load_batch(dataset_path)
+        print(f"Resuming run in {run_dir} ({len(full_batch['labels'])} charts from cached dataset)")
+    elif compact:
+        full_batch = load_compact(store_path, sources)
+        if not len(full_batch['labels']):
+            report_no_charts(store_path, sources)
+            return
+    else:
+        # 1. Load Data
+        all_data = load_charts(store_path, sources)
+        if not all_data: 
+            report_no_charts(store_path, sources)
+            return
+
+        # 피처 기저는 한 번만 쌓고, 워커들은 공유 메모리로 같은 배치를 읽음
+        full_batch = calc.stack_chart_data(all_data)
+
+    if not resume:
+        # 새 실행: 이전 실행의 체크포인트 제거 후 데이터셋 / 설정 저장
+        for name in os.listdir(run_dir):
+            if name.startswith(("fold_", "verify_")) and name.endswith(".json"):
+                os.remove(os.path.join(run_dir, name))
+        save_batch(full_batch, dataset_path)
+        save_json_atomic(config, config_path)
+
+    n_charts = len(full_batch['labels'])
 
     best_mae = float('inf')
     best_params = None
@@ -188,81 +439,46 @@ def optimize_weights():
     
     # 5-Fold Cross Validation
     kf = KFold(n_splits=5, shuffle=True, random_state=42)
+    fold_tasks = [
+        (fold_idx, train_index, test_index, run_dir, schedule, de_options)
+        for fold_idx, (train_index, test_index) in enumerate(kf.split(np.arange(n_charts)), start=1)
+    ]
+    
+    fold_func = {'lbfgs': run_fold, 'de': run_fold_population}[method]
     
-    print(f"\nStarting 5-Fold Cross-Validation Optimization...")
+    print(f"\nStarting 5-Fold Cross-Validation Optimization ({method})...")
     print("-" * 60)
     
-    fold_idx = 0
-    for train_index, test_index in kf.split(all_data):
-        fold_idx += 1
-        seed = 42 + fold_idx # Just for logging
-        
-        train_data = [all_data[i] for i in train_index]
-        test_data = [all_data[i] for i in test_index]
-        
-        # ---------------------------------------------------------
-        # Stage 1: Optimize Weights (Physics Fixed)
-        # ---------------------------------------------------------
-        fixed_physics = [0.3, 0.8, 1.0] 
-        init_weights = [1.0, 1.0, 0.5, 1.0, 100.0]
-        # D_max bounds (50, 120), Omega (0.5, 2.0)
-        bounds_weights = [(0.1, 5.0), (0.1, 5.0), (0.0, 3.0), (0.5, 2.0), (50.0, 120.0)]
-        
-        res1 = minimize(
-            objective_stage_1, init_weights, args=(train_data, fixed_physics),
-            method='L-BFGS-B', bounds=bounds_weights
-        )
-        best_weights_iter = res1.x
-
-        # ---------------------------------------------------------
-        # Stage 2: Optimize Physics (Weights Fixed)
-        # ---------------------------------------------------------
-        init_physics = [0.3, 0.8, 1.0]
-        # Gamma bounds (1.0, 1.5)
-        bounds_physics = [(0.05, 0.5), (0.5, 0.95), (1.0, 1.5)]
-        
-        res2 = minimize(
-            objective_stage_2, init_physics, args=(train_data, best_weights_iter),
-            method='L-BFGS-B', bounds=bounds_physics
-        )
-        best_physics_iter = res2.x
-
-        # ---------------------------------------------------------
-        # Validation
-        # ---------------------------------------------------------
-        alpha, theta, eta, omega, D_max = best_weights_iter
-        lam_L, lam_S, gamma = best_physics_iter
-        
-        def calculate_mae(dataset):
-            total_error = 0.0
-            for data in dataset:
-                m = data['metrics']
-                res = calc.compute_map_difficulty(
-                    m['nps'], m['ln_strain'], m['jack_pen'], m['roll_pen'], m['alt_cost'], m['hand_strain'],
-                    m['chord_strain'],
-                    alpha=alpha, theta=theta, eta=eta, omega=omega,
-                    lam_L=lam_L, lam_S=lam_S,
-                    cap_start=60.0, cap_range=30.0,
-                    duration=data['duration'],
-                    total_notes=data['total_notes'],
-                    uncap_level=True,
-                    D_max=D_max, gamma_curve=gamma # Pass optimized params
-                )
-                est_level = res['est_level']
-                total_error += abs(est_level - data['label'])
-            return total_error / len(dataset)
-
-        train_mae = calculate_mae(train_data)
-        test_mae = calculate_mae(test_data)
+    # 재개 시 완료된 fold는 체크포인트에서 읽고 나머지만 실행
+    fold_results = {}
+    pending = []
+    for task in fold_tasks:
+        path = checkpoint_path(run_dir, 'fold', task[0])
+        if resume and os.path.exists(path):
+            fold_results[task[0]] = load_fold_checkpoint(path)
+            print(f"Fold {task[0]:02d}: loaded from checkpoint")
+        else:
+            pending.append(task)
+    
+    for result in batch_pool.imap_over_batch(fold_func, pending, full_batch, n_jobs=n_jobs):
+        fold_results[result['fold']] = result
+        print(f"Fold {result['fold']:02d}: done")
+    
+    # fold 순서대로 병합 -> 순차 실행과 같은 best 선택 (동률이면 앞 fold)
+    for fold_idx in sorted(fold_results):
+        result = fold_results[fold_idx]
+        seed = 42 + result['fold'] # Just for logging
+        train_mae = result['train_mae']
+        test_mae = result['test_mae']
         
-        print(f"Fold {fold_idx:02d} (Seed {seed}): Train={train_mae:.4f}, Test={test_mae:.4f}")
+        print(f"Fold {result['fold']:02d} (Seed {seed}): Train={train_mae:.4f}, Test={test_mae:.4f} [{result['info']}]")
         
         # Save best result (based on Test MAE)
         if test_mae < best_mae:
             best_mae = test_mae
             best_params = {
-                'weights': best_weights_iter,
-                'physics': best_physics_iter
+                'weights': result['weights'],
+                'physics': result['physics']
             }
             best_seed = seed
             
@@ -307,40 +523,31 @@ def optimize_weights():
     # 5-Run Verification of Hybrid Params
     print(f"Verifying Hybrid Parameters (5 Runs)...")
     
-    hybrid_maes = []
+    hyb_params = [hyb_alpha, hyb_theta, hyb_eta, hyb_omega, hyb_D_max,
+                  hyb_lam_L, hyb_lam_S, hyb_gamma_curve]
     
+    # Shuffle and Split (부모 프로세스에서 분할을 미리 결정: 이전과 같은 누적 셔플)
+    order = list(range(n_charts))
+    split_idx = int(n_charts * 0.8)
+    verify_results = {}
+    verify_tasks = []
     for k in range(5):
-        # Shuffle and Split
         random.seed(100 + k)
-        random.shuffle(all_data)
-        split_idx = int(len(all_data) * 0.8)
-        train_data = all_data[:split_idx]
-        test_data = all_data[split_idx:]
-        
-        def calculate_mae_hybrid(dataset):
-            total_error = 0.0
-            for data in dataset:
-                m = data['metrics']
-                res = calc.compute_map_difficulty(
-                    m['nps'], m['ln_strain'], m['jack_pen'], m['roll_pen'], m['alt_cost'], m['hand_strain'],
-                    m['chord_strain'],
-                    alpha=hyb_alpha, theta=hyb_theta, eta=hyb_eta, omega=hyb_omega,
-                    lam_L=hyb_lam_L, lam_S=hyb_lam_S,
-                    cap_start=60.0, cap_range=30.0,
-                    duration=data['duration'],
-                    total_notes=data['total_notes'],
-                    uncap_level=True,
-                    D_max=hyb_D_max, gamma_curve=hyb_gamma_curve
-                )
-                est_level = res['est_level'] # compute_map_difficulty returns est_level directly now
-                total_error += abs(est_level - data['label'])
-            return total_error / len(dataset)
-
-        train_mae = calculate_mae_hybrid(train_data)
-        test_mae = calculate_mae_hybrid(test_data)
-        hybrid_maes.append(test_mae)
-        
-        print(f"Verify Run {k+1}: Train MAE={train_mae:.4f}, Test MAE={test_mae:.4f}")
+        random.shuffle(order)
+        path = checkpoint_path(run_dir, 'verify', k)
+        if resume and os.path.exists(path) and np.allclose(load_json(path)['params'], hyb_params):
+            verify_results[k] = load_json(path)
+        else:
+            verify_tasks.append((k, list(order[:split_idx]), list(order[split_idx:]), hyb_params, run_dir))
+    
+    for result in batch_pool.imap_over_batch(run_verification, verify_tasks, full_batch, n_jobs=n_jobs):
+        verify_results[result['run']] = result
+    
+    hybrid_maes = []
+    for k in sorted(verify_results):
+        result = verify_results[k]
+        hybrid_maes.append(result['test_mae'])
+        print(f"Verify Run {result['run']+1}: Train MAE={result['train_mae']:.4f}, Test MAE={result['test_mae']:.4f}")
         
     avg_test_mae = sum(hybrid_maes) / len(hybrid_maes)
     print("-" * 60)
@@ -355,9 +562,41 @@ def optimize_weights():
         'mae': avg_test_mae
     }
     
-    with open(r"d:\계산기\final_params.json", "w", encoding='utf-8') as f:
-        json.dump(final_params, f, indent=4)
-    print("Saved final parameters to d:\\계산기\\final_params.json")
+    save_json_atomic(final_params, output_path)
+    print(f"Saved final parameters to {output_path}")
 
 if __name__ == "__main__":
-    optimize_weights()
+    parser = argparse.ArgumentParser(description="5-Fold CV weight optimization")
+    parser.add_argument("--method", choices=("lbfgs", "de"), default="lbfgs",
+                        help="lbfgs: 2-stage L-BFGS-B, de: population search (Differential Evolution; "
+                             "lower MAE than lbfgs in less wall time on non-smooth objectives)")
+    parser.add_argument("--jobs", type=int, default=None, help="parallel fold processes (1 = sequential)")
+    parser.add_argument("--run-dir", default=DEFAULT_RUN_DIR, help="checkpoint / dataset cache directory")
+    parser.add_argument("--resume", action="store_true", help="resume the run in --run-dir, skipping completed folds")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_PATH, help="final parameter JSON path")
+    parser.add_argument("--store", default=feature_store.DEFAULT_STORE_PATH, help="feature store path (new runs only)")
+    parser.add_argument("--sources", nargs="+", default=TARGET_DIRS, metavar="DIR",
+                        help="source folders to train on, as recorded in the store, or 'all' "
+                             "(default: the d:\\계산기 library folders; new runs only)")
+    parser.add_argument("--minibatch", action="store_true",
+                        help=f"lbfgs: level-stratified mini-batch schedule {MINIBATCH_SCHEDULE}")
+    parser.add_argument("--compact", action="store_true",
+                        help="share a compact float32 window matrix instead of the padded float64 basis")
+    parser.add_argument("--schedule", default=None,
+                        help="lbfgs: custom schedule, comma-separated fractions ending with 1.0 (e.g. 0.05,0.2,1.0)")
+    parser.add_argument("--de-popsize", type=int, default=DE_OPTIONS['popsize'],
+                        help="de: population size multiplier (candidates = popsize x 8)")
+    parser.add_argument("--de-patience", type=int, default=DE_OPTIONS['patience'],
+                        help="de: stop after this many generations without a validation improvement "
+                             "(smaller values run faster but lose accuracy)")
+    args = parser.parse_args()
+    sources = None if args.sources == ["all"] else args.sources
+    if args.schedule:
+        schedule = [float(f) for f in args.schedule.split(",")]
+    else:
+        schedule = MINIBATCH_SCHEDULE if args.minibatch else FULL_BATCH_SCHEDULE
+    optimize_weights(n_jobs=args.jobs, method=args.method, run_dir=args.run_dir,
+                     output_path=args.output, resume=args.resume, store_path=args.store,
+                     schedule=schedule, compact=args.compact,
+                     de_options={'popsize': args.de_popsize, 'patience': args.de_patience},
+                     sources=sources)
@@ -1,10 +1,8 @@
 
 import os
-import glob
-import bms_parser
-import osu_parser
 import calc
-import metric_calc
+import feature_store
+import batch_pool
 import numpy as np
 import time
 import re
@@ -24,161 +22,75 @@ TIERS = [
 ]
 
 def load_charts():
-    # 1. Setup Paths (Restricted to Labeled BMS)
+    # 1. Setup Paths (Restricted to Labeled BMS) - 공용 피처 저장소에서 로드
     target_dirs = [
         r"d:\계산기\테스트 샘플",
         r"d:\계산기\패턴 모음2(GCS)"
     ]
-    
-    files = []
-    print("Scanning files...")
-    for root_dir in target_dirs:
-        # BMS
-        for ext in ['*.bms', '*.bme', '*.bml']:
-            files.extend(glob.glob(os.path.join(root_dir, '**', ext), recursive=True))
-        # OSU (Only if mixed in these folders, though usually BMS folders contain BMS)
-        for ext in ['*.osu']:
-            files.extend(glob.glob(os.path.join(root_dir, '**', ext), recursive=True))
-            
-    print(f"Found {len(files)} files.")
-    
-    chart_data = []
-    
-    for i, file_path in enumerate(files):
-        if i % 100 == 0:
-            print(f"Processing {i}/{len(files)}...")
-            
-        try:
-            # Determine Type
-            is_osu = file_path.lower().endswith('.osu')
-            is_gcs = "패턴 모음2(GCS)" in file_path
-            
-            # Parse
-            if is_osu:
-                parser = osu_parser.OsuParser(file_path)
-            else:
-                parser = bms_parser.BMSParser(file_path)
-                
-            notes = parser.parse()
-            if not notes:
-                continue
-                
-            # Filter 10K Only
-            if is_osu and parser.key_count != 10:
-                continue
-                
-            duration = parser.duration
-            if duration < 10:
-                continue
-                
-            # Get Label (if BMS)
-            label = None
-            title = "Unknown"
-            
-            if is_osu:
-                title = parser.header.get('Title', 'Unknown')
-                label = None
-            else:
-                # BMS Header parsing
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    for line in f:
-                        if line.upper().startswith("#PLAYLEVEL"):
-                            try:
-                                label = int(line.split()[1])
-                            except: pass
-                        if line.upper().startswith("#TITLE"):
-                            try:
-                                title = line.split(maxsplit=1)[1].strip()
-                            except: pass
-            
-            # GCS Filtering Rules
-            if is_gcs:
-                if label is None or label == 0:
-                    continue # Ignore 0 or unrated
-                
-                # Apply -5 Offset
-                label = label - 5
-                
-                # Ensure valid range
-                if label < 1:
-                    continue
-            
-            if label is None:
-                continue
-            
-            metrics = metric_calc.calculate_metrics(notes, duration)
-            
-            chart_data.append({
-                'metrics': metrics,
-                'duration': duration,
-                'total_notes': len(notes),
-                'label': label,
-                'title': title,
-                'file': os.path.basename(file_path)
-            })
-                
-        except Exception as e:
-            pass
-            
-    print(f"Loaded {len(chart_data)}/{len(files)} valid labeled charts.")
-    return chart_data
+    return feature_store.load_chart_data(sources=target_dirs, labeled_only=True)
 
-def objective_stage_1(params, chart_data, fixed_physics):
-    """Stage 1: Weights Optimization"""
-    alpha, theta, eta, omega, D_max = params
+# 파라미터 벡터 열 이름 (calc.compute_map_difficulty_batch 인자명)
+STAGE1_PARAMS = ('alpha', 'theta', 'eta', 'omega', 'D_max')
+STAGE2_PARAMS = ('lam_L', 'lam_S', 'gamma_curve')
+
+def population_mae(param_matrix, batch, param_names, level_key='pattern_level', **fixed):
+    """[P x n_params] 후보 행렬 전체의 MAE를 한 번에 계산 -> [P]"""
+    res = calc.compute_map_difficulty_population(
+        batch['basis'], batch['lengths'], batch['duration'], batch['total_notes'],
+        param_matrix, param_names,
+        cap_start=60.0, cap_range=30.0,
+        uncap_level=True, D_min=0.0,
+        **fixed
+    )
+    return np.mean(np.abs(res[level_key] - batch['labels']), axis=1)
+
+def objective_and_grad(params, batch, param_names, **fixed):
+    """MAE와 해석적 그래디언트 (minimize(..., jac=True)용)"""
+    return calc.dataset_mae_and_grad(
+        params, param_names, batch,
+        cap_start=60.0, cap_range=30.0,
+        uncap_level=True, D_min=0.0,
+        **fixed
+    )
+
+def _objective_stage_1(params, batch, fixed_physics):
     lam_L, lam_S, gamma = fixed_physics
-    
-    total_error = 0.0
-    for data in chart_data:
-        m = data['metrics']
-        res = calc.compute_map_difficulty(
-            m['nps'], m['ln_strain'], m['jack_pen'], m['roll_pen'], m['alt_cost'], m['hand_strain'],
-            m['chord_strain'],
-            alpha=alpha, theta=theta, eta=eta, omega=omega,
-            lam_L=lam_L, lam_S=lam_S,
-            cap_start=60.0, cap_range=30.0,
-            duration=data['duration'],
-            total_notes=data['total_notes'],
-            uncap_level=True
-        )
-        est_level = calc.pattern_level_from_D0(
-            res['D0'], D_min=0.0, D_max=D_max, gamma=gamma, uncap=True
-        )
-        total_error += abs(est_level - data['label'])
-        
-    return total_error / len(chart_data)
+    return objective_and_grad(
+        params, batch, STAGE1_PARAMS, lam_L=lam_L, lam_S=lam_S, gamma_curve=gamma
+    )
 
-def objective_stage_2(params, chart_data, fixed_weights):
-    """Stage 2: Physics Optimization"""
-    lam_L, lam_S, gamma = params
+def _objective_stage_2(params, batch, fixed_weights):
     alpha, theta, eta, omega, D_max = fixed_weights
-    
-    total_error = 0.0
-    for data in chart_data:
-        m = data['metrics']
-        res = calc.compute_map_difficulty(
-            m['nps'], m['ln_strain'], m['jack_pen'], m['roll_pen'], m['alt_cost'], m['hand_strain'],
-            m['chord_strain'],
-            alpha=alpha, theta=theta, eta=eta, omega=omega,
-            lam_L=lam_L, lam_S=lam_S,
-            cap_start=60.0, cap_range=30.0,
-            duration=data['duration'],
-            total_notes=data['total_notes'],
-            uncap_level=True
-        )
-        est_level = calc.pattern_level_from_D0(
-            res['D0'], D_min=0.0, D_max=D_max, gamma=gamma, uncap=True
-        )
-        total_error += abs(est_level - data['label'])
-        
-    return total_error / len(chart_data)
+    return objective_and_grad(
+        params, batch, STAGE2_PARAMS,
+        alpha=alpha, theta=theta, eta=eta, omega=omega, D_max=D_max
+    )
+
+# stage마다 자기 파라미터 열의 야코비안만 계산하고 캐시도 따로 둠 (키: stage 파라미터 + 고정값 + fold 데이터셋)
+stage_1_cache = calc.ObjectiveCache(_objective_stage_1)
+stage_2_cache = calc.ObjectiveCache(_objective_stage_2)
+
+def objective_stage_1(params, batch, fixed_physics):
+    """Stage 1: Weights Optimization"""
+    return stage_1_cache(params, batch, fixed_physics)
+
+def objective_stage_2(params, batch, fixed_weights):
+    """Stage 2: Physics Optimization"""
+    return stage_2_cache(params, batch, fixed_weights)
 
-def run_optimization_for_tier(tier_name, tier_data):
-    print(f"\n>>> Optimizing Tier: {tier_name} ({len(tier_data)} charts)")
+def run_optimization_for_tier(task):
+    """
+    티어 1개 최적화 (워커 프로세스에서 실행).
+    task = (tier_name, tier_index): tier_index는 공유 배치에서 이 티어 곡들의 인덱스
+    """
+    tier_name, tier_index = task
+    tier_index = np.asarray(tier_index)
+    batch = batch_pool.worker_batch()
+    batch_pool.report(f"\n>>> Optimizing Tier: {tier_name} ({len(tier_index)} charts)")
     
-    if len(tier_data) < 5:
-        print("Not enough data for this tier. Skipping.")
-        return None
+    if len(tier_index) < 5:
+        batch_pool.report(f"[{tier_name}] Not enough data for this tier. Skipping.")
+        return tier_name, None
 
     best_mae = float('inf')
     best_params = None
@@ -187,10 +99,12 @@ def run_optimization_for_tier(tier_name, tier_data):
     kf = KFold(n_splits=3, shuffle=True, random_state=42)
     
     fold_idx = 0
-    for train_index, test_index in kf.split(tier_data):
+    for train_index, test_index in kf.split(tier_index):
         fold_idx += 1
-        train_data = [tier_data[i] for i in train_index]
-        test_data = [tier_data[i] for i in test_index]
+        train_data = calc.take_chart_batch(batch, tier_index[train_index])
+        test_data = calc.take_chart_batch(batch, tier_index[test_index])
+        stage_1_cache.clear() # fold마다 데이터셋이 다름
+        stage_2_cache.clear()
         
         # Stage 1
         fixed_physics = [0.3, 0.8, 1.0] 
@@ -199,7 +113,7 @@ def run_optimization_for_tier(tier_name, tier_data):
         
         res1 = minimize(
             objective_stage_1, init_weights, args=(train_data, fixed_physics),
-            method='L-BFGS-B', bounds=bounds_weights
+            method='L-BFGS-B', jac=True, bounds=bounds_weights
         )
         best_weights_iter = res1.x
 
@@ -209,35 +123,20 @@ def run_optimization_for_tier(tier_name, tier_data):
         
         res2 = minimize(
             objective_stage_2, init_physics, args=(train_data, best_weights_iter),
-            method='L-BFGS-B', bounds=bounds_physics
+            method='L-BFGS-B', jac=True, bounds=bounds_physics
         )
         best_physics_iter = res2.x
         
         # Validation
-        alpha, theta, eta, omega, D_max = best_weights_iter
-        lam_L, lam_S, gamma = best_physics_iter
+        opt_params = np.concatenate([best_weights_iter, best_physics_iter])
         
-        def calculate_mae(dataset):
-            total_error = 0.0
-            for data in dataset:
-                m = data['metrics']
-                res = calc.compute_map_difficulty(
-                    m['nps'], m['ln_strain'], m['jack_pen'], m['roll_pen'], m['alt_cost'], m['hand_strain'],
-                    m['chord_strain'],
-                    alpha=alpha, theta=theta, eta=eta, omega=omega,
-                    lam_L=lam_L, lam_S=lam_S,
-                    cap_start=60.0, cap_range=30.0,
-                    duration=data['duration'],
-                    total_notes=data['total_notes'],
-                    uncap_level=True,
-                    D_max=D_max, gamma_curve=gamma
-                )
-                est_level = res['est_level']
-                total_error += abs(est_level - data['label'])
-            return total_error / len(dataset)
+        def calculate_mae(batch):
+            return float(population_mae(
+                [opt_params], batch, STAGE1_PARAMS + STAGE2_PARAMS, level_key='est_level'
+            )[0])
 
         test_mae = calculate_mae(test_data)
-        print(f"  Fold {fold_idx}: Test MAE={test_mae:.4f}")
+        batch_pool.report(f"  [{tier_name}] Fold {fold_idx}: Test MAE={test_mae:.4f} [stage 1 {stage_1_cache.stats()}; stage 2 {stage_2_cache.stats()}]")
         
         if test_mae < best_mae:
             best_mae = test_mae
@@ -247,42 +146,69 @@ def run_optimization_for_tier(tier_name, tier_data):
                 'mae': test_mae
             }
             
-    return best_params
+    return tier_name, best_params
+
+def save_json_atomic(data, path):
+    """임시 파일에 쓴 뒤 교체 (중간에 중단돼도 기존 파일 유지)"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding='utf-8') as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
 
-def optimize_segmented():
+def optimize_segmented(n_jobs=None):
+    """
+    n_jobs: 티어 병렬 프로세스 수 (None이면 CPU 코어 수, 1이면 순차 실행)
+    """
     all_data = load_charts()
     if not all_data: return
 
-    segmented_results = {}
-    
+    # 피처 기저는 한 번만 쌓고, 티어별 워커는 공유 메모리로 같은 배치를 읽음
+    full_batch = calc.stack_chart_data(all_data)
+    labels = full_batch['labels']
+
+    tier_tasks = []
+    tier_info = {}
     for min_lv, max_lv, name in TIERS:
         # Filter data for this tier
-        tier_data = [d for d in all_data if min_lv <= d['label'] < max_lv]
+        tier_index = np.flatnonzero((labels >= min_lv) & (labels < max_lv))
         
-        if not tier_data:
+        if len(tier_index) == 0:
             print(f"No data for {name} ({min_lv}-{max_lv})")
             continue
-            
-        result = run_optimization_for_tier(f"{name} ({min_lv}-{max_lv})", tier_data)
         
+        tier_name = f"{name} ({min_lv}-{max_lv})"
+        tier_info[tier_name] = (name, min_lv, max_lv, len(tier_index))
+        tier_tasks.append((tier_name, tier_index))
+
+    # 큰 티어부터 보내서 전체 시간이 가장 느린 티어에 맞춰지도록 함
+    tier_tasks.sort(key=lambda t: len(t[1]), reverse=True)
+
+    results = {}
+    for tier_name, result in batch_pool.imap_over_batch(
+        run_optimization_for_tier, tier_tasks, full_batch, n_jobs=n_jobs, ordered=False
+    ):
+        results[tier_name] = result
         if result:
-            segmented_results[name] = {
-                'range': [min_lv, max_lv],
-                'count': len(tier_data),
-                'params': result
-            }
-            
             # Print Summary
             p = result
             w = p['weights']
             ph = p['physics']
-            print(f"  [Result] MAE: {p['mae']:.4f}")
+            print(f"  [{tier_name} Result] MAE: {p['mae']:.4f}")
             print(f"  Weights: A={w[0]:.2f}, Th={w[1]:.2f}, Et={w[2]:.2f}, Om={w[3]:.2f}, Dm={w[4]:.1f}")
             print(f"  Physics: lL={ph[0]:.2f}, lS={ph[1]:.2f}, Gm={ph[2]:.2f}")
 
+    # 완료 순서와 무관하게 TIERS 순서로 병합
+    segmented_results = {}
+    for tier_name, (name, min_lv, max_lv, count) in tier_info.items():
+        if results.get(tier_name):
+            segmented_results[name] = {
+                'range': [min_lv, max_lv],
+                'count': count,
+                'params': results[tier_name]
+            }
+
     # Save
-    with open(r"d:\계산기\segmented_params.json", "w", encoding='utf-8') as f:
-        json.dump(segmented_results, f, indent=4)
+    save_json_atomic(segmented_results, r"d:\계산기\segmented_params.json")
     print("\nSaved segmented parameters to d:\\계산기\\segmented_params.json")
 
 if __name__ == "__main__":
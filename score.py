@@ -0,0 +1,683 @@
+"""
+통합 배치 채점 CLI (score)
+
+run_full_analysis / run_analysis_basic / run_analysis_optimized / run_calibration_analysis /
+run_bms_only_analysis 스크립트를 하나로 합친 명령입니다. 대상 폴더, 모델(legacy calc /
+new_calc 선형), 워커 수, 출력 형식을 인자로 받고, 파일 파싱과 메트릭 계산은 프로세스 풀에서
+병렬로 실행합니다. 보고서 형식은 기존 스크립트와 같습니다.
+
+    python score.py                                         # 기본 폴더, calc 모델, report_optimized.txt
+    python score.py "d:\\계산기\\패턴 모음" --model new_calc --jobs 8 --format txt csv
+    python score.py --report compare --format txt jsonl      # 기본 파라미터 vs final_params 비교
+    python score.py --report bms --bms-only                  # NPS 베이스라인 vs 모델 (BMS 전용)
+
+보고서 (--report):
+    full        : 통계, MAE, 레벨 분포, Top 30, 전체 목록 (run_full_analysis)
+    compare     : 기본 파라미터(Current) vs 최적화 파라미터(Optimizer) (run_analysis_basic/optimized)
+    bms         : NPS 베이스라인 회귀 vs 모델 MAE, 출처/레벨별 오차 (run_bms_only_analysis)
+    calibration : 레이블 있는 곡의 D0 목록 (run_calibration_analysis -> calibrate_levels 입력)
+
+매니페스트: 채점한 파일마다 (경로, 크기, 수정 시각, 모델 버전)과 결과를 <출력>.manifest.jsonl에
+한 줄씩 추가합니다. 다시 실행하면 네 값이 같은 파일은 기록된 결과를 재사용하고 새 파일/수정된
+파일만 채점하므로, 중간에 중단된 실행도 이어서 진행됩니다 (--rescore 로 전체 재채점).
+
+라이브러리 인덱스: --index [경로] 를 주면 곡/피처/예측을 SQLite 인덱스(library_index.py)에
+증분으로 저장합니다.
+
+중복 제거: 앞서 나온 파일과 바이트가 같은 파일은 파싱/채점 없이 결과를 복사하고, 노트 배열
+지문(feature_store.note_fingerprint)과 레이블이 같은 차트는 처음 나온 파일에 duplicate_of로 연결합니다.
+노트가 같은데 레이블이 다른 차트(GCS 사본 등)는 연결하지 않고 레이블 충돌로 보고합니다.
+jsonl/csv에는 모든 파일이 남고, txt 보고서 통계는 중복을 한 번만 셉니다 (--keep-duplicates 로 끔).
+"""
+
+import os
+import re
+import csv
+import json
+import time
+import hashlib
+import inspect
+import argparse
+import numpy as np
+from multiprocessing import Pool
+import calc
+import new_calc
+import feature_store
+import batch_pool
+import library_index
+
+DEFAULT_PARAMS_PATH = r"d:\계산기\final_params.json"
+MODEL_CHOICES = ('calc', 'new_calc')
+REPORT_CHOICES = ('full', 'compare', 'bms', 'calibration')
+FORMAT_CHOICES = ('txt', 'jsonl', 'csv')
+
+# 보고서별 기본 출력 파일 (기존 스크립트와 같은 이름, --output 으로 변경)
+DEFAULT_OUTPUTS = {
+    'full': {'txt': "report_optimized.txt", 'jsonl': "analysis_results.jsonl", 'csv': "analysis_results.csv"},
+    'compare': {'txt': "full_analysis_report_optimized.txt", 'jsonl': "analysis_results_temp.jsonl",
+                'csv': "analysis_results_temp.csv"},
+    'bms': {'txt': "bms_only_report.txt", 'jsonl': "bms_only_results.jsonl", 'csv': "bms_only_results.csv"},
+    'calibration': {'txt': "calibration_report.txt", 'jsonl': "analysis_results_calibration.jsonl",
+                    'csv': "analysis_results_calibration.csv"},
+}
+
+# jsonl/csv 결과의 키 이름을 기존 스크립트 출력에 맞춤 (calibrate_levels 등 후속 도구 호환)
+# 결과 dict 중 인덱스 전용 필드 (jsonl/csv 출력에서 제외)
+INDEX_ONLY_KEYS = ('features', 'header')
+
+LEGACY_KEYS = {
+    'full': {'level': 'opt_level', 'd0': 'opt_d0'},
+    'compare': {'level': 'opt_level', 'd0': 'opt_d0'},
+    'bms': {'level': 'model_level', 'd0': 'D0'},
+    'calibration': {'d0': 'd_raw'},
+}
+
+# compute_map_difficulty가 받는 파라미터 (final_params.json의 'mae' 같은 기록용 키 제외)
+CALC_PARAM_NAMES = frozenset(inspect.signature(calc.compute_map_difficulty).parameters)
+
+OSU_LEVEL_OFFSET = 0.72
+PROGRESS_INTERVAL = 100
+LABEL_CONFLICT_PRINT_LIMIT = 20
+ERROR_PRINT_LIMIT = 20
+
+# 채점 로직(필터, 레이블 규칙, 결과 필드)이 바뀌면 올림 -> 기존 매니페스트 항목은 모두 재채점
+# (4: #PLAYLEVEL/#TITLE이 여러 번 나오면 마지막 값을 레이블로 사용, 5: 노트 지문에 노트 종류 포함,
+#  6: 채점 오류를 필터 제외(None)와 구분 -> 이전에 오류가 None으로 기록된 파일도 다시 채점)
+SCORE_VERSION = 6
+MANIFEST_SUFFIX = ".manifest.jsonl"
+
+def load_params(path):
+    """
+    calc 파라미터 JSON 로드. 읽을 수 없으면 None
+    (기존 스크립트처럼 중단 -> 기본값 보고서가 최적화 결과로 오인되지 않도록)
+    """
+    try:
+        with open(path, "r", encoding='utf-8') as f:
+            params = json.load(f)
+        print(f"Loaded params from {path}")
+    except Exception as e:
+        print(f"Could not load {path}: {e}")
+        print("Pass --default-params to score with calc's default parameters instead.")
+        return None
+    return {k: v for k, v in params.items() if k in CALC_PARAM_NAMES}
+
+def osu_filename_level(file_path):
+    """Osu 파일 이름의 레벨 표기 (Lv.X)"""
+    match = re.search(r'Lv\.(\d+)', os.path.basename(file_path))
+    return int(match.group(1)) if match else None
+
+def calc_level(chart, params, options):
+    metrics = chart['metrics']
+    res = calc.compute_map_difficulty(
+        *[metrics[key] for key in calc.METRIC_KEYS],
+        **params,
+        duration=chart['duration'],
+        total_notes=chart['total_notes'] if options['length_bonus'] else 0,
+        uncap_level=True,
+        level_offset=OSU_LEVEL_OFFSET if chart['is_osu'] else 0.0
+    )
+    return float(res['pattern_level']), float(res['D0'])
+
+def score_error(exc):
+    """score_file의 오류 결과 (파일 잠금, 파서 예외 등). 필터 제외(None)와 달리 매니페스트에 기록하지 않음"""
+    return {'error': f"{type(exc).__name__}: {exc}"}
+
+def is_score_error(record):
+    return record is not None and 'error' in record
+
+def score_file(task):
+    """
+    파일 1개 채점 (풀 워커). task = (file_path, options)
+    Returns: 결과 dict, None (필터 제외) 또는 score_error(...) (파싱 / 채점 오류)
+    """
+    file_path, options = task
+    try:
+        chart = feature_store.extract_chart(file_path, keep_notes=options['model'] == 'new_calc',
+                                            keep_header=True)
+    except Exception as e:
+        return score_error(e)
+    if chart is None:
+        return None
+
+    label = chart['label']
+    if chart['is_osu'] and options['osu_labels']:
+        label = osu_filename_level(file_path)
+    if options['labeled_only'] and label is None:
+        return None
+
+    record = {
+        'file': os.path.basename(file_path),
+        'full_path': file_path,
+        'title': chart['title'],
+        'type': 'OSU' if chart['is_osu'] else 'BMS',
+        'label': label,
+        'is_gcs': chart['is_gcs'],
+        'key_count': chart['key_count'],
+        'duration': chart['duration'],
+        'total_notes': chart['total_notes'],
+        'nps_baseline': chart['total_notes'] / chart['duration'],
+        'content_hash': feature_store.file_content_hash(file_path),
+        'note_hash': chart['note_hash'],
+        'features': dict(global_nps=chart['total_notes'] / chart['duration'],
+                         **feature_store.chart_aggregates(chart['metrics'])),
+        'header': library_index.header_summary(chart['header']),
+    }
+
+    try:
+        if options['model'] == 'new_calc':
+            res = new_calc.predict_from_notes(
+                chart['notes'], chart['duration'],
+                chord_mean=float(np.mean(chart['metrics']['chord_strain']))
+            )
+            record['level'] = float(res['level'])
+            record['d0'] = None
+        else:
+            record['level'], record['d0'] = calc_level(chart, options['params'], options)
+            if options['compare']:
+                record['curr_level'], record['curr_d0'] = calc_level(chart, {}, options)
+    except Exception as e:
+        return score_error(e)
+    return record
+
+def score_files(files, options, n_jobs=None):
+    """files를 채점해 결과를 파일 순서대로 yield (n_jobs=1 이면 현재 프로세스에서 순차 실행)"""
+    tasks = [(path, options) for path in files]
+    if n_jobs is None:
+        n_jobs = batch_pool.default_n_jobs(len(tasks))
+    if n_jobs <= 1:
+        yield from map(score_file, tasks)
+        return
+    with Pool(processes=n_jobs) as pool:
+        # 파일 하나는 가벼우므로 묶어서 분배 (imap은 입력 순서 유지 -> 결과가 결정적)
+        yield from pool.imap(score_file, tasks, chunksize=8)
+
+def link_copy(file_path, source, options):
+    """
+    source와 바이트가 같은 파일의 결과: 파싱/채점 없이 복사하고 경로별 레이블 규칙만 다시 적용
+    Returns: 결과 dict 또는 None (이 경로에서는 필터 제외)
+    """
+    is_gcs = feature_store.is_gcs_path(file_path)
+    if source['type'] == 'OSU':
+        label = osu_filename_level(file_path) if options['osu_labels'] else None
+    else:
+        label, _ = feature_store.read_bms_header(file_path)
+        if is_gcs:
+            label = feature_store.gcs_label(label)
+            if label is None:
+                return None
+    if options['labeled_only'] and label is None:
+        return None
+    return dict(source, file=os.path.basename(file_path), full_path=file_path, label=label, is_gcs=is_gcs)
+
+def link_duplicates(results):
+    """
+    노트 지문과 레이블이 같은 결과에 'duplicate_of' (처음 나온 파일 경로, 원본은 None)를 붙인 복사본.
+    레이블이 다르면 연결하지 않음 (어느 레이블이 남는지가 폴더 순서에 좌우되지 않도록)
+    """
+    first = {}
+    linked = []
+    for r in results:
+        key = (r['note_hash'], r['label'])
+        canonical = first.setdefault(key, r['full_path']) if r['note_hash'] else r['full_path']
+        linked.append(dict(r, duplicate_of=None if canonical == r['full_path'] else canonical))
+    return linked
+
+def label_conflicts(results):
+    """노트 지문이 같은데 레이블이 다른 묶음 [[(경로, 레이블), ...], ...] (레이블마다 처음 나온 파일)"""
+    groups = {}
+    for r in results:
+        if r['note_hash'] and r['duplicate_of'] is None:
+            groups.setdefault(r['note_hash'], []).append((r['full_path'], r['label']))
+    return [group for group in groups.values() if len(group) > 1]
+
+def scan_targets(target_dirs, bms_only=False):
+    files = [path for _, path in feature_store.scan_files(target_dirs)]
+    if bms_only:
+        files = [p for p in files if os.path.splitext(p)[1].lower() in feature_store.BMS_EXTENSIONS]
+    return files
+
+# ----------------------------
+# 매니페스트 (증분 재채점)
+# ----------------------------
+def model_version(options):
+    """결과에 영향을 주는 설정(모델, 파라미터, 필터 옵션)의 해시 -> 'calc-v1-<sha1 12자리>'"""
+    key = dict(options)
+    if options['model'] == 'new_calc':
+        key['linear_params'] = new_calc.NPS_LINEAR_PARAMS
+    digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    return f"{options['model']}-v{SCORE_VERSION}-{digest}"
+
+def file_signature(path):
+    """(크기, 수정 시각 ns)"""
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+def default_manifest_path(report, output=None):
+    base = output if output else os.path.splitext(DEFAULT_OUTPUTS[report]['jsonl'])[0]
+    return base + MANIFEST_SUFFIX
+
+def load_manifest(path):
+    """매니페스트 -> {경로: 항목} (같은 경로는 마지막 줄 우선, 중단으로 잘린 줄은 무시)"""
+    entries = {}
+    if not os.path.exists(path):
+        return entries
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            entries[entry['path']] = entry
+    return entries
+
+def manifest_entry(path, size, mtime_ns, version, record):
+    return {'path': path, 'size': size, 'mtime_ns': mtime_ns, 'model_version': version, 'record': record}
+
+def compact_manifest(path, entries):
+    """현재 스캔 대상 항목만 남겨 다시 씀 (임시 파일에 쓴 뒤 교체)"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, path)
+
+def update_index(path, entries, version):
+    """매니페스트 항목을 라이브러리 인덱스에 반영 (이미 같은 파일/모델 버전 예측이 있으면 건너뜀)"""
+    with library_index.LibraryIndex(path) as index:
+        known = index.indexed(version)
+        added = 0
+        for e in entries:
+            if e['record'] is not None and known.get(e['path']) != (e['size'], e['mtime_ns']):
+                index.add(e['record'], e['size'], e['mtime_ns'], version)
+                added += 1
+        removed = index.remove_missing([e['path'] for e in entries])
+        print(f"Library index: {added} updated, {removed} removed, {len(index)} charts -> {path}")
+
+# ----------------------------
+# 보고서
+# ----------------------------
+def level_stats(values):
+    vals = [v for v in values if v is not None and not np.isnan(v)]
+    if not vals: return "N/A"
+    return (
+        f"Mean: {np.mean(vals):.2f} | Median: {np.median(vals):.2f} | "
+        f"Min: {np.min(vals):.2f} | Max: {np.max(vals):.2f} | Std: {np.std(vals):.2f}"
+    )
+
+def level_histogram(values, bins=20):
+    vals = [v for v in values if v is not None and not np.isnan(v)]
+    if not vals: return "No data"
+
+    max_val = max(np.max(vals), 26) # At least 26 to cover normal range
+    hist, bin_edges = np.histogram(vals, bins=bins, range=(0, max_val))
+    lines = []
+    for i in range(len(hist)):
+        range_str = f"{int(bin_edges[i]):03d}-{int(bin_edges[i+1]):03d}"
+        bar = "#" * int(hist[i] / len(vals) * 50)
+        lines.append(f"{range_str} : {hist[i]:4d} ({hist[i]/len(vals)*100:5.1f}%) | {bar}")
+    return "\n".join(lines)
+
+def report_header(title, results, info):
+    return [
+        f"=== {title} ===",
+        f"Date: {time.strftime('%Y-%m-%d %H:%M:%S')}",
+        f"Model: {info['model']}",
+        f"Total Files Found: {info['n_files']}",
+        f"Total Files Processed: {len(results)}",
+        f"Duplicates Linked: {info['n_duplicates']}" + (" (included)" if info['keep_duplicates'] else " (counted once)"),
+        f"Label Conflicts: {info['n_label_conflicts']} (note-identical charts with different labels, kept separately)",
+        f"Failed Files: {info['n_errors']} (not recorded, retried on the next run)",
+        f"Execution Time: {info['elapsed']:.2f}s",
+    ]
+
+def report_full(results, info):
+    lines = report_header("Analysis Report: Band-wise Optimized (Antigravity v0.1)", results, info)
+    labeled = [r for r in results if r['label'] is not None]
+
+    lines.append("\n--- Statistics ---")
+    lines.append(f"All Files Level:   {level_stats([r['level'] for r in results])}")
+    lines.append(f"Labeled Files:     {level_stats([r['level'] for r in labeled])}")
+    if labeled:
+        mae = np.mean([abs(r['level'] - r['label']) for r in labeled])
+        lines.append(f"MAE (vs Label):    {mae:.2f}")
+
+    lines.append("\n--- Level Distribution ---")
+    lines.append(level_histogram([r['level'] for r in results]))
+
+    lines.append("\n=== Top 30 Hardest ===")
+    ranked = sorted(results, key=lambda x: x['level'], reverse=True)
+    for r in ranked[:30]:
+        lbl = f"[Lv.{r['label']}]" if r['label'] else "[Unlabeled]"
+        lines.append(f"{r['level']:.2f} {lbl} {r['title']} ({r['file']})")
+
+    lines.append("\n=== All Files List ===")
+    lines.append("Level | Label | Title | File")
+    for r in ranked:
+        lbl = str(r['label']) if r['label'] is not None else "N/A"
+        lines.append(f"{r['level']:6.2f} | {lbl:>5} | {r['title']} | {r['file']}")
+    return lines
+
+def report_compare(results, info):
+    lines = report_header("Detailed Global Estimation Report", results, info)
+    labeled = [r for r in results if r['label'] is not None]
+    unlabeled = [r for r in results if r['label'] is None]
+
+    for name, data in (("Global Statistics (All Files)", results),
+                       (f"Labeled Files ({len(labeled)})", labeled),
+                       (f"Unlabeled Files ({len(unlabeled)})", unlabeled)):
+        lines.append(f"\n--- {name} ---")
+        lines.append(f"Current Level:   {level_stats([r['curr_level'] for r in data])}")
+        lines.append(f"Optimizer Level: {level_stats([r['level'] for r in data])}")
+        if data is labeled and labeled:
+            curr_mae = np.mean([abs(r['curr_level'] - r['label']) for r in labeled])
+            opt_mae = np.mean([abs(r['level'] - r['label']) for r in labeled])
+            lines.append(f"MAE Comparison: Current={curr_mae:.2f} vs Optimizer={opt_mae:.2f}")
+
+    lines.append("\n--- Level Distribution (All Files) ---")
+    lines.append("[Current Default]")
+    lines.append(level_histogram([r['curr_level'] for r in results], bins=13))
+    lines.append("\n[Optimizer]")
+    lines.append(level_histogram([r['level'] for r in results], bins=13))
+
+    ranked = sorted(results, key=lambda x: x['level'], reverse=True)
+    lines.append("\n=== Top 30 Hardest (Optimizer) ===")
+    for r in ranked[:30]:
+        lbl = f"[Lv.{r['label']}]" if r['label'] else "[Unlabeled]"
+        lines.append(f"{r['level']:.2f} {lbl} {r['title']} ({r['file']})")
+
+    lines.append("\n=== All Files List (Sorted by Optimizer Level) ===")
+    lines.append("OptLevel | CurrLevel | Label | Title | File")
+    for r in ranked:
+        lbl = str(r['label']) if r['label'] is not None else "N/A"
+        lines.append(f"{r['level']:8.2f} | {r['curr_level']:9.2f} | {lbl:>5} | {r['title']} | {r['file']}")
+    return lines
+
+def report_bms(results, info):
+    lines = report_header("BMS-Only Analysis Report", results, info)
+    labeled = [r for r in results if r['label'] is not None]
+    if len(labeled) < 2:
+        lines.append("\nNot enough labeled charts.")
+        return lines
+
+    # NPS 베이스라인 선형 회귀: level = slope * NPS + intercept
+    nps = np.array([r['nps_baseline'] for r in labeled])
+    labels = np.array([r['label'] for r in labeled], dtype=float)
+    slope, intercept = np.polyfit(nps, labels, 1)
+    r_squared = np.corrcoef(nps, labels)[0, 1] ** 2
+    nps_pred = slope * nps + intercept
+    model_pred = np.array([r['level'] for r in labeled])
+
+    nps_mae = np.mean(np.abs(nps_pred - labels))
+    model_mae = np.mean(np.abs(model_pred - labels))
+    lines.append("\n=== NPS Baseline Regression ===")
+    lines.append(f"Formula: level = {slope:.4f} * NPS + {intercept:.4f}")
+    lines.append(f"R-squared: {r_squared:.4f}")
+
+    lines.append("\n=== MAE Comparison ===")
+    lines.append(f"NPS-only Baseline MAE: {nps_mae:.4f}")
+    lines.append(f"Current Model MAE:     {model_mae:.4f}")
+    lines.append(f"Improvement:           {nps_mae - model_mae:.4f} ({(nps_mae - model_mae) / nps_mae * 100:.1f}%)")
+    lines.append(f"Model RMSE:            {np.sqrt(np.mean((model_pred - labels) ** 2)):.4f}")
+    lines.append(f"Model Bias:            {np.mean(model_pred - labels):+.4f}")
+
+    is_gcs = np.array([r['is_gcs'] for r in labeled], dtype=bool)
+    for name, mask in (("GCS Charts", is_gcs), ("Other Charts", ~is_gcs)):
+        if mask.any():
+            lines.append(f"\n[{name}: {int(mask.sum())}]")
+            lines.append(f"  NPS Baseline MAE: {np.mean(np.abs(nps_pred[mask] - labels[mask])):.4f}")
+            lines.append(f"  Model MAE:        {np.mean(np.abs(model_pred[mask] - labels[mask])):.4f}")
+            lines.append(f"  Model Bias:       {np.mean(model_pred[mask] - labels[mask]):+.4f}")
+
+    lines.append("\n=== Per-Level Analysis ===")
+    lines.append(f"{'Level':<8} {'Count':>6} {'MAE':>8} {'Bias':>8}  | Distribution")
+    for lv in np.unique(labels):
+        mask = labels == lv
+        resid = model_pred[mask] - lv
+        bar = "#" * min(int(mask.sum()), 50)
+        lines.append(f"Lv.{int(lv):<5} {int(mask.sum()):>6} {np.mean(np.abs(resid)):>8.2f} {np.mean(resid):>+8.2f}  | {bar}")
+
+    lines.append("\n=== Top 20 Largest Errors ===")
+    lines.append(f"{'Error':>6} {'Label':>6} {'Pred':>6} Title")
+    errors = np.abs(model_pred - labels)
+    for i in np.argsort(-errors, kind='stable')[:20]:
+        lines.append(f"{errors[i]:>6.2f} {labeled[i]['label']:>6} {model_pred[i]:>6.1f} {labeled[i]['title'][:50]}")
+
+    lines.append("\n=== All Charts ===")
+    lines.append("Label | NPS_Pred | Model | Error_NPS | Error_Model | Title")
+    for i in np.argsort(labels, kind='stable'):
+        lines.append(f"{labeled[i]['label']:5d} | {nps_pred[i]:8.2f} | {model_pred[i]:5.2f} | "
+                     f"{abs(nps_pred[i] - labels[i]):9.2f} | {errors[i]:11.2f} | {labeled[i]['title']}")
+    return lines
+
+def report_calibration(results, info):
+    lines = report_header("Calibration Data", results, info)
+    lines.append(f"D0:    {level_stats([r['d0'] for r in results])}")
+    lines.append(f"Level: {level_stats([r['level'] for r in results])}")
+    for ftype in ('BMS', 'OSU'):
+        lines.append(f"{ftype}: {sum(1 for r in results if r['type'] == ftype)} charts")
+    return lines
+
+REPORTS = {
+    'full': report_full,
+    'compare': report_compare,
+    'bms': report_bms,
+    'calibration': report_calibration,
+}
+
+# ----------------------------
+# 출력
+# ----------------------------
+def legacy_rows(results, report):
+    rename = LEGACY_KEYS[report]
+    return [{rename.get(k, k): v for k, v in r.items() if k not in INDEX_ONLY_KEYS} for r in results]
+
+def write_outputs(results, info, report, formats, output=None):
+    """formats 각각의 파일을 쓰고 경로 목록 반환. output은 확장자 없는 경로 (None이면 보고서별 기본 이름)"""
+    paths = []
+    for fmt in formats:
+        path = f"{output}.{fmt}" if output else DEFAULT_OUTPUTS[report][fmt]
+        if fmt == 'txt':
+            rows = results if info['keep_duplicates'] else [r for r in results if r['duplicate_of'] is None]
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n".join(REPORTS[report](rows, info)))
+        elif fmt == 'jsonl':
+            with open(path, "w", encoding="utf-8") as f:
+                for row in legacy_rows(results, report):
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        else:
+            rows = legacy_rows(results, report)
+            with open(path, "w", newline='', encoding='utf-8-sig') as f:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else [])
+                writer.writeheader()
+                writer.writerows(rows)
+        paths.append(path)
+    return paths
+
+def run_score(target_dirs=feature_store.DEFAULT_TARGET_DIRS, model='calc', report='full',
+              formats=('txt',), output=None, n_jobs=None, params_path=DEFAULT_PARAMS_PATH,
+              bms_only=False, length_bonus=True, manifest='auto', rescore=False, index=None,
+              keep_duplicates=False, default_params=False):
+    """
+    target_dirs의 차트를 채점해 보고서/결과 파일 작성.
+
+    Args:
+        model: 'calc' (final_params 적용 legacy 모델) 또는 'new_calc' (3-feature 선형 모델)
+        report: REPORT_CHOICES 중 하나
+        formats: 'txt' (보고서), 'jsonl', 'csv' (곡별 결과)
+        n_jobs: 파싱/채점 프로세스 수 (None이면 CPU 수, 1이면 순차)
+        length_bonus: False면 total_notes=0으로 곡 길이 보정 끔 (기존 run_full_analysis 수치 재현)
+        manifest: 매니페스트 경로, 'auto'(출력 이름 기준) 또는 None(사용 안 함)
+        rescore: True면 매니페스트의 기존 결과를 무시하고 전체 재채점
+        index: SQLite 라이브러리 인덱스 경로 (None이면 사용 안 함)
+        keep_duplicates: True면 txt 보고서 통계에 중복 차트도 모두 포함
+        default_params: True면 params_path 대신 calc 기본 파라미터 사용 (명시적으로 요청할 때만)
+
+    Returns: 결과 dict 리스트 (파일 순서, 중복은 'duplicate_of'에 원본 경로).
+             calc 파라미터 파일을 읽을 수 없으면 None (아무것도 쓰지 않음)
+    """
+    if report == 'compare' and model != 'calc':
+        raise ValueError("--report compare requires --model calc")
+    params = {}
+    if model == 'calc':
+        if default_params:
+            print("Using calc default parameters (--default-params)")
+        else:
+            params = load_params(params_path)
+            if params is None:
+                return None
+    options = {
+        'model': model,
+        'params': params,
+        'compare': report == 'compare',
+        'osu_labels': report == 'calibration',   # 10K2S 팩: 파일 이름의 Lv.X를 레이블로 사용
+        'labeled_only': report in ('bms', 'calibration'),
+        'length_bonus': length_bonus,
+    }
+
+    files = scan_targets(target_dirs, bms_only)
+    version = model_version(options)
+    if manifest == 'auto':
+        manifest = default_manifest_path(report, output)
+    done = load_manifest(manifest) if manifest and not rescore else {}
+
+    # 크기/수정 시각/모델 버전이 같은 파일은 기록된 결과 재사용
+    entries = [None] * len(files)
+    pending = []
+    # 오류 파일 [(경로, 메시지)]: 매니페스트에 기록하지 않으므로 다음 실행에서 다시 채점
+    errors = []
+    for i, path in enumerate(files):
+        try:
+            size, mtime_ns = file_signature(path)
+        except OSError as e:
+            errors.append((path, score_error(e)['error']))
+            continue
+        entry = done.get(path)
+        if (entry is not None and entry['size'] == size and entry['mtime_ns'] == mtime_ns
+                and entry['model_version'] == version):
+            entries[i] = entry
+        else:
+            pending.append((i, path, size, mtime_ns))
+    print(f"Found {len(files)} files ({len(files) - len(pending)} unchanged). "
+          f"Scoring {len(pending)} with model={model} ...")
+
+    start_time = time.time()
+    # 바이트가 같은 파일은 처음 나온 파일(매니페스트에 결과가 있으면 그 결과)만 채점
+    known = {e['record']['content_hash']: e['record'] for e in entries if e is not None and e['record']}
+    originals, copies = [], []
+    for item in pending:
+        try:
+            content_hash = feature_store.file_content_hash(item[1])
+        except OSError as e:
+            errors.append((item[1], score_error(e)['error']))
+            continue
+        (copies if content_hash in known else originals).append(item + (content_hash,))
+        known.setdefault(content_hash, None)
+
+    log = open(manifest, "a", encoding="utf-8") if manifest else None
+
+    def store(item, record):
+        i, path, size, mtime_ns, _ = item
+        entries[i] = manifest_entry(path, size, mtime_ns, version, record)
+        if log is not None:
+            # 한 줄씩 추가 + flush: 중단돼도 여기까지의 결과는 다음 실행에서 재사용
+            log.write(json.dumps(entries[i], ensure_ascii=False) + "\n")
+            log.flush()
+
+    n_scored = 0
+    n_linked = 0
+
+    def score_items(items):
+        nonlocal n_scored
+        for item, record in zip(items, score_files([item[1] for item in items], options, n_jobs)):
+            n_scored += 1
+            if is_score_error(record):
+                errors.append((item[1], record['error']))
+            else:
+                store(item, record)
+                if record is not None and known.get(item[4]) is None:
+                    known[item[4]] = record
+            if n_scored % PROGRESS_INTERVAL == 0:
+                print(f"Processed {n_scored}/{len(pending)} files...", flush=True)
+
+    try:
+        score_items(originals)
+        # 사본: 원본 결과를 복사. 원본이 필터로 제외된 사본만 직접 채점 (경로별 레이블 규칙이 다를 수 있음)
+        for item in copies:
+            if known.get(item[4]) is not None:
+                try:
+                    store(item, link_copy(item[1], known[item[4]], options))
+                    n_linked += 1
+                except OSError as e:
+                    errors.append((item[1], score_error(e)['error']))
+        score_items([item for item in copies if known.get(item[4]) is None])
+    finally:
+        if log is not None:
+            log.close()
+
+    entries = [e for e in entries if e is not None]
+    if manifest:
+        compact_manifest(manifest, entries)
+    results = link_duplicates([e['record'] for e in entries if e['record'] is not None])
+    if index:
+        update_index(index, entries, version)
+
+    n_duplicates = sum(1 for r in results if r['duplicate_of'] is not None)
+    conflicts = label_conflicts(results)
+    info = {'model': model, 'n_files': len(files), 'elapsed': time.time() - start_time,
+            'n_duplicates': n_duplicates, 'keep_duplicates': keep_duplicates,
+            'n_label_conflicts': len(conflicts), 'n_errors': len(errors)}
+    print(f"Scored {n_scored} new/modified files in {info['elapsed']:.2f}s "
+          f"({n_linked} byte-identical copies linked, {len(results)} charts, "
+          f"{n_duplicates} duplicates, {len(errors)} failed)")
+    for path, message in errors[:ERROR_PRINT_LIMIT]:
+        print(f"Failed: {path} ({message})")
+    if len(errors) > ERROR_PRINT_LIMIT:
+        print(f"... {len(errors) - ERROR_PRINT_LIMIT} more failed files")
+    if errors:
+        print("Failed files are not recorded in the manifest and will be scored again on the next run.")
+    for group in conflicts[:LABEL_CONFLICT_PRINT_LIMIT]:
+        print("Label conflict: " + " vs ".join(f"{path} (label {label})" for path, label in group))
+    if len(conflicts) > LABEL_CONFLICT_PRINT_LIMIT:
+        print(f"... {len(conflicts) - LABEL_CONFLICT_PRINT_LIMIT} more label conflicts")
+    for path in write_outputs(results, info, report, formats, output):
+        print(f"Saved: {path}")
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch difficulty scoring")
+    parser.add_argument("dirs", nargs="*", default=None,
+                        help="target directories (default: feature_store.DEFAULT_TARGET_DIRS)")
+    parser.add_argument("--model", choices=MODEL_CHOICES, default="calc",
+                        help="calc: legacy model with --params, new_calc: 3-feature NPS linear model")
+    parser.add_argument("--report", choices=REPORT_CHOICES, default="full", help="report type")
+    parser.add_argument("--format", nargs="+", choices=FORMAT_CHOICES, default=["txt"],
+                        help="output formats (txt report, jsonl / csv per-chart results)")
+    parser.add_argument("--output", default=None,
+                        help="output path without extension (default: per-report legacy file names)")
+    parser.add_argument("--jobs", type=int, default=None, help="parser processes (1 = sequential)")
+    parser.add_argument("--params", default=DEFAULT_PARAMS_PATH,
+                        help="calc parameter JSON (--model calc stops if it cannot be read)")
+    parser.add_argument("--default-params", action="store_true",
+                        help="calc: score with calc's built-in defaults instead of --params")
+    parser.add_argument("--bms-only", action="store_true", help="skip .osu files")
+    parser.add_argument("--no-length-bonus", action="store_true",
+                        help="calc: total_notes=0 (length bonus off, as in the old run_full_analysis)")
+    parser.add_argument("--manifest", default="auto",
+                        help=f"incremental manifest path (default: <output>{MANIFEST_SUFFIX})")
+    parser.add_argument("--no-manifest", action="store_true", help="score every file, keep no manifest")
+    parser.add_argument("--rescore", action="store_true", help="ignore the manifest and rescore every file")
+    parser.add_argument("--index", nargs="?", const=library_index.DEFAULT_INDEX_PATH, default=None,
+                        help=f"update the SQLite library index (default path: {library_index.DEFAULT_INDEX_PATH})")
+    parser.add_argument("--keep-duplicates", action="store_true",
+                        help="count note-identical duplicates separately in the txt report")
+    args = parser.parse_args(argv)
+    return run_score(target_dirs=args.dirs or feature_store.DEFAULT_TARGET_DIRS, model=args.model,
+                     report=args.report, formats=args.format, output=args.output, n_jobs=args.jobs,
+                     params_path=args.params, bms_only=args.bms_only,
+                     length_bonus=not args.no_length_bonus,
+                     manifest=None if args.no_manifest else args.manifest, rescore=args.rescore,
+                     index=args.index, keep_duplicates=args.keep_duplicates,
+                     default_params=args.default_params)
+
+if __name__ == "__main__":
+    main()
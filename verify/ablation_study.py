@@ -3,85 +3,38 @@ Feature Ablation Study for BMS Difficulty Calculator
 각 피처의 정확도 기여도를 분석합니다.
 """
 
-import os
-import glob
 import json
 import numpy as np
 from scipy import stats
 from scipy.optimize import minimize
-import bms_parser
 import calc
-import metric_calc
+import feature_store
+import batch_pool
+
+# 피처 이름 -> compute_map_difficulty 부하 가중치 인자
+FEATURE_WEIGHTS = {
+    'nps': 'alpha',
+    'ln': 'beta',
+    'jack': 'gamma',
+    'roll': 'delta',
+    'alt': 'eta',
+    'hand': 'theta',
+    'chord': 'omega',
+}
+ALL_FEATURES = ['nps', 'jack', 'ln', 'roll', 'alt', 'hand', 'chord']
+
+# 레벨 곡선 (D_max, gamma) 초기값 / 범위
+CURVE_X0 = [50.0, 0.5]
+CURVE_BOUNDS = [(10.0, 200.0), (0.1, 2.0)]
 
 def load_bms_charts():
-    """BMS 차트 데이터 로드 (레이블 있는 것만)"""
+    """BMS 차트 데이터 로드 (레이블 있는 것만, 공용 피처 저장소 사용)"""
     target_dirs = [
         r"d:\계산기\테스트 샘플",
         r"d:\계산기\패턴 모음",
         r"d:\계산기\패턴 모음2(GCS)",
     ]
-    
-    files = []
-    for root_dir in target_dirs:
-        for ext in ['*.bms', '*.bme', '*.bml']:
-            files.extend(glob.glob(os.path.join(root_dir, '**', ext), recursive=True))
-            
-    print(f"Found {len(files)} BMS files.")
-    
-    chart_data = []
-    
-    for i, file_path in enumerate(files):
-        if i % 200 == 0:
-            print(f"Processing {i}/{len(files)}...")
-            
-        try:
-            is_gcs = "패턴 모음2(GCS)" in file_path
-            
-            parser = bms_parser.BMSParser(file_path)
-            notes = parser.parse()
-            if not notes: continue
-                
-            duration = parser.duration
-            if duration < 10: continue
-                
-            # Get Label
-            label = None
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                for line in f:
-                    if line.upper().startswith("#PLAYLEVEL"):
-                        try:
-                            label = int(line.split()[1])
-                        except: pass
-                        break
-            
-            # GCS Filtering
-            if is_gcs:
-                if label is None or label == 0: continue
-                label = label - 5
-                if label < 1: continue
-            
-            if label is None: continue
-            
-            metrics = metric_calc.calculate_metrics(notes, duration)
-            total_notes = len(notes)
-            
-            # Compute global NPS (total notes / duration)
-            global_nps = total_notes / duration
-            
-            chart_data.append({
-                'metrics': metrics,
-                'duration': duration,
-                'total_notes': total_notes,
-                'label': label,
-                'global_nps': global_nps,
-                'file': os.path.basename(file_path)
-            })
-                
-        except Exception as e:
-            pass
-            
-    print(f"Loaded {len(chart_data)} valid charts.")
-    return chart_data
+    return feature_store.load_chart_data(sources=target_dirs, bms_only=True, labeled_only=True)
 
 def compute_level_with_features(chart_data, features, D_max=None, gamma=None):
     """
@@ -137,26 +90,44 @@ def compute_level_with_features(chart_data, features, D_max=None, gamma=None):
     
     return predictions
 
-def optimize_for_features(chart_data, feature_combo):
-    """주어진 피처 조합에 대해 D_max, gamma 최적화"""
-    
+def combo_D0(batch, feature_combo):
+    """
+    피처 조합(각 weight 1.0)의 곡별 D0 (calc.stack_chart_data 배치 사용).
+    D0는 레벨 곡선 파라미터(D_max, gamma)와 무관하므로 조합당 한 번만 계산하면 됨.
+    """
+    weights = {name: 0.0 for name in calc.LOAD_WEIGHT_NAMES}
+    for f in feature_combo:
+        weights[FEATURE_WEIGHTS[f]] = 1.0
+    res = calc.compute_map_difficulty_batch(
+        batch['basis'], batch['lengths'], batch['duration'], batch['total_notes'],
+        lam_L=0.3, lam_S=0.8,
+        cap_start=60.0, cap_range=30.0,
+        uncap_level=True,
+        **weights
+    )
+    return res['D0']
+
+def _combo_D0_task(feature_combo):
+    """워커용: 공유 배치에서 조합의 D0 계산"""
+    return combo_D0(batch_pool.worker_batch(), feature_combo)
+
+def fit_level_curve(D0, labels, x0=CURVE_X0):
+    """미리 계산된 D0에 대해 D_max, gamma 최적화 -> (D_max, gamma, mae)"""
     def objective(params):
         D_max, gamma = params
-        
-        # 피처 weights 고정 (각각 1.0)
-        features = {f: 1.0 for f in feature_combo}
-        
-        preds = compute_level_with_features(chart_data, features, D_max, gamma)
-        mae = np.mean([abs(p['pred'] - p['label']) for p in preds])
-        return mae
+        preds = calc.pattern_level_array(D0, D_max=D_max, gamma=gamma, uncap=True)
+        return np.mean(np.abs(preds - labels))
     
-    # Optimize D_max and gamma
-    result = minimize(objective, [50.0, 0.5], method='L-BFGS-B',
-                     bounds=[(10.0, 200.0), (0.1, 2.0)])
+    result = minimize(objective, x0, method='L-BFGS-B', bounds=CURVE_BOUNDS)
     
     return result.x[0], result.x[1], result.fun
 
-def run_ablation_study():
+def optimize_for_features(chart_data, feature_combo, x0=CURVE_X0):
+    """주어진 피처 조합에 대해 D_max, gamma 최적화"""
+    batch = calc.stack_chart_data(chart_data)
+    return fit_level_curve(combo_D0(batch, feature_combo), batch['labels'], x0)
+
+def run_ablation_study(n_jobs=None):
     print("Loading BMS charts...")
     chart_data = load_bms_charts()
     
@@ -179,44 +150,39 @@ def run_ablation_study():
     # 2. Feature Ablation Study
     print("\n=== Feature Ablation Study ===")
     
-    # 피처 목록
-    all_features = ['nps', 'jack', 'ln', 'roll', 'alt', 'hand', 'chord']
+    # (a) NPS only -> (b) NPS + 각 피처 하나씩 -> (c) 전체
+    combos = [('nps', ['nps'])]
+    combos += [(f'nps+{feature}', ['nps', feature]) for feature in ['jack', 'ln', 'roll', 'alt', 'hand', 'chord']]
+    combos += [('all', ALL_FEATURES)]
+    
+    # 피처 기저(피처별 윈도우 기여도)는 한 번만 쌓고, 조합별 D0는 워커에서 병렬 계산
+    print(f"\nPrecomputing D0 for {len(combos)} feature combinations...")
+    batch = calc.stack_chart_data(chart_data)
+    D0_by_combo = dict(zip(
+        [name for name, _ in combos],
+        batch_pool.imap_over_batch(_combo_D0_task, [combo for _, combo in combos], batch, n_jobs=n_jobs)
+    ))
     
     results = []
     
-    # (a) NPS Only (using model, not linear regression)
-    print("\nTesting: NPS only...")
-    D_max, gamma, mae = optimize_for_features(chart_data, ['nps'])
-    results.append({
-        'features': 'nps',
-        'D_max': D_max,
-        'gamma': gamma,
-        'mae': mae
-    })
-    print(f"  MAE: {mae:.4f} (D_max={D_max:.1f}, gamma={gamma:.3f})")
-    
-    # (b) NPS + 각 피처 하나씩 추가
-    for feature in ['jack', 'ln', 'roll', 'alt', 'hand', 'chord']:
-        print(f"\nTesting: NPS + {feature}...")
-        D_max, gamma, mae = optimize_for_features(chart_data, ['nps', feature])
+    def fit(name, label, x0):
+        print(f"\nTesting: {label}...")
+        D_max, gamma, mae = fit_level_curve(D0_by_combo[name], batch['labels'], x0)
         results.append({
-            'features': f'nps+{feature}',
+            'features': name,
             'D_max': D_max,
             'gamma': gamma,
             'mae': mae
         })
         print(f"  MAE: {mae:.4f} (D_max={D_max:.1f}, gamma={gamma:.3f})")
-    
-    # (c) All features
-    print("\nTesting: All features...")
-    D_max, gamma, mae = optimize_for_features(chart_data, all_features)
-    results.append({
-        'features': 'all',
-        'D_max': D_max,
-        'gamma': gamma,
-        'mae': mae
-    })
-    print(f"  MAE: {mae:.4f} (D_max={D_max:.1f}, gamma={gamma:.3f})")
+        return results[-1]
+    
+    # 부모 조합의 최적점을 자식 조합의 시작점으로 사용 (warm start)
+    parent = fit('nps', 'NPS only', CURVE_X0)
+    children = [fit(name, 'NPS + ' + combo[1], [parent['D_max'], parent['gamma']])
+                for name, combo in combos[1:-1]]
+    best_child = min(children, key=lambda r: r['mae'])
+    fit('all', 'All features', [best_child['D_max'], best_child['gamma']])
     
     # 3. Summary Table
     print("\n" + "=" * 60)
@@ -0,0 +1,91 @@
+import os
+import json
+import time
+import calc
+import feature_store
+
+TARGET_DIRS = feature_store.DEFAULT_TARGET_DIRS
+PARAMS_PATH = r"d:\계산기\final_params.json"
+INDEX_PATH = r"d:\계산기\rank_index.json"
+
+# F, P 값에 영향을 주는 파라미터만 인덱스에 기록 (레벨 매핑 파라미터는 무관)
+INDEX_PARAM_KEYS = ('alpha', 'beta', 'gamma', 'delta', 'eta', 'theta', 'omega', 'lam_L', 'lam_S')
+
+def build_rank_index():
+    # 1. Load Params
+    params = {}
+    try:
+        with open(PARAMS_PATH, "r", encoding='utf-8') as f:
+            params = {k: v for k, v in json.load(f).items() if k in INDEX_PARAM_KEYS}
+        print("Loaded params from final_params.json")
+    except Exception as e:
+        print(f"Could not load final_params.json: {e} (using defaults)")
+
+    # 2. Load existing index (증분 갱신)
+    index = None
+    if os.path.exists(INDEX_PATH):
+        index = calc.PercentileIndex.load(INDEX_PATH)
+        if index.params != params:
+            print("Index params differ from current params. Rebuilding from scratch.")
+            index = None
+        elif index.has_unknown_entries():
+            print("Index was saved without per-chart values. Rebuilding from scratch.")
+            index = None
+        else:
+            print(f"Loaded existing index ({len(index)} charts)")
+    if index is None:
+        index = calc.PercentileIndex(params=params)
+
+    # 3. Insert new / modified charts only (stamp = 파일 크기, 수정 시각)
+    # 필터에 걸린 파일 / 파싱 실패 파일도 stamp를 기록 -> 파일이 바뀌기 전까지 다시 파싱하지 않음
+    start_time = time.time()
+    added = 0
+    skipped = 0
+    failed = 0
+    seen = set()
+    for _, file_path in feature_store.scan_files(TARGET_DIRS):
+        seen.add(file_path)
+        st = os.stat(file_path)
+        stamp = (st.st_size, st.st_mtime_ns)
+        if index.stamp(file_path) == stamp:
+            continue
+        try:
+            chart = feature_store.extract_chart(file_path)
+            if chart is None:
+                index.skip(file_path, stamp)
+                skipped += 1
+                continue
+
+            metrics = chart['metrics']
+            res = calc.compute_map_difficulty(
+                metrics['nps'], metrics['ln_strain'], metrics['jack_pen'],
+                metrics['roll_pen'], metrics['alt_cost'], metrics['hand_strain'],
+                metrics['chord_strain'],
+                duration=chart['duration'],
+                total_notes=chart['total_notes'],
+                **params
+            )
+        except Exception as e:
+            print(f"Error loading {file_path}: {e}")
+            index.skip(file_path, stamp)
+            failed += 1
+            continue
+
+        index.add(res['F'], res['P'], key=file_path, stamp=stamp)
+        added += 1
+        if added % 100 == 0:
+            print(f"Added {added} charts... ({time.time() - start_time:.1f}s)")
+            index.save(INDEX_PATH)
+
+    # 4. Remove charts whose files no longer exist
+    removed = 0
+    for key in [key for key in index.tracked_keys() if key not in seen and not os.path.exists(key)]:
+        index.remove(key)
+        removed += 1
+
+    index.save(INDEX_PATH)
+    print(f"Done. Added {added} charts, skipped {skipped}, failed {failed}, removed {removed}, "
+          f"index size {len(index)} -> {INDEX_PATH}")
+
+if __name__ == "__main__":
+    build_rank_index()
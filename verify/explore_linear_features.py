@@ -2,102 +2,33 @@
 NPS + 추가 피처 다중 선형 회귀 탐색
 - NPS 선형 회귀(MAE 1.55)를 기반으로 추가 피처 조합 탐색
 - 어떤 피처를 더해야 정확도가 개선되는지 분석
+- 집계 피처 15개의 모든 부분집합(2^15)을 닫힌 해로 전수 평가 (subset_regression)
 """
 
-import os
-import glob
 import numpy as np
-from sklearn.linear_model import LinearRegression, Ridge, Lasso
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import cross_val_score, KFold
-import bms_parser
-import metric_calc
+from sklearn.model_selection import KFold
+import feature_store
+import subset_regression
 import json
 
+# 전수 탐색 대상 집계 피처 (윈도우 메트릭 평균/최대, NPS는 표준편차 포함)
+EXHAUSTIVE_FEATURES = [
+    'nps_mean', 'nps_max', 'nps_std',
+    'jack_mean', 'jack_max', 'ln_mean', 'ln_max', 'roll_mean', 'roll_max',
+    'alt_mean', 'alt_max', 'hand_mean', 'hand_max', 'chord_mean', 'chord_max',
+]
+EXHAUSTIVE_TOP_N = 20
+
 def load_bms_charts():
-    """BMS 차트 데이터 로드"""
+    """BMS 차트 데이터 로드 (공용 피처 저장소의 집계값 사용)"""
     target_dirs = [
         r"d:\계산기\테스트 샘플",
         r"d:\계산기\패턴 모음",
         r"d:\계산기\패턴 모음2(GCS)",
     ]
-    
-    files = []
-    for root_dir in target_dirs:
-        for ext in ['*.bms', '*.bme', '*.bml']:
-            files.extend(glob.glob(os.path.join(root_dir, '**', ext), recursive=True))
-            
-    print(f"Found {len(files)} BMS files.")
-    
-    chart_data = []
-    
-    for i, file_path in enumerate(files):
-        if i % 300 == 0:
-            print(f"Processing {i}/{len(files)}...")
-            
-        try:
-            is_gcs = "패턴 모음2(GCS)" in file_path
-            
-            parser = bms_parser.BMSParser(file_path)
-            notes = parser.parse()
-            if not notes: continue
-                
-            duration = parser.duration
-            if duration < 10: continue
-                
-            # Get Label
-            label = None
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                for line in f:
-                    if line.upper().startswith("#PLAYLEVEL"):
-                        try:
-                            label = int(line.split()[1])
-                        except: pass
-                        break
-            
-            # GCS Filtering
-            if is_gcs:
-                if label is None or label == 0: continue
-                label = label - 5
-                if label < 1: continue
-            
-            if label is None: continue
-            
-            metrics = metric_calc.calculate_metrics(notes, duration)
-            total_notes = len(notes)
-            
-            # 피처 추출
-            global_nps = total_notes / duration
-            
-            # 윈도우 기반 메트릭 집계 (평균, 최대, 표준편차)
-            chart_data.append({
-                'label': label,
-                'global_nps': global_nps,
-                'duration': duration,
-                'total_notes': total_notes,
-                # 평균값
-                'nps_mean': np.mean(metrics['nps']),
-                'nps_max': np.max(metrics['nps']),
-                'nps_std': np.std(metrics['nps']),
-                'jack_mean': np.mean(metrics['jack_pen']),
-                'jack_max': np.max(metrics['jack_pen']),
-                'ln_mean': np.mean(metrics['ln_strain']),
-                'ln_max': np.max(metrics['ln_strain']),
-                'roll_mean': np.mean(metrics['roll_pen']),
-                'roll_max': np.max(metrics['roll_pen']),
-                'alt_mean': np.mean(metrics['alt_cost']),
-                'alt_max': np.max(metrics['alt_cost']),
-                'hand_mean': np.mean(metrics['hand_strain']),
-                'hand_max': np.max(metrics['hand_strain']),
-                'chord_mean': np.mean(metrics['chord_strain']),
-                'chord_max': np.max(metrics['chord_strain']),
-            })
-                
-        except Exception as e:
-            pass
-            
-    print(f"Loaded {len(chart_data)} valid charts.")
-    return chart_data
+    # 윈도우 기반 메트릭 집계 (평균, 최대, 표준편차)는 저장소에 미리 계산되어 있음
+    # (<feature>_mean / _max / _std, feature: nps, jack, ln, roll, alt, hand, chord)
+    return feature_store.load_chart_data(sources=target_dirs, bms_only=True, labeled_only=True)
 
 def run_linear_regression_analysis():
     print("Loading BMS charts...")
@@ -149,29 +80,19 @@ def run_linear_regression_analysis():
     
     kf = KFold(n_splits=5, shuffle=True, random_state=42)
     
-    for name, features in feature_sets.items():
-        # 피처 행렬 생성
-        X = np.array([[d[f] for f in features] for d in chart_data])
-        
-        # 스케일링
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
-        
-        # Cross-validation
-        model = LinearRegression()
-        
-        # MAE
-        mae_scores = cross_val_score(model, X_scaled, labels, cv=kf, scoring='neg_mean_absolute_error')
-        mae = -mae_scores.mean()
-        
-        # RMSE
-        rmse_scores = cross_val_score(model, X_scaled, labels, cv=kf, scoring='neg_root_mean_squared_error')
-        rmse = -rmse_scores.mean()
-        
-        # R²
-        r2_scores = cross_val_score(model, X_scaled, labels, cv=kf, scoring='r2')
-        r2 = r2_scores.mean()
-        
+    # 사용하는 모든 피처를 한 행렬에 모으고 fold당 Gram 행렬을 한 번만 계산
+    # (OLS는 스케일링과 무관하므로 StandardScaler 없이 같은 결과)
+    all_names = list(dict.fromkeys(
+        [f for features in feature_sets.values() for f in features] + EXHAUSTIVE_FEATURES))
+    column = {name: j for j, name in enumerate(all_names)}
+    X_all = np.array([[d[f] for f in all_names] for d in chart_data])
+    folds = list(kf.split(X_all))
+    
+    scores = subset_regression.evaluate_subsets(
+        X_all, labels, folds, [[column[f] for f in features] for features in feature_sets.values()])
+    
+    for i, (name, features) in enumerate(feature_sets.items()):
+        mae, rmse, r2 = float(scores['mae'][i]), float(scores['rmse'][i]), float(scores['r2'][i])
         results.append({
             'name': name,
             'features': features,
@@ -182,6 +103,30 @@ def run_linear_regression_analysis():
         
         print(f"{name:<50} {mae:>8.4f} {rmse:>8.4f} {r2:>8.4f}")
     
+    # 집계 피처 전체 부분집합 전수 탐색
+    print("\n" + "=" * 80)
+    print(f"Exhaustive Search: all 2^{len(EXHAUSTIVE_FEATURES)} subsets of aggregate features")
+    print("=" * 80)
+    X_exh = X_all[:, [column[f] for f in EXHAUSTIVE_FEATURES]]
+    exhaustive = subset_regression.evaluate_all_subsets(X_exh, labels, folds)
+    
+    exhaustive_results = []
+    for mask in np.argsort(exhaustive['mae'][1:])[:EXHAUSTIVE_TOP_N] + 1:
+        features = [EXHAUSTIVE_FEATURES[j] for j in subset_regression.mask_to_index(int(mask), len(EXHAUSTIVE_FEATURES))]
+        exhaustive_results.append({
+            'name': ' + '.join(features),
+            'features': features,
+            'mae': float(exhaustive['mae'][mask]),
+            'rmse': float(exhaustive['rmse'][mask]),
+            'r2': float(exhaustive['r2'][mask])
+        })
+    
+    for i, r in enumerate(exhaustive_results, 1):
+        print(f"{i:>3}. MAE: {r['mae']:.4f}, RMSE: {r['rmse']:.4f}, R²: {r['r2']:.4f}  {r['features']}")
+    
+    # 최적 부분집합은 수작업 조합과 함께 순위에 포함
+    results.append(dict(exhaustive_results[0], name='exhaustive_best'))
+    
     # 정렬
     results_sorted = sorted(results, key=lambda x: x['mae'])
     
@@ -197,18 +142,15 @@ def run_linear_regression_analysis():
     # 최고 모델 계수 출력
     best = results_sorted[0]
     features = best['features']
-    X = np.array([[d[f] for f in features] for d in chart_data])
-    
-    model = LinearRegression()
-    model.fit(X, labels)
+    intercept, coef = subset_regression.fit_subset(X_all, labels, [column[f] for f in features])
     
     print("\n" + "=" * 80)
     print(f"Best Model Coefficients: {best['name']}")
     print("=" * 80)
-    print(f"Formula: level = {model.intercept_:.4f}", end="")
-    for feat, coef in zip(features, model.coef_):
-        sign = "+" if coef >= 0 else ""
-        print(f" {sign}{coef:.4f}*{feat}", end="")
+    print(f"Formula: level = {intercept:.4f}", end="")
+    for feat, c in zip(features, coef):
+        sign = "+" if c >= 0 else ""
+        print(f" {sign}{c:.4f}*{feat}", end="")
     print()
     
     # 결과 저장
@@ -216,11 +158,12 @@ def run_linear_regression_analysis():
     with open(output_path, 'w', encoding='utf-8') as f:
         json.dump({
             'results': results_sorted,
+            'exhaustive_top': exhaustive_results,
             'best_model': {
                 'name': best['name'],
                 'features': features,
-                'intercept': model.intercept_,
-                'coefficients': dict(zip(features, model.coef_.tolist())),
+                'intercept': intercept,
+                'coefficients': dict(zip(features, coef.tolist())),
                 'mae': best['mae'],
                 'rmse': best['rmse'],
                 'r2': best['r2']
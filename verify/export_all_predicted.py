@@ -9,17 +9,9 @@ import numpy as np
 import bms_parser
 import osu_parser
 import metric_calc
+import new_calc
 import csv
 
-# 학습된 모델 계수
-INTERCEPT = -0.1879
-COEF_NPS = 0.2053
-COEF_NPS_STD = 0.9999
-COEF_CHORD_MEAN = 3.2741
-
-def predict_level(global_nps, nps_std, chord_mean):
-    return INTERCEPT + COEF_NPS * global_nps + COEF_NPS_STD * nps_std + COEF_CHORD_MEAN * chord_mean
-
 def analyze_and_export(target_dir, output_csv, file_type='bms'):
     """특정 디렉토리 분석 후 CSV 출력"""
     
@@ -35,6 +27,7 @@ def analyze_and_export(target_dir, output_csv, file_type='bms'):
     print(f"Found {len(files)} {file_type.upper()} files in {target_dir}")
     
     results = []
+    features = []  # [N, 3] 피처 테이블 (new_calc.LINEAR_FEATURES 순서)
     
     for i, file_path in enumerate(files):
         if i % 500 == 0:
@@ -82,11 +75,8 @@ def analyze_and_export(target_dir, output_csv, file_type='bms'):
             nps_std = np.std(metrics['nps'])
             chord_mean = np.mean(metrics['chord_strain'])
             
-            predicted = predict_level(global_nps, nps_std, chord_mean)
-            
             results.append({
                 'title': title,
-                'predicted_level': round(predicted, 2),
                 'original_label': label if label else '',
                 'global_nps': round(global_nps, 2),
                 'nps_std': round(nps_std, 2),
@@ -96,10 +86,17 @@ def analyze_and_export(target_dir, output_csv, file_type='bms'):
                 'file_name': os.path.basename(file_path),
                 'file_path': file_path
             })
+            features.append((global_nps, nps_std, chord_mean))
                 
         except Exception as e:
             pass
     
+    # 예측 레벨: 피처 테이블 전체를 행렬-벡터 곱 1회로 채점
+    if results:
+        predicted = new_calc.predict_levels(np.array(features))
+        for r, level in zip(results, predicted):
+            r['predicted_level'] = round(float(level), 2)
+    
     # CSV 저장
     with open(output_csv, 'w', newline='', encoding='utf-8-sig') as f:
         fieldnames = ['title', 'predicted_level', 'original_label', 'global_nps', 'nps_std', 
@@ -8,18 +8,9 @@ import glob
 import numpy as np
 import bms_parser
 import metric_calc
+import new_calc
 import csv
 
-# 학습된 모델 계수 (bms_linear_model_params.json에서)
-INTERCEPT = -0.1879
-COEF_NPS = 0.2053
-COEF_NPS_STD = 0.9999
-COEF_CHORD_MEAN = 3.2741
-
-def predict_level(global_nps, nps_std, chord_mean):
-    """선형 모델로 레벨 예측"""
-    return INTERCEPT + COEF_NPS * global_nps + COEF_NPS_STD * nps_std + COEF_CHORD_MEAN * chord_mean
-
 def generate_csv():
     target_dirs = [
         r"d:\계산기\테스트 샘플",
@@ -35,6 +26,7 @@ def generate_csv():
     print(f"Found {len(files)} BMS files.")
     
     results = []
+    features = []  # [N, 3] 피처 테이블 (new_calc.LINEAR_FEATURES 순서)
     
     for i, file_path in enumerate(files):
         if i % 300 == 0:
@@ -71,9 +63,6 @@ def generate_csv():
             nps_std = np.std(metrics['nps'])
             chord_mean = np.mean(metrics['chord_strain'])
             
-            # 예측 레벨
-            predicted = predict_level(global_nps, nps_std, chord_mean)
-            
             # GCS 여부
             is_gcs = "패턴 모음2(GCS)" in file_path
             
@@ -82,7 +71,6 @@ def generate_csv():
                 'file_name': os.path.basename(file_path),
                 'title': title,
                 'original_label': label if label else '',
-                'predicted_level': round(predicted, 2),
                 'global_nps': round(global_nps, 2),
                 'nps_std': round(nps_std, 2),
                 'chord_mean': round(chord_mean, 4),
@@ -90,10 +78,17 @@ def generate_csv():
                 'duration_sec': round(duration, 1),
                 'is_gcs': is_gcs
             })
+            features.append((global_nps, nps_std, chord_mean))
                 
         except Exception as e:
             pass
     
+    # 예측 레벨: 피처 테이블 전체를 행렬-벡터 곱 1회로 채점
+    if results:
+        predicted = new_calc.predict_levels(np.array(features))
+        for r, level in zip(results, predicted):
+            r['predicted_level'] = round(float(level), 2)
+    
     # CSV 저장
     csv_path = r"d:\계산기\bms_predicted_levels.csv"
     
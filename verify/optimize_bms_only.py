@@ -4,111 +4,50 @@ Osu! 제외, BMS 데이터만 사용
 """
 
 import os
-import glob
 import json
 import numpy as np
 import random
 from scipy.optimize import minimize
 from sklearn.model_selection import KFold
-import bms_parser
 import calc
-import metric_calc
+import feature_store
 
 def load_bms_charts():
-    """BMS 차트 데이터 로드 (레이블 있는 것만)"""
+    """BMS 차트 데이터 로드 (레이블 있는 것만, 공용 피처 저장소 사용)"""
     target_dirs = [
         r"d:\계산기\테스트 샘플",
         r"d:\계산기\패턴 모음",
         r"d:\계산기\패턴 모음2(GCS)",
     ]
-    
-    files = []
-    for root_dir in target_dirs:
-        for ext in ['*.bms', '*.bme', '*.bml']:
-            files.extend(glob.glob(os.path.join(root_dir, '**', ext), recursive=True))
-            
-    print(f"Found {len(files)} BMS files.")
-    
-    chart_data = []
-    
-    for i, file_path in enumerate(files):
-        if i % 200 == 0:
-            print(f"Processing {i}/{len(files)}...")
-            
-        try:
-            is_gcs = "패턴 모음2(GCS)" in file_path
-            
-            parser = bms_parser.BMSParser(file_path)
-            notes = parser.parse()
-            if not notes: continue
-                
-            duration = parser.duration
-            if duration < 10: continue
-                
-            # Get Label
-            label = None
-            title = "Unknown"
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                for line in f:
-                    if line.upper().startswith("#PLAYLEVEL"):
-                        try:
-                            label = int(line.split()[1])
-                        except: pass
-                    if line.upper().startswith("#TITLE"):
-                        try:
-                            title = line.split(maxsplit=1)[1].strip()
-                        except: pass
-            
-            # GCS Filtering
-            if is_gcs:
-                if label is None or label == 0: continue
-                label = label - 5
-                if label < 1: continue
-            
-            if label is None: continue
-            
-            metrics = metric_calc.calculate_metrics(notes, duration)
-            
-            chart_data.append({
-                'metrics': metrics,
-                'duration': duration,
-                'total_notes': len(notes),
-                'label': label,
-                'title': title,
-                'file': os.path.basename(file_path)
-            })
-                
-        except Exception as e:
-            pass
-            
-    print(f"Loaded {len(chart_data)} valid charts.")
-    return chart_data
+    return feature_store.load_chart_data(sources=target_dirs, bms_only=True, labeled_only=True)
+
+# 파라미터 벡터 열 이름 (calc.compute_map_difficulty_batch 인자명)
+PARAM_NAMES = ('alpha', 'theta', 'eta', 'omega', 'lam_L', 'lam_S', 'D_min', 'D_max', 'gamma_curve')
+
+def population_mae(param_matrix, batch):
+    """
+    [P x 9] 후보 행렬 전체의 MAE를 한 번에 계산 -> [P]
+    batch: calc.stack_chart_data 결과
+    """
+    res = calc.compute_map_difficulty_population(
+        batch['basis'], batch['lengths'], batch['duration'], batch['total_notes'],
+        param_matrix, PARAM_NAMES,
+        cap_start=60.0, cap_range=30.0,
+        uncap_level=True
+    )
+    return np.mean(np.abs(res['pattern_level'] - batch['labels']), axis=1)
 
-def objective_full(params, chart_data):
+def objective_full(params, batch):
     """
     전체 파라미터 최적화 목적 함수
     params: [alpha, theta, eta, omega, lam_L, lam_S, D_min, D_max, gamma]
+    returns: (MAE, 해석적 그래디언트) -> minimize(..., jac=True)
     """
-    alpha, theta, eta, omega, lam_L, lam_S, D_min, D_max, gamma = params
-    
-    total_error = 0.0
-    for data in chart_data:
-        m = data['metrics']
-        res = calc.compute_map_difficulty(
-            m['nps'], m['ln_strain'], m['jack_pen'], 
-            m['roll_pen'], m['alt_cost'], m['hand_strain'],
-            m['chord_strain'],
-            alpha=alpha, theta=theta, eta=eta, omega=omega,
-            lam_L=lam_L, lam_S=lam_S,
-            cap_start=60.0, cap_range=30.0,
-            duration=data['duration'],
-            total_notes=data['total_notes'],
-            uncap_level=True,
-            D_min=D_min, D_max=D_max, gamma_curve=gamma
-        )
-        total_error += abs(res['pattern_level'] - data['label'])
-        
-    return total_error / len(chart_data)
+    return calc.dataset_mae_and_grad(
+        params, PARAM_NAMES, batch,
+        cap_start=60.0, cap_range=30.0,
+        uncap_level=True
+    )
 
 def optimize_bms_only():
     # 1. Load Data
@@ -151,15 +90,15 @@ def optimize_bms_only():
     for train_index, test_index in kf.split(all_data):
         fold_idx += 1
         
-        train_data = [all_data[i] for i in train_index]
-        test_data = [all_data[i] for i in test_index]
+        train_data = calc.stack_chart_data([all_data[i] for i in train_index])
+        test_data = calc.stack_chart_data([all_data[i] for i in test_index])
         
-        print(f"\nFold {fold_idx}: Train={len(train_data)}, Test={len(test_data)}")
+        print(f"\nFold {fold_idx}: Train={len(train_index)}, Test={len(test_index)}")
         
         # Optimize
         result = minimize(
             objective_full, init_params, args=(train_data,),
-            method='L-BFGS-B', bounds=bounds,
+            method='L-BFGS-B', jac=True, bounds=bounds,
             options={'maxiter': 200}
         )
         
@@ -167,7 +106,7 @@ def optimize_bms_only():
         train_mae = result.fun
         
         # Test MAE
-        test_mae = objective_full(opt_params, test_data)
+        test_mae = float(population_mae([opt_params], test_data)[0])
         
         print(f"  Train MAE: {train_mae:.4f}")
         print(f"  Test MAE:  {test_mae:.4f}")
@@ -202,7 +141,7 @@ def optimize_bms_only():
     print(f"  gamma:          {gamma:.4f}")
     
     # Final validation on all data
-    final_mae = objective_full(best_params, all_data)
+    final_mae = float(population_mae([best_params], calc.stack_chart_data(all_data))[0])
     print(f"\nFinal MAE (All Data): {final_mae:.4f}")
     
     # Save to JSON
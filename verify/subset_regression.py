@@ -0,0 +1,182 @@
+"""
+전체 부분집합(all-subsets) 선형 회귀 엔진
+
+CV fold마다 중심화한 Gram 행렬 XᵀX, Xᵀy를 한 번만 계산하고, 모든 피처 부분집합의
+최소제곱 해를 그 부분 블록에서 구합니다. 부분집합은 Gray code 순서로 방문하므로
+이웃한 두 부분집합은 피처 하나만 다르고, 역행렬은 피처 추가/제거 시
+Schur 보수를 이용한 rank-one 갱신으로 O(k²)에 구합니다.
+
+절편 포함 OLS (sklearn LinearRegression과 같은 해, 스케일링과 무관)
+"""
+
+import numpy as np
+
+# 역행렬 누적 오차 방지를 위한 주기적 재계산 간격 (Gray code 단계 수)
+REFRESH_INTERVAL = 256
+# Schur 보수 / 대각 성분 비율이 이보다 작으면 (거의) 선형 종속으로 보고 직접 풂
+COLLINEAR_TOL = 1e-10
+
+def fold_gram(X, y):
+    """학습 fold의 평균과 중심화 Gram 행렬: {'mean_x', 'mean_y', 'G', 'r'}"""
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    mean_x = X.mean(axis=0)
+    mean_y = y.mean()
+    Xc = X - mean_x
+    return {'mean_x': mean_x, 'mean_y': mean_y, 'G': Xc.T @ Xc, 'r': Xc.T @ (y - mean_y)}
+
+def mask_to_index(mask, n_features):
+    return [j for j in range(n_features) if mask >> j & 1]
+
+def solve_subset(gram, idx):
+    """부분집합 idx의 계수 (lstsq: 랭크 부족에도 안전)"""
+    idx = list(idx)
+    if not idx:
+        return np.zeros(0)
+    G = gram['G'][np.ix_(idx, idx)]
+    return np.linalg.lstsq(G, gram['r'][idx], rcond=None)[0]
+
+def solve_all_subsets(gram, n_features):
+    """
+    모든 2^p 부분집합의 계수 행렬 B [2^p x p] (행 = 비트마스크, 빠진 피처는 0).
+
+    Gray code 순서: 단계 i에서 비트 tz(i)가 토글됨.
+    추가: [[A, b], [bᵀ, c]]⁻¹ = [[A⁻¹ + u uᵀ / s, -u / s], [-uᵀ / s, 1 / s]],
+          u = A⁻¹ b, s = c - bᵀ u
+    제거: M = [[E, f], [fᵀ, g]] 이면 A⁻¹ = E - f fᵀ / g
+    """
+    G = gram['G']
+    r = gram['r']
+    n_subsets = 1 << n_features
+    B = np.zeros((n_subsets, n_features))
+
+    active = []              # 현재 부분집합 (inv의 행/열 순서)
+    inv = np.zeros((0, 0))   # G[active, active]⁻¹ (valid일 때만 의미 있음)
+    valid = True
+    mask = 0
+
+    for i in range(1, n_subsets):
+        j = (i & -i).bit_length() - 1
+        mask ^= 1 << j
+
+        if mask >> j & 1:
+            # 피처 j 추가
+            if valid:
+                b = G[active, j]
+                c = G[j, j]
+                u = inv @ b
+                s = c - b @ u
+                if s > COLLINEAR_TOL * max(c, 1e-300):
+                    k = len(active)
+                    new_inv = np.empty((k + 1, k + 1))
+                    new_inv[:k, :k] = inv + np.outer(u, u) / s
+                    new_inv[:k, k] = -u / s
+                    new_inv[k, :k] = -u / s
+                    new_inv[k, k] = 1.0 / s
+                    inv = new_inv
+                else:
+                    valid = False
+            active.append(j)
+        else:
+            # 피처 j 제거
+            pos = active.index(j)
+            if valid:
+                g = inv[pos, pos]
+                f = np.delete(inv[:, pos], pos)
+                inv = np.delete(np.delete(inv, pos, axis=0), pos, axis=1) - np.outer(f, f) / g
+            active.pop(pos)
+
+        if not valid or i % REFRESH_INTERVAL == 0:
+            # 재계산: 종속이면 lstsq 해만 쓰고 역행렬은 다음 단계에서 다시 시도
+            sub = G[np.ix_(active, active)]
+            if active and np.linalg.cond(sub) < 1.0 / COLLINEAR_TOL:
+                inv = np.linalg.inv(sub)
+                valid = True
+            elif not active:
+                inv = np.zeros((0, 0))
+                valid = True
+            else:
+                valid = False
+
+        if valid:
+            B[mask, active] = inv @ r[active]
+        else:
+            B[mask, active] = solve_subset(gram, active)
+    return B
+
+def fold_metrics(gram, B, X_test, y_test, chunk_size=4096):
+    """
+    테스트 fold에서 부분집합별 MAE, RMSE, R² (cross_val_score 기준과 동일한 정의)
+    B: [n_subsets x p] 계수 행렬
+    """
+    Xc = np.asarray(X_test, dtype=float) - gram['mean_x']
+    y = np.asarray(y_test, dtype=float)
+    yc = y - gram['mean_y']
+    ss_tot = np.sum((y - y.mean()) ** 2)
+
+    n_subsets = B.shape[0]
+    mae = np.empty(n_subsets)
+    sse = np.empty(n_subsets)
+    for s in range(0, n_subsets, chunk_size):
+        resid = yc[:, None] - Xc @ B[s:s + chunk_size].T
+        mae[s:s + chunk_size] = np.mean(np.abs(resid), axis=0)
+        sse[s:s + chunk_size] = np.sum(resid ** 2, axis=0)
+    rmse = np.sqrt(sse / len(y))
+    r2 = 1.0 - sse / ss_tot if ss_tot > 0 else np.zeros(n_subsets)
+    return mae, rmse, r2
+
+def evaluate_all_subsets(X, y, folds):
+    """
+    모든 부분집합의 CV 평균 지표.
+
+    Args:
+        X: [n x p] 피처 행렬 (p <= 20 권장)
+        y: [n] 레이블
+        folds: (train_index, test_index) 목록 (예: list(KFold(...).split(X)))
+
+    Returns:
+        dict: 'mae', 'rmse', 'r2' - 길이 2^p 배열 (인덱스 = 비트마스크, 0번은 절편만)
+    """
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n_features = X.shape[1]
+
+    totals = {'mae': 0.0, 'rmse': 0.0, 'r2': 0.0}
+    folds = list(folds)
+    for train_index, test_index in folds:
+        gram = fold_gram(X[train_index], y[train_index])
+        B = solve_all_subsets(gram, n_features)
+        mae, rmse, r2 = fold_metrics(gram, B, X[test_index], y[test_index])
+        totals['mae'] = totals['mae'] + mae
+        totals['rmse'] = totals['rmse'] + rmse
+        totals['r2'] = totals['r2'] + r2
+    return {k: v / len(folds) for k, v in totals.items()}
+
+def evaluate_subsets(X, y, folds, subsets):
+    """
+    지정한 부분집합들만 CV 평가 (Gram은 fold당 한 번).
+    subsets: 피처 인덱스 리스트의 리스트 -> 'mae', 'rmse', 'r2' 배열 [len(subsets)]
+    """
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n_features = X.shape[1]
+
+    totals = {'mae': 0.0, 'rmse': 0.0, 'r2': 0.0}
+    folds = list(folds)
+    for train_index, test_index in folds:
+        gram = fold_gram(X[train_index], y[train_index])
+        B = np.zeros((len(subsets), n_features))
+        for row, idx in enumerate(subsets):
+            B[row, list(idx)] = solve_subset(gram, idx)
+        mae, rmse, r2 = fold_metrics(gram, B, X[test_index], y[test_index])
+        totals['mae'] = totals['mae'] + mae
+        totals['rmse'] = totals['rmse'] + rmse
+        totals['r2'] = totals['r2'] + r2
+    return {k: v / len(folds) for k, v in totals.items()}
+
+def fit_subset(X, y, idx):
+    """전체 데이터로 부분집합 idx 적합 -> (intercept, coef)"""
+    gram = fold_gram(np.asarray(X, dtype=float), y)
+    coef = solve_subset(gram, idx)
+    intercept = gram['mean_y'] - gram['mean_x'][list(idx)] @ coef
+    return float(intercept), coef
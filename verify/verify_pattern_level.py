@@ -24,30 +24,30 @@ def test_pattern_level():
     roll_pen = np.zeros(10)
     alt_cost = np.zeros(10)
     hand_strain = np.zeros(10)
+    chord_strain = np.zeros(10)
     
     res = calc.compute_map_difficulty(
-        nps, ln_strain, jack_pen, roll_pen, alt_cost, hand_strain,
+        nps, ln_strain, jack_pen, roll_pen, alt_cost, hand_strain, chord_strain,
         duration=10.0, total_notes=100
     )
     
     print("Result Keys:", res.keys())
     print(f"D0: {res['D0']:.2f}")
     print(f"Est Level: {res['est_level']}")
-    print(f"S_hat: {res['S_hat']}")
     
-    if res['S_hat'] == 0.0 and res['est_level'] > 0:
-        print("SUCCESS: S_hat is 0.0 and Level is calculated.")
+    if res['est_level'] > 0:
+        print("SUCCESS: Level is calculated.")
     else:
         print("FAILURE: Unexpected values.")
 
     print("\nTesting Length Bonus...")
     # Compare 60s vs 120s
     res_60 = calc.compute_map_difficulty(
-        nps, ln_strain, jack_pen, roll_pen, alt_cost, hand_strain,
+        nps, ln_strain, jack_pen, roll_pen, alt_cost, hand_strain, chord_strain,
         duration=60.0, total_notes=600
     )
     res_120 = calc.compute_map_difficulty(
-        nps, ln_strain, jack_pen, roll_pen, alt_cost, hand_strain,
+        nps, ln_strain, jack_pen, roll_pen, alt_cost, hand_strain, chord_strain,
         duration=120.0, total_notes=1200
     )
     
@@ -57,11 +57,32 @@ def test_pattern_level():
     ratio = res_120['D0'] / res_60['D0']
     print(f"Ratio (120s/60s): {ratio:.4f}")
     
-    expected_ratio = 1.08 # 1.0 + 0.08 * log2(2)
+    expected_ratio = 1.0 + 0.05 * np.log1p(1.0) * (10.0 / 15.0) # 60s는 보너스 없음, 120s: log1p(1) x 밀도(10/15)
     if abs(ratio - expected_ratio) < 0.01:
-        print(f"SUCCESS: Length Bonus applied correctly (Expected ~{expected_ratio}, Got {ratio:.4f})")
+        print(f"SUCCESS: Length Bonus applied correctly (Expected ~{expected_ratio:.4f}, Got {ratio:.4f})")
     else:
-        print(f"FAILURE: Length Bonus mismatch (Expected ~{expected_ratio}, Got {ratio:.4f})")
+        print(f"FAILURE: Length Bonus mismatch (Expected ~{expected_ratio:.4f}, Got {ratio:.4f})")
+
+def test_pattern_level_array():
+    print("\nTesting pattern_level_array vs pattern_level_from_D0...")
+    # 밴드 경계(12/13/14/17/19)를 모두 지나도록 D0 격자를 넓게 잡음
+    d0s = np.linspace(-10.0, 250.0, 5001)
+    mismatches = 0
+    for gamma in (1.0, 0.4672, 1.3):
+        for uncap in (False, True):
+            for d_min, d_max in ((0.0, 55.0), (11.5202, 185.9133)):
+                arr = calc.pattern_level_array(d0s, D_min=d_min, D_max=d_max, gamma=gamma, uncap=uncap)
+                ref = np.array([
+                    calc.pattern_level_from_D0(float(d), D_min=d_min, D_max=d_max, gamma=gamma, uncap=uncap)
+                    for d in d0s
+                ])
+                mismatches += int(np.count_nonzero(arr != ref))
+
+    if mismatches == 0:
+        print("PASS: Array and scalar level mapping match exactly")
+    else:
+        print(f"FAIL: {mismatches} points differ between array and scalar level mapping")
 
 if __name__ == "__main__":
     test_pattern_level()
+    test_pattern_level_array()
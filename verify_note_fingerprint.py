@@ -0,0 +1,34 @@
+import feature_store
+
+def make_notes(ln=False, offset=0.0):
+    # 열 1: 1.0s ~ 1.5s 구간이 LN이면 ln_start/ln_end, 아니면 같은 시각의 단타 2개
+    notes = [
+        {'time': offset + 0.5, 'column': 0, 'type': 'note'},
+        {'time': offset + 1.0, 'column': 1, 'type': 'ln_start' if ln else 'note'},
+        {'time': offset + 1.5, 'column': 1, 'type': 'ln_end' if ln else 'note'},
+        {'time': offset + 2.0, 'column': 2, 'type': 'note'},
+    ]
+    return notes
+
+def test_note_fingerprint():
+    print("Testing note_fingerprint...")
+    ln_hash = feature_store.note_fingerprint(make_notes(ln=True))
+    tap_hash = feature_store.note_fingerprint(make_notes(ln=False))
+    shifted_hash = feature_store.note_fingerprint(make_notes(ln=True, offset=3.25))
+    shuffled_hash = feature_store.note_fingerprint(list(reversed(make_notes(ln=True))))
+
+    print(f"LN chart:       {ln_hash}")
+    print(f"Tap-only twin:  {tap_hash}")
+
+    if ln_hash != tap_hash:
+        print("PASS: LN chart and its tap-only twin hash differently")
+    else:
+        print("FAIL: LN chart and its tap-only twin have the same fingerprint")
+
+    if ln_hash == shifted_hash == shuffled_hash:
+        print("PASS: Fingerprint ignores start offset and note order")
+    else:
+        print("FAIL: Fingerprint depends on start offset or note order")
+
+if __name__ == "__main__":
+    test_note_fingerprint()
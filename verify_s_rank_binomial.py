@@ -1,5 +1,6 @@
 import calc
 import numpy as np
+from scipy.stats import binom
 
 def test_s_rank_binomial():
     # Test parameters
@@ -34,5 +35,34 @@ def test_s_rank_binomial():
         else:
             print("FAIL: Long chart probability is not higher")
 
+def test_s_rank_exact_table():
+    # Exact binomial (regularized incomplete beta) vs normal approximation
+    a = 8.0
+    k = 0.005
+    D0 = np.array([900.0, 1000.0, 1100.0])
+    notes = np.array([50, 500, 2500])
+    targets = np.array([0.90, 0.95, 0.98])
+
+    # [targets x charts] table in one call
+    table = calc.predict_s_rank_array(D0[None, :], a, k, notes[None, :], acc_target=targets[:, None])
+
+    print("\nExact S-rank probability table (rows: acc_target)")
+    for t, row in zip(targets, table):
+        approx = [calc.predict_s_rank_95(d, a, k, total_notes=n, acc_target=t) for d, n in zip(D0, notes)]
+        cells = "  ".join(f"{e:.4f} (approx {ap:.4f})" for e, ap in zip(row, approx))
+        print(f"{t:.2f}: {cells}")
+
+    # Reference: P(X >= m) = binom.sf(m - 1, N, p), m = ceil(t * N)
+    p = np.clip(calc.sigmoid(a - k * D0), 1e-6, 1.0 - 1e-6)
+    m = np.ceil(targets[:, None] * notes[None, :] - 1e-9)
+    reference = binom.sf(m - 1, notes[None, :], p[None, :])
+
+    if np.allclose(table, reference, rtol=1e-9, atol=1e-12):
+        print("PASS: Exact table matches scipy.stats.binom.sf")
+    else:
+        worst = np.max(np.abs(table - reference))
+        print(f"FAIL: Exact table differs from scipy.stats.binom.sf (max abs diff {worst:.3e})")
+
 if __name__ == "__main__":
     test_s_rank_binomial()
+    test_s_rank_exact_table()